@@ -13,6 +13,8 @@
  *   index.html (200) for missing paths. We gate on a build-time manifest of
  *   real content paths and convert unknown paths into a real 404 so Bing /
  *   Google don't index ghost URLs.
+ * - Compression Dictionary Transport: browsers holding the site's shared
+ *   dictionary get HTML/CSS as .dcb/.dcz variants compressed against it.
  */
 
 // Build-time substitution: scripts/generate_path_manifest.py replaces the
@@ -23,6 +25,21 @@
 const PATH_MANIFEST_RAW = /*__PATH_MANIFEST_START__*/null/*__PATH_MANIFEST_END__*/;
 const PATH_MANIFEST = PATH_MANIFEST_RAW ? new Set(PATH_MANIFEST_RAW) : null;
 
+// Build-time substitution: scripts/stamp_worker_manifest.py replaces the
+// placeholder below with the shared compression dictionary's metadata from
+// dictionaries/dictionary.json ({path, hash, id, match, match_dest,
+// encodings}). While it is null, Compression Dictionary Transport is off.
+const COMPRESSION_DICTIONARY = /*__DICTIONARY_START__*/null/*__DICTIONARY_END__*/;
+const DICTIONARY_HASH_BYTES = COMPRESSION_DICTIONARY
+  ? Uint8Array.from(atob(COMPRESSION_DICTIONARY.hash), c => c.charCodeAt(0))
+  : null;
+
+// RFC 9842 framing of .dcb/.dcz bodies: magic bytes, then the dictionary's SHA-256
+const DICTIONARY_MAGIC = {
+  dcb: [0xff, 0x44, 0x43, 0x42],
+  dcz: [0x5e, 0x2a, 0x4d, 0x18, 0x20, 0x00, 0x00, 0x00]
+};
+
 /**
  * Is this path a known content URL?
  *
@@ -147,6 +164,17 @@ export default {
       });
     }
     
+    // Shared compression dictionary and responses compressed against it
+    if (COMPRESSION_DICTIONARY) {
+      if (path === COMPRESSION_DICTIONARY.path) {
+        return serveDictionary(request, env, url.hostname);
+      }
+      const dictionaryResponse = await serveDictionaryCompressed(request, env, path, url.hostname);
+      if (dictionaryResponse) {
+        return dictionaryResponse;
+      }
+    }
+
     // Don't cache assets or special paths
     if (!shouldCache(path)) {
       return env.ASSETS.fetch(request);
@@ -154,14 +182,131 @@ export default {
     
     // Try KV cache if available (with fallback to Cache API)
     if (env.HTML_CACHE) {
-      return handleKVCache(request, env, ctx, path, url.hostname);
+      return withDictionaryLink(await handleKVCache(request, env, ctx, path, url.hostname));
     }
 
     // Fallback to Cache API if KV not bound
-    return handleCacheAPI(request, env, ctx, path, url.hostname);
+    return withDictionaryLink(await handleCacheAPI(request, env, ctx, path, url.hostname));
   }
 };
 
+/**
+ * Serve the shared compression dictionary with Use-As-Dictionary, so the
+ * browser keeps it and advertises it (Available-Dictionary) on later
+ * document and stylesheet requests. Its path contains its id, so it is
+ * immutable: a retrained dictionary is a new URL.
+ */
+async function serveDictionary(request, env, hostname) {
+  const response = await env.ASSETS.fetch(request);
+  // SPA mode answers a missing file with index.html
+  if (!response.ok || response.headers.get('content-type')?.includes('text/html')) {
+    return buildNotFoundResponse(env, hostname);
+  }
+
+  const dictionary = COMPRESSION_DICTIONARY;
+  const matchDest = dictionary.match_dest.map(dest => `"${dest}"`).join(' ');
+  const headers = new Headers(response.headers);
+  headers.set('Content-Type', 'application/octet-stream');
+  headers.set('Use-As-Dictionary', `match="${dictionary.match}", match-dest=(${matchDest}), id="${dictionary.id}"`);
+  headers.set('Cache-Control', 'public, max-age=31536000, immutable');
+  headers.set('X-Worker', 'advanced-worker-dictionary');
+
+  return new Response(response.body, {
+    status: response.status,
+    headers
+  });
+}
+
+/**
+ * Serve a page or stylesheet as its .dcb/.dcz variant when the browser holds
+ * the current dictionary. Returns null to fall through to normal handling
+ * (no or another dictionary, no shared encoding, no variant for this file).
+ */
+async function serveDictionaryCompressed(request, env, path, hostname) {
+  const dictionary = COMPRESSION_DICTIONARY;
+  if (request.headers.get('Available-Dictionary') !== `:${dictionary.hash}:`) {
+    return null;
+  }
+  const accepted = (request.headers.get('Accept-Encoding') || '')
+    .split(',')
+    .map(token => token.split(';')[0].trim());
+  const encoding = dictionary.encodings.find(enc => accepted.includes(enc));
+  if (!encoding) {
+    return null;
+  }
+
+  let file;
+  let contentType;
+  let cacheControl;
+  if (path.endsWith('.css')) {
+    file = path;
+    contentType = 'text/css; charset=utf-8';
+    cacheControl = path.startsWith('/wp-content/') || path.startsWith('/wp-includes/')
+      ? 'public, max-age=31536000, immutable'
+      : 'public, max-age=3600';
+  } else if (shouldCache(path) && (path.endsWith('/') || path.endsWith('.html'))) {
+    if (!isKnownContentPath(path)) {
+      return null;
+    }
+    file = path.endsWith('/') ? `${path}index.html` : path;
+    contentType = 'text/html; charset=utf-8';
+    cacheControl = `public, max-age=${getTTL(path)}`;
+  } else {
+    return null;
+  }
+
+  const variantUrl = new URL(request.url);
+  variantUrl.pathname = `${file}.${encoding}`;
+  variantUrl.search = '';
+  const variant = await env.ASSETS.fetch(new Request(variantUrl.toString(), {
+    headers: { 'Accept-Encoding': 'identity' }
+  }));
+  if (!variant.ok) {
+    return null;
+  }
+
+  // Check the framing, which also rejects the SPA index.html fallback for a
+  // missing variant and a variant compressed against an older dictionary
+  const body = new Uint8Array(await variant.arrayBuffer());
+  const magic = DICTIONARY_MAGIC[encoding];
+  const headerLength = magic.length + DICTIONARY_HASH_BYTES.length;
+  if (body.length < headerLength ||
+      magic.some((byte, i) => body[i] !== byte) ||
+      DICTIONARY_HASH_BYTES.some((byte, i) => body[magic.length + i] !== byte)) {
+    return null;
+  }
+
+  return new Response(body, {
+    status: 200,
+    encodeBody: 'manual',
+    headers: {
+      'Content-Type': contentType,
+      'Content-Encoding': encoding,
+      'Vary': 'Accept-Encoding, Available-Dictionary',
+      'Cache-Control': cacheControl,
+      'X-Worker': 'advanced-worker-dictionary',
+      ...getSecurityHeaders(hostname)
+    }
+  });
+}
+
+/**
+ * Point HTML responses at the shared dictionary so the browser fetches it
+ * at idle priority; later page views can then use the .dcb/.dcz variants.
+ */
+function withDictionaryLink(response) {
+  if (!COMPRESSION_DICTIONARY || !response.ok ||
+      !response.headers.get('content-type')?.includes('text/html')) {
+    return response;
+  }
+  const headers = new Headers(response.headers);
+  headers.append('Link', `<${COMPRESSION_DICTIONARY.path}>; rel="compression-dictionary"`);
+  return new Response(response.body, {
+    status: response.status,
+    headers
+  });
+}
+
 /**
  * Handle caching with KV (preferred method)
  *
@@ -359,7 +504,7 @@ function shouldCache(path) {
       path === '/diagnostic' ||
       path === '/trace' ||
       path === '/test' ||
-      path.match(/\.(js|css|png|jpg|jpeg|gif|ico|svg|woff|woff2|ttf|json|xml|txt|webp|avif|br|gz|webmanifest)$/)) {
+      path.match(/\.(js|css|png|jpg|jpeg|gif|ico|svg|woff|woff2|ttf|json|xml|txt|webp|avif|jxl|br|gz|dcb|dcz|dict|webmanifest)$/)) {
     return false;
   }
 
@@ -557,7 +702,7 @@ async function handleTrace(request, env) {
       has_preview: testPath.includes('/preview'),
       starts_with_api: testPath.startsWith('/api/'),
       starts_with_well_known: testPath.startsWith('/.well-known/'),
-      has_file_extension: testPath.match(/\.(js|css|png|jpg|jpeg|gif|ico|svg|woff|woff2|ttf|json|xml|txt|webp|avif|br|gz)$/) !== null
+      has_file_extension: testPath.match(/\.(js|css|png|jpg|jpeg|gif|ico|svg|woff|woff2|ttf|json|xml|txt|webp|avif|jxl|br|gz|dcb|dcz|dict|webmanifest)$/) !== null
     },
     kv_status: env.HTML_CACHE ? 'BOUND' : 'NOT BOUND',
     middleware_decision: null
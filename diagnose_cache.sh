@@ -10,7 +10,7 @@ echo ""
 echo "1. CACHE DIRECTORY STATUS"
 echo "--------------------------"
 CACHE_DIR=".image_optimization_cache"
-CACHE_FILE="$CACHE_DIR/optimization_cache.json"
+STATE_DB=".build-state.db"
 
 if [ -d "$CACHE_DIR" ]; then
     echo "✓ Cache directory exists: $CACHE_DIR"
@@ -20,28 +20,26 @@ else
 fi
 
 echo ""
-if [ -f "$CACHE_FILE" ]; then
-    SIZE=$(wc -c < "$CACHE_FILE")
-    echo "✓ Cache file exists: $CACHE_FILE"
+ENTRIES=0
+if [ -f "$STATE_DB" ]; then
+    SIZE=$(wc -c < "$STATE_DB")
+    echo "✓ Build state exists: $STATE_DB"
     echo "  Size: $SIZE bytes"
     
-    if [ "$SIZE" -gt 5 ]; then
-        ENTRIES=$(python3 -c "import json; print(len(json.load(open('$CACHE_FILE'))))" 2>/dev/null || echo "ERROR")
-        echo "  Entries: $ENTRIES"
-        
-        if [ "$ENTRIES" != "ERROR" ] && [ "$ENTRIES" -gt 0 ]; then
-            echo "  ✓ Cache is populated"
-            echo ""
-            echo "  Sample entries:"
-            python3 -c "import json; data=json.load(open('$CACHE_FILE')); import itertools; [print(f'    - {k}') for k in itertools.islice(data.keys(), 3)]" 2>/dev/null || echo "    ERROR reading entries"
-        else
-            echo "  ⚠️  Cache is empty"
-        fi
+    ENTRIES=$(python3 scripts/manage_build_cache.py count images 2>/dev/null || echo "ERROR")
+    echo "  Image entries: $ENTRIES"
+    
+    if [ "$ENTRIES" != "ERROR" ] && [ "$ENTRIES" -gt 0 ]; then
+        echo "  ✓ Cache is populated"
+        echo ""
+        echo "  Sample entries:"
+        python3 scripts/manage_build_cache.py query images "" 3 2>/dev/null || echo "    ERROR reading entries"
     else
-        echo "  ⚠️  Cache file is empty ({})"
+        echo "  ⚠️  Cache is empty"
+        ENTRIES=0
     fi
 else
-    echo "✗ Cache file NOT found"
+    echo "✗ Build state NOT found (legacy $CACHE_DIR files are imported on first run)"
 fi
 
 echo ""
@@ -84,7 +82,7 @@ echo "=========================================="
 echo "RECOMMENDATIONS"
 echo "=========================================="
 
-if [ ! -f "$CACHE_FILE" ] || [ "$(wc -c < "$CACHE_FILE")" -le 5 ]; then
+if [ "$ENTRIES" -eq 0 ]; then
     echo "⚠️  Cache is empty or missing"
     echo ""
     echo "This is expected if:"
@@ -95,12 +93,12 @@ if [ ! -f "$CACHE_FILE" ] || [ "$(wc -c < "$CACHE_FILE")" -le 5 ]; then
     echo "Next steps:"
     echo "  - Run the workflow once to populate cache"
     echo "  - Check GitHub Actions logs for optimization step"
-    echo "  - Verify cache is committed to git after run"
+    echo "  - Verify the 'Save build state' step ran"
 else
     echo "✓ Cache appears healthy"
     echo ""
     echo "If images are still being re-optimized:"
     echo "  - Check GitHub Actions cache is being restored"
-    echo "  - Verify cache key matches (build-cache-avif-v2-*)"
+    echo "  - Verify cache key matches (build-state-*)"
     echo "  - Check logs for 'Cache restored' message"
 fi
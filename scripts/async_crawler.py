@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Async Crawl Engine
+
+asyncio alternative to the ThreadPoolExecutor(max_workers=3) fetch loop in
+WordPressStaticGenerator.generate_static_site(). Enabled with --async-crawl.
+
+- One pooled httpx.AsyncClient shared by every fetch: bounded connection
+  pool, keep-alive, and HTTP/2 multiplexing when the `h2` package is present.
+- Adaptive per-host concurrency (AIMD): each host starts at a small number
+  of in-flight requests, gains a slot after a run of fast responses and is
+  halved on 429/5xx/timeouts, so a full rebuild converges on whatever the
+  WordPress origin can sustain instead of a fixed client-side cap.
+- Per-URL timings (fetch and process) with a percentile / slowest-URL
+  summary, written to crawl-timings.json for later comparison.
+
+HTML processing is CPU-bound and still uses the generator's synchronous
+requests.Session for CSS/API lookups, so each fetched page is handed to a
+worker thread (asyncio.to_thread) while the event loop keeps fetching; with
+the page pipeline enabled that thread just waits on a parse process.
+"""
+
+import asyncio
+import importlib.util
+import json
+import time
+from pathlib import Path
+from urllib.parse import urlparse
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Responses that mean "the origin is struggling" — back off on these.
+THROTTLE_STATUSES = {429, 502, 503, 504}
+
+
+def is_available():
+    """True if the optional httpx dependency is installed."""
+    return httpx is not None
+
+
+class HostLimiter:
+    """Additive-increase / multiplicative-decrease concurrency limit for one host."""
+
+    def __init__(self, initial, minimum=1, maximum=16, slow_threshold=2.0):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_threshold = slow_threshold
+        self.peak = initial
+        self._active = 0
+        self._fast_streak = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+
+    async def release(self, throttled, elapsed):
+        async with self._cond:
+            self._active -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit // 2)
+                self._fast_streak = 0
+            elif elapsed < self.slow_threshold:
+                # One extra slot per "window" of fast responses.
+                self._fast_streak += 1
+                if self._fast_streak >= self.limit and self.limit < self.maximum:
+                    self.limit += 1
+                    self.peak = max(self.peak, self.limit)
+                    self._fast_streak = 0
+            self._cond.notify_all()
+
+
+class AsyncCrawler:
+    """Fetch URL paths concurrently and hand each page to the generator."""
+
+    def __init__(self, generator, max_connections=16, initial_concurrency=4,
+                 max_per_host=16, timeout=30, timings_file='crawl-timings.json',
+                 store=None):
+        if httpx is None:
+            raise RuntimeError("httpx is not installed (pip install 'httpx[http2]')")
+        self.generator = generator
+        # Called (on a worker thread) with each fetched page; defaults to the
+        # generator's in-process handler, or PagePipeline.process for the pool.
+        self.store = store or generator._store_fetched_page
+        self.max_connections = max_connections
+        self.initial_concurrency = initial_concurrency
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.timings_file = Path(timings_file) if timings_file else None
+        self.http2 = importlib.util.find_spec('h2') is not None
+        self.limiters = {}
+        self.timings = []
+        self._in_flight = None
+
+    def crawl(self, url_paths):
+        """Crawl *url_paths* and return one status string per path, in order."""
+        return asyncio.run(self._crawl(url_paths))
+
+    async def _crawl(self, url_paths):
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_connections,
+            keepalive_expiry=30,
+        )
+        # pool=None: waiting for a free connection is governed by the host
+        # limiters, not by a timeout.
+        timeout = httpx.Timeout(self.timeout, pool=None)
+        headers = dict(self.generator.session.headers)
+
+        print(f"   ⚡ Async crawl: {self.max_connections} pooled connections, "
+              f"{'HTTP/2' if self.http2 else 'HTTP/1.1 keep-alive'}, "
+              f"adaptive per-host concurrency {self.initial_concurrency}→{self.max_per_host}")
+
+        # Bounds fetched-but-not-yet-processed pages so a fast origin can't
+        # pile thousands of response bodies up in memory.
+        self._in_flight = asyncio.Semaphore(self.max_connections * 2)
+
+        start = time.perf_counter()
+        async with httpx.AsyncClient(http2=self.http2, limits=limits, timeout=timeout,
+                                     headers=headers, follow_redirects=True) as client:
+            results = await asyncio.gather(
+                *(self._fetch_one(client, url_path) for url_path in url_paths)
+            )
+        self._report(time.perf_counter() - start)
+        return results
+
+    def _limiter_for(self, url):
+        host = urlparse(url).netloc
+        if host not in self.limiters:
+            self.limiters[host] = HostLimiter(
+                self.initial_concurrency, maximum=self.max_per_host
+            )
+        return self.limiters[host]
+
+    async def _fetch_one(self, client, url_path):
+        gen = self.generator
+        if url_path in gen.processed_urls:
+            return f"⏭️  {url_path} (already processed)"
+
+        full_url = f'{gen.wp_url}{url_path}'
+        limiter = self._limiter_for(full_url)
+
+        async with self._in_flight:
+            return await self._fetch_and_store(client, limiter, url_path, full_url)
+
+    async def _fetch_and_store(self, client, limiter, url_path, full_url):
+        await limiter.acquire()
+        fetch_start = time.perf_counter()
+        throttled = False
+        response = None
+        result = None
+        try:
+            response = await client.get(full_url,
+                                        headers=self.generator._page_request_headers(full_url))
+            throttled = response.status_code in THROTTLE_STATUSES
+        except httpx.TimeoutException:
+            throttled = True
+            result = f"⏱️  {url_path} (timeout)"
+        except Exception as e:
+            throttled = True
+            result = f"❌ {url_path} (Error: {str(e)[:50]})"
+        finally:
+            fetch_s = time.perf_counter() - fetch_start
+            await limiter.release(throttled, fetch_s)
+
+        process_s = 0.0
+        if response is not None:
+            if response.status_code in (200, 304):
+                process_start = time.perf_counter()
+                try:
+                    page = self.generator._fetched_page(
+                        full_url, response.status_code, response.headers,
+                        response.text, response.content,
+                    )
+                    if page is None:
+                        result = f"❌ {url_path} (304 without a stored copy)"
+                    else:
+                        result = await asyncio.to_thread(self.store, url_path, **page)
+                except Exception as e:
+                    result = f"❌ {url_path} (Error: {str(e)[:50]})"
+                process_s = time.perf_counter() - process_start
+            elif response.status_code == 404:
+                result = f"⚠️  {url_path} (404 - skipped)"
+            else:
+                result = f"❌ {url_path} ({response.status_code})"
+
+        self.timings.append({
+            'url': url_path,
+            'status': response.status_code if response is not None else None,
+            'http_version': response.http_version if response is not None else None,
+            'fetch_ms': round(fetch_s * 1000, 1),
+            'process_ms': round(process_s * 1000, 1),
+        })
+        return result
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def _report(self, elapsed):
+        """Print a timing summary and persist the per-URL timings."""
+        if not self.timings:
+            return
+        fetch = [t['fetch_ms'] for t in self.timings]
+        process = [t['process_ms'] for t in self.timings if t['process_ms']]
+
+        print(f"\n⏱️  Crawl Timings ({len(self.timings)} URLs in {elapsed:.1f}s, "
+              f"{len(self.timings) / elapsed if elapsed else 0:.1f} URLs/s):")
+        print(f"   Fetch   p50 {self._percentile(fetch, 50):.0f}ms  "
+              f"p95 {self._percentile(fetch, 95):.0f}ms  max {max(fetch):.0f}ms")
+        if process:
+            print(f"   Process p50 {self._percentile(process, 50):.0f}ms  "
+                  f"p95 {self._percentile(process, 95):.0f}ms  max {max(process):.0f}ms")
+        for host, limiter in self.limiters.items():
+            print(f"   Host {host}: concurrency settled at {limiter.limit} (peak {limiter.peak})")
+
+        slowest = sorted(self.timings, key=lambda t: t['fetch_ms'] + t['process_ms'],
+                         reverse=True)[:5]
+        print("   Slowest URLs:")
+        for t in slowest:
+            print(f"     {t['fetch_ms'] + t['process_ms']:.0f}ms  {t['url']} "
+                  f"(fetch {t['fetch_ms']:.0f}ms, process {t['process_ms']:.0f}ms)")
+
+        if self.timings_file:
+            try:
+                self.timings_file.write_text(json.dumps({
+                    'elapsed_seconds': round(elapsed, 2),
+                    'http2': self.http2,
+                    'host_limits': {h: l.limit for h, l in self.limiters.items()},
+                    'urls': self.timings,
+                }, indent=2))
+                print(f"   📄 Per-URL timings written to {self.timings_file}")
+            except IOError as e:
+                print(f"   ⚠️  Could not write {self.timings_file}: {e}")
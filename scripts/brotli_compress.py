@@ -3,12 +3,41 @@
 Brotli + Gzip Compression for Static Site
 Pre-compresses HTML, CSS, JS, JSON, SVG, and XML files with Brotli (primary)
 and Gzip (fallback for clients that don't support Brotli).
+
+Freshness is decided by content, not mtimes: a compression manifest records
+each source file's hash and the hash of the .br/.gz produced from it (or
+that compressing it was not worthwhile). It is kept next to the tree, not
+in it (public/ -> public.compression-manifest.json), so it is never
+deployed; move it along when the tree is moved. A compression-manifest.json
+inside the tree, from older builds, is read if the sibling is missing and
+removed on save. A file whose content matches
+its entry, and whose sidecar still matches the recorded one, is skipped even
+if a re-seed or copy gave it a new mtime. With --reuse-from, sidecars from a
+previous build (e.g. public/) are copied for unchanged content, and content
+that moved to a new path reuses the sidecar compressed from its old path.
+Sidecars left over from earlier content (the source was rewritten after
+the last pass, shrank below MIN_COMPRESS_SIZE or was deleted) are removed.
+
+Files are compressed, hashed and written in CHUNK_SIZE pieces, so memory
+stays bounded however large the file (search index, api/posts.json).
+
+With --dictionary, HTML and CSS also get .dcb/.dcz variants compressed
+against the site's shared dictionary, which the worker serves through
+Compression Dictionary Transport. The dictionary is only loaded here: it is
+trained by compression_dictionary.py before _worker.js is stamped with its
+hash, and training it here could write a dictionary the worker rejects.
+The worker prefers a variant over the .br whenever the browser holds the
+dictionary, so variants not smaller than the file's .br are dropped.
 """
 
 import concurrent.futures
 import gzip as _gzip
+import hashlib
+import json
 import os
+import shutil
 import sys
+import time
 from pathlib import Path
 
 # Check if brotli is installed
@@ -23,30 +52,301 @@ except ImportError:
     print("  pip install -r requirements.txt")
     sys.exit(1)
 
+from compression_dictionary import CompressionDictionary, DICTIONARY_EXTENSIONS
+import compression_dictionary
+
+MANIFEST_FILENAME = 'compression-manifest.json'
+MANIFEST_VERSION = 1
+
+# Sidecar suffixes written next to a source file (see compress_directory)
+DICTIONARY_KINDS = ('dcb', 'dcz')
+SIDECAR_KINDS = ('br', 'gz') + DICTIONARY_KINDS
+
+# Files below this size are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+# Brotli quality policy. HTML/CSS/JS/SVG/feeds are fetched on (almost) every
+# visit and get the full quality. Large data files (search index, JSON API
+# dumps, markdown exports) are fetched rarely; on them q11 costs several
+# times the CPU of q9 for a few percent of bytes, so they get cold_quality.
+COLD_EXTENSIONS = {'.json', '.md', '.txt', '.csv', '.tsv'}
+COLD_MIN_SIZE = 64 * 1024
+COLD_QUALITY = 9
+
+# Read/compress/hash granularity; peak memory per file is a few of these
+# plus the encoder's window
+CHUNK_SIZE = 256 * 1024
+
+
+def content_hash(data):
+    """BLAKE2b-128 of bytes, as recorded in the compression manifest."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def read_chunks(f, size=CHUNK_SIZE):
+    """Iterate over a binary file object in chunks of at most size bytes."""
+    return iter(lambda: f.read(size), b'')
+
+
+def file_hash(path):
+    """content_hash of a file's contents, read in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in read_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def matches_record(path, recorded):
+    """Whether path is still the file a manifest record describes.
+
+    Stat first (size, then mtime), hashing only when the mtime moved.
+    """
+    try:
+        st = path.stat()
+    except OSError:
+        return False
+    if st.st_size != recorded['size']:
+        return False
+    if st.st_mtime_ns == recorded['mtime_ns']:
+        return True
+    return file_hash(path) == recorded['hash']
+
+
+def brotli_stream_hash(br_path):
+    """content_hash of a .br file's decompressed content, decompressed in chunks.
+
+    Raises brotli.error if the stream is corrupt or truncated.
+    """
+    decompressor = brotli.Decompressor()
+    # brotli >= 1.1 can cap each call's output; older versions cannot
+    bounded = hasattr(decompressor, 'can_accept_more_data')
+    digest = hashlib.blake2b(digest_size=16)
+    with open(br_path, 'rb') as f:
+        for chunk in read_chunks(f):
+            if not bounded:
+                digest.update(decompressor.process(chunk))
+                continue
+            digest.update(decompressor.process(chunk, output_buffer_limit=CHUNK_SIZE))
+            while not decompressor.can_accept_more_data():
+                digest.update(decompressor.process(b'', output_buffer_limit=CHUNK_SIZE))
+    # Output still buffered after the last input chunk
+    while bounded and not decompressor.is_finished():
+        data = decompressor.process(b'', output_buffer_limit=CHUNK_SIZE)
+        if not data:
+            break
+        digest.update(data)
+    if not decompressor.is_finished():
+        raise brotli.error('truncated Brotli stream')
+    return digest.hexdigest()
+
+
+def manifest_path(directory):
+    """Where directory's compression manifest lives: beside it, not inside."""
+    directory = Path(directory).resolve()
+    return directory.with_name(f'{directory.name}.{MANIFEST_FILENAME}')
+
+
+def load_compression_manifest(directory):
+    """{relative path: entry} from directory's compression manifest ({} if absent)."""
+    manifest_file = manifest_path(directory)
+    if not manifest_file.exists():
+        manifest_file = Path(directory) / MANIFEST_FILENAME
+    if not manifest_file.exists():
+        return {}
+    try:
+        data = json.loads(manifest_file.read_text(encoding='utf-8'))
+    except (IOError, ValueError) as e:
+        print(f"   ⚠️  Could not read {manifest_file}, ignoring it: {e}")
+        return {}
+    if data.get('version') != MANIFEST_VERSION:
+        return {}
+    return data.get('files', {})
+
+
+def compress_brotli(file_path, public_dir, quality, mode):
+    """Compress *file_path* with Brotli and return a result dict.
+
+    Pure function: no stat mutation, no printing.  Module-level so it can
+    run in ProcessPoolExecutor workers as well as threads.
+
+    Returns a dict with keys:
+        success  (True = compressed, False = skipped, None = error)
+        original_size, compressed_size  (ints, 0 on skip/error)
+        sidecar  (manifest record of the .br, None if not worthwhile)
+        seconds  (time spent compressing)
+        log  (str message for printing, or None)
+    """
+    br_file = file_path.with_suffix(file_path.suffix + '.br')
+    try:
+        original_size = file_path.stat().st_size
+        digest = hashlib.blake2b(digest_size=16)
+
+        started = time.perf_counter()
+        compressor = brotli.Compressor(mode=mode, quality=quality)
+        with open(file_path, 'rb') as src, open(br_file, 'wb') as out:
+            for chunk in read_chunks(src):
+                data = compressor.process(chunk)
+                out.write(data)
+                digest.update(data)
+            data = compressor.finish()
+            out.write(data)
+            digest.update(data)
+        seconds = time.perf_counter() - started
+        st = br_file.stat()
+        compressed_size = st.st_size
+
+        # Only keep it if compression is beneficial (at least 5% reduction)
+        if compressed_size < original_size * 0.95:
+            sidecar = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                       'hash': digest.hexdigest(), 'quality': quality}
+            ratio = (1 - compressed_size / original_size) * 100
+            relative_path = file_path.relative_to(public_dir)
+            log = (
+                f"   ✅ {relative_path}\n"
+                f"      {original_size:,} → {compressed_size:,} bytes "
+                f"({ratio:.1f}% reduction, q{quality})"
+            )
+            return {'success': True, 'original_size': original_size,
+                    'compressed_size': compressed_size, 'sidecar': sidecar,
+                    'seconds': seconds, 'log': log}
+        else:
+            br_file.unlink()
+            return {'success': False, 'original_size': original_size,
+                    'compressed_size': 0, 'sidecar': None, 'seconds': seconds, 'log': None}
+
+    except Exception as e:
+        # Never leave a partial (or, from earlier content, stale) .br behind
+        if br_file.exists():
+            br_file.unlink()
+        return {'success': None, 'original_size': 0, 'compressed_size': 0, 'seconds': 0,
+                'log': f"   ❌ Error compressing {file_path}: {e}"}
+
+
+def compress_with_dictionary(file_path, public_dir, encoding, dictionary_path, quality):
+    """Write *file_path*'s dictionary-compressed variant (.dcb / .dcz).
+
+    Pure function like compress_brotli, with the same result keys.
+    """
+    variant = file_path.with_suffix(f'{file_path.suffix}.{encoding}')
+    try:
+        original_size = file_path.stat().st_size
+
+        started = time.perf_counter()
+        compression_dictionary.encode_file(encoding, file_path, variant, dictionary_path, quality)
+        seconds = time.perf_counter() - started
+        st = variant.stat()
+        compressed_size = st.st_size
+
+        if compressed_size < original_size * 0.95:
+            sidecar = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                       'hash': file_hash(variant),
+                       'dictionary': Path(dictionary_path).stem}
+            return {'success': True, 'original_size': original_size,
+                    'compressed_size': compressed_size, 'sidecar': sidecar,
+                    'seconds': seconds, 'log': None}
+        else:
+            variant.unlink()
+            return {'success': False, 'original_size': original_size,
+                    'compressed_size': 0, 'sidecar': None, 'seconds': seconds, 'log': None}
+
+    except Exception as e:
+        if variant.exists():
+            variant.unlink()
+        return {'success': None, 'original_size': 0, 'compressed_size': 0, 'seconds': 0,
+                'log': f"   ❌ Error {encoding} compressing {file_path}: {e}"}
+
+
+def compress_gzip(file_path):
+    """Compress *file_path* with Gzip and return a result dict.
+
+    Pure function like compress_brotli, with the same result keys.
+    """
+    gz_file = file_path.with_suffix(file_path.suffix + '.gz')
+    try:
+        original_size = file_path.stat().st_size
+
+        started = time.perf_counter()
+        with open(file_path, 'rb') as src, _gzip.open(gz_file, 'wb', compresslevel=9) as f:
+            shutil.copyfileobj(src, f, CHUNK_SIZE)
+        seconds = time.perf_counter() - started
+
+        st = gz_file.stat()
+        compressed_size = st.st_size
+
+        if compressed_size < original_size * 0.95:
+            sidecar = {'size': compressed_size, 'mtime_ns': st.st_mtime_ns,
+                       'hash': file_hash(gz_file)}
+            return {'success': True, 'original_size': original_size,
+                    'compressed_size': compressed_size, 'sidecar': sidecar,
+                    'seconds': seconds, 'log': None}
+        else:
+            gz_file.unlink()
+            return {'success': False, 'original_size': original_size,
+                    'compressed_size': 0, 'sidecar': None, 'seconds': seconds, 'log': None}
+
+    except Exception as e:
+        if gz_file.exists():
+            gz_file.unlink()
+        return {'success': None, 'original_size': 0, 'compressed_size': 0, 'seconds': 0,
+                'log': f"   ❌ Error gzip compressing {file_path}: {e}"}
+
+
 class BrotliCompressor:
-    def __init__(self, public_dir, quality=11):
+    def __init__(self, public_dir, quality=11, reuse_from=None, workers=None,
+                 processes=True, cold_quality=COLD_QUALITY, dictionary=None):
         """
         Initialize Brotli compressor
         
         Args:
             public_dir: Path to public directory
             quality: Compression quality (0-11, default 11 for max compression)
+            reuse_from: Previous build directory whose .br/.gz files may be
+                copied for unchanged content (optional)
+            workers: Parallel compression workers (default: CPU count)
+            processes: Compress on a process pool (False = thread pool)
+            cold_quality: Brotli quality for large, rarely fetched data files
+            dictionary: CompressionDictionary to write .dcb/.dcz variants with
         """
         self.public_dir = Path(public_dir)
         self.quality = quality
+        self.cold_quality = cold_quality
+        self.workers = workers or os.cpu_count() or 4
+        self.processes = processes
+        self.throughput = {}  # (kind, ext) -> files, bytes, seconds, qualities
+        self.wall_seconds = 0.0
         self.stats = {
             'files_processed': 0,
             'files_compressed': 0,
             'original_size': 0,
             'compressed_size': 0,
-            'files_skipped': 0
+            'files_skipped': 0,
+            'files_reused': 0
         }
         self.gzip_stats = {
             'files_compressed': 0,
             'original_size': 0,
             'compressed_size': 0,
-            'files_skipped': 0
+            'files_skipped': 0,
+            'files_reused': 0
+        }
+
+        # Dictionary-compressed variants (Compression Dictionary Transport)
+        self.dictionary = dictionary
+        self.dictionary_stats = {
+            encoding: {'files_compressed': 0, 'original_size': 0, 'compressed_size': 0,
+                       'files_skipped': 0, 'files_reused': 0, 'files_dropped': 0}
+            for encoding in (dictionary.encodings if dictionary else ())
         }
+        self._kind_stats = {'br': self.stats, 'gz': self.gzip_stats, **self.dictionary_stats}
+
+        # Manifest of this directory, plus the previous build's if reusing
+        self.manifest = load_compression_manifest(self.public_dir)
+        self.reuse_dir = Path(reuse_from) if reuse_from else None
+        self.previous = load_compression_manifest(self.reuse_dir) if self.reuse_dir else {}
+        self._by_hash = None
+        self._sources = {}   # path -> (relative path, stat, hash) for this run
+        self._records = {}   # relative path -> manifest entry written on save
         
         # File extensions to compress
         self.compressible_extensions = {
@@ -58,74 +358,124 @@ class BrotliCompressor:
         # Everything else uses MODE_GENERIC (binary/structured data).
         self._text_mode_extensions = {'.html', '.css', '.js', '.md', '.txt'}
     
-    def should_compress(self, file_path):
-        """Check if file should be compressed"""
-        # Check extension
+    def _is_candidate(self, file_path):
+        """Compressible extension, not a sidecar or the manifest, at least 1KB"""
         if file_path.suffix.lower() not in self.compressible_extensions:
             return False
-        
-        # Skip already compressed files
         if file_path.suffix in ('.br', '.gz'):
             return False
-        
-        # Check if .br file already exists and is newer
-        br_file = file_path.with_suffix(file_path.suffix + '.br')
-        if br_file.exists():
-            # Check if original is newer than compressed version
-            if file_path.stat().st_mtime <= br_file.stat().st_mtime:
-                return False
-        
-        # Only compress files larger than 1KB (smaller files not worth it)
-        if file_path.stat().st_size < 1024:
+        if file_path.name == MANIFEST_FILENAME:
             return False
-        
-        return True
-    
-    def _compress_one_brotli(self, file_path):
-        """Compress *file_path* with Brotli and return a result dict.
+        # Only compress files larger than 1KB (smaller files not worth it)
+        return file_path.stat().st_size >= MIN_COMPRESS_SIZE
 
-        Pure function: no stat mutation, no printing.  Designed to be safe
-        for concurrent execution across many ThreadPoolExecutor workers.
+    def _source(self, file_path):
+        """(relative path, stat, content hash) of a source file, once per run.
 
-        Returns a dict with keys:
-            success  (True = compressed, False = skipped, None = error)
-            original_size, compressed_size  (ints, 0 on skip/error)
-            log  (str message for printing, or None)
+        The hash is taken from the manifest when size and mtime still match
+        what it recorded, so unchanged files in place are not re-read.
         """
-        try:
-            original_data = file_path.read_bytes()
-            original_size = len(original_data)
-
-            # K: use MODE_TEXT only for prose/code; MODE_GENERIC for structured
-            #    data formats (JSON, SVG, XML) where the text model adds no benefit.
-            mode = (brotli.MODE_TEXT
-                    if file_path.suffix.lower() in self._text_mode_extensions
-                    else brotli.MODE_GENERIC)
-            compressed_data = brotli.compress(
-                original_data, quality=self.quality, mode=mode
-            )
-            compressed_size = len(compressed_data)
-
-            # Only save if compression is beneficial (at least 5% reduction)
-            if compressed_size < original_size * 0.95:
-                br_file = file_path.with_suffix(file_path.suffix + '.br')
-                br_file.write_bytes(compressed_data)
-                ratio = (1 - compressed_size / original_size) * 100
-                relative_path = file_path.relative_to(self.public_dir)
-                log = (
-                    f"   ✅ {relative_path}\n"
-                    f"      {original_size:,} → {compressed_size:,} bytes "
-                    f"({ratio:.1f}% reduction)"
-                )
-                return {'success': True, 'original_size': original_size,
-                        'compressed_size': compressed_size, 'log': log}
+        if file_path not in self._sources:
+            rel = file_path.relative_to(self.public_dir).as_posix()
+            st = file_path.stat()
+            entry = self.manifest.get(rel)
+            if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+                digest = entry['hash']
             else:
-                return {'success': False, 'original_size': 0,
-                        'compressed_size': 0, 'log': None}
+                digest = file_hash(file_path)
+            self._sources[file_path] = (rel, st, digest)
+        return self._sources[file_path]
+
+    def _known_sidecars(self, rel, digest, kind):
+        """(directory, relative path, record) of sidecars compressed from this content."""
+        if self._by_hash is None:
+            self._by_hash = {}
+            for directory, entries in ((self.reuse_dir, self.previous),
+                                       (self.public_dir, self.manifest)):
+                for path, entry in entries.items():
+                    self._by_hash.setdefault(entry['hash'], []).append((directory, path, entry))
+        candidates = [(self.public_dir, rel, self.manifest.get(rel)),
+                      (self.reuse_dir, rel, self.previous.get(rel))]
+        candidates += self._by_hash.get(digest, [])
+        for directory, path, entry in candidates:
+            if entry and entry['hash'] == digest and kind in entry:
+                yield directory, path, entry[kind]
+
+    def _plan(self, file_path, kind):
+        """How to bring file_path's .br/.gz (kind 'br'/'gz') up to date.
+
+        Returns ('fresh', record) if nothing needs doing, ('reuse', sidecar,
+        record) to copy an existing sidecar of identical content, or
+        ('compress', None).
+        """
+        rel, st, digest = self._source(file_path)
+        for directory, path, recorded in self._known_sidecars(rel, digest, kind):
+            if recorded is None:
+                # Recorded as not worth compressing; the content hasn't changed
+                return ('fresh', None)
+            if kind == 'br' and recorded.get('quality') != self.brotli_quality(file_path):
+                continue
+            if kind in self.dictionary_stats and recorded.get('dictionary') != self.dictionary.id:
+                continue
+            sidecar = directory / f'{path}.{kind}'
+            if not matches_record(sidecar, recorded):
+                continue
+            if directory == self.public_dir and path == rel:
+                return ('fresh', recorded)
+            return ('reuse', sidecar, recorded)
+        return ('compress', None)
+
+    def _record(self, file_path, kind, sidecar_record):
+        """Note the sidecar state for file_path in the manifest written on save."""
+        rel, st, digest = self._source(file_path)
+        entry = self._records.setdefault(
+            rel, {'hash': digest, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+        entry[kind] = sidecar_record
+
+    def _reuse(self, file_path, kind, sidecar, recorded):
+        """Copy an up-to-date sidecar of identical content next to file_path."""
+        target = file_path.with_suffix(f'{file_path.suffix}.{kind}')
+        shutil.copy2(sidecar, target)
+        st = target.stat()
+        self._record(file_path, kind, {**recorded, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns})
+
+    def save_manifest(self):
+        """Write the manifest for the files seen this run (beside the tree)."""
+        manifest_file = manifest_path(self.public_dir)
+        tmp_file = manifest_file.with_suffix('.tmp')
+        tmp_file.write_text(
+            json.dumps({'version': MANIFEST_VERSION, 'files': self._records},
+                       separators=(',', ':'), sort_keys=True),
+            encoding='utf-8',
+        )
+        os.replace(tmp_file, manifest_file)
+        # Written into the tree by older builds, and deployed with it
+        (self.public_dir / MANIFEST_FILENAME).unlink(missing_ok=True)
+        self.manifest = self._records
+        self._by_hash = None
+
+    def should_compress(self, file_path):
+        """Check if file should be compressed (its .br is missing or stale)"""
+        return self._is_candidate(file_path) and self._plan(file_path, 'br')[0] != 'fresh'
+    
+    def brotli_quality(self, file_path):
+        """Brotli quality for file_path (see COLD_EXTENSIONS)."""
+        if (file_path.suffix.lower() in COLD_EXTENSIONS and
+                self._source(file_path)[1].st_size >= COLD_MIN_SIZE):
+            return min(self.cold_quality, self.quality)
+        return self.quality
+
+    def _brotli_mode(self, file_path):
+        # K: use MODE_TEXT only for prose/code; MODE_GENERIC for structured
+        #    data formats (JSON, SVG, XML) where the text model adds no benefit.
+        return (brotli.MODE_TEXT
+                if file_path.suffix.lower() in self._text_mode_extensions
+                else brotli.MODE_GENERIC)
 
-        except Exception as e:
-            return {'success': None, 'original_size': 0, 'compressed_size': 0,
-                    'log': f"   ❌ Error compressing {file_path}: {e}"}
+    def _compress_one_brotli(self, file_path):
+        """Compress *file_path* with Brotli and return a result dict (see compress_brotli)."""
+        return compress_brotli(file_path, self.public_dir,
+                               self.brotli_quality(file_path), self._brotli_mode(file_path))
 
     def compress_file(self, file_path):
         """Compress a single file with Brotli (public sequential API).
@@ -135,6 +485,8 @@ class BrotliCompressor:
         """
         result = self._compress_one_brotli(file_path)
         self.stats['files_processed'] += 1
+        if result['success'] is not None:
+            self._record(file_path, 'br', result['sidecar'])
         if result['success'] is True:
             self.stats['files_compressed'] += 1
             self.stats['original_size'] += result['original_size']
@@ -151,53 +503,12 @@ class BrotliCompressor:
             return False
     
     def should_compress_gzip(self, file_path):
-        """Check if file should be gzip compressed"""
-        if file_path.suffix.lower() not in self.compressible_extensions:
-            return False
-        if file_path.suffix in ('.br', '.gz'):
-            return False
-        gz_file = file_path.with_suffix(file_path.suffix + '.gz')
-        if gz_file.exists():
-            if file_path.stat().st_mtime <= gz_file.stat().st_mtime:
-                return False
-        if file_path.stat().st_size < 1024:
-            return False
-        return True
+        """Check if file should be gzip compressed (its .gz is missing or stale)"""
+        return self._is_candidate(file_path) and self._plan(file_path, 'gz')[0] != 'fresh'
 
     def _compress_one_gzip(self, file_path):
-        """Compress *file_path* with Gzip and return a result dict.
-
-        Pure function: no stat mutation, no printing.  Safe for concurrent
-        execution across ThreadPoolExecutor workers.
-
-        Returns a dict with keys:
-            success  (True = compressed, False = skipped, None = error)
-            original_size, compressed_size  (ints, 0 on skip/error)
-            log  (error string or None)
-        """
-        gz_file = file_path.with_suffix(file_path.suffix + '.gz')
-        try:
-            original_data = file_path.read_bytes()
-            original_size = len(original_data)
-
-            with _gzip.open(gz_file, 'wb', compresslevel=9) as f:
-                f.write(original_data)
-
-            compressed_size = gz_file.stat().st_size
-
-            if compressed_size < original_size * 0.95:
-                return {'success': True, 'original_size': original_size,
-                        'compressed_size': compressed_size, 'log': None}
-            else:
-                gz_file.unlink()
-                return {'success': False, 'original_size': 0,
-                        'compressed_size': 0, 'log': None}
-
-        except Exception as e:
-            if gz_file.exists():
-                gz_file.unlink()
-            return {'success': None, 'original_size': 0, 'compressed_size': 0,
-                    'log': f"   ❌ Error gzip compressing {file_path}: {e}"}
+        """Compress *file_path* with Gzip and return a result dict (see compress_gzip)."""
+        return compress_gzip(file_path)
 
     def compress_file_gzip(self, file_path):
         """Compress a single file with Gzip (public sequential API).
@@ -206,6 +517,8 @@ class BrotliCompressor:
         Use compress_directory() for parallel batch compression.
         """
         result = self._compress_one_gzip(file_path)
+        if result['success'] is not None:
+            self._record(file_path, 'gz', result['sidecar'])
         if result['success'] is True:
             self.gzip_stats['files_compressed'] += 1
             self.gzip_stats['original_size'] += result['original_size']
@@ -222,85 +535,66 @@ class BrotliCompressor:
     def compress_directory(self):
         """Compress all eligible files in directory with Brotli and Gzip.
 
-        Both passes run in parallel using a ThreadPoolExecutor.
-        brotli.compress() and gzip.open() both release the GIL, so threads
-        give genuine concurrency on multi-core runners.
-
-        The Gzip pass always starts after the Brotli pass completes so that
-        the re-scan correctly excludes freshly-written .br sidecar files.
-        Stats are accumulated from worker result dicts in the main thread
-        (via as_completed) — no locks needed.
+        Each file is first checked against the compression manifest: files
+        whose content and sidecar are unchanged are skipped, and sidecars of
+        identical content elsewhere (previous build, another path) are
+        copied. Only what remains is compressed, so the cost of an
+        incremental build follows the changed bytes, not the site size.
+
+        The Brotli and Gzip work then runs as one batch on a process pool
+        (threads with processes=False), largest files first, so a few big
+        files picked up late cannot stretch the tail of the run. Stats and
+        manifest records are accumulated from worker result dicts in the
+        main process (via as_completed) — no locks needed.
         """
-        print(f"🗜️  Compressing files with Brotli (quality={self.quality}) + Gzip fallback...")
+        print(f"🗜️  Compressing files with Brotli (quality={self.quality}, "
+              f"large data files {min(self.cold_quality, self.quality)}) + Gzip fallback...")
         print(f"   Source: {self.public_dir}")
+        if self.reuse_dir:
+            print(f"   Reusing unchanged content from: {self.reuse_dir} "
+                  f"({len(self.previous)} manifest entries)")
 
-        workers = os.cpu_count() or 4
-
-        # --- Initial scan (reused for Brotli pass) ---
+        # --- Scan (shared by both passes; .br/.gz sidecars are not candidates) ---
         all_files = [f for f in self.public_dir.rglob('*') if f.is_file()]
         print(f"   Found {len(all_files)} total files")
+        candidates = [f for f in all_files if self._is_candidate(f)]
+
+        passes = [('Brotli', 'br', candidates), ('Gzip', 'gz', candidates)]
+        if self.dictionary_stats:
+            print(f"   Dictionary: {self.dictionary.path.relative_to(self.public_dir)} "
+                  f"({', '.join(self.dictionary_stats)})")
+            dictionary_candidates = [f for f in candidates
+                                     if f.suffix.lower() in DICTIONARY_EXTENSIONS]
+            passes += [(kind, kind, dictionary_candidates) for kind in self.dictionary_stats]
+
+        tasks = []
+        for label, kind, files in passes:
+            pending = self._pending(kind, files, self._kind_stats[kind])
+            if pending:
+                print(f"   [{label}] {len(pending)} files to compress")
+            else:
+                print(f"   ℹ️  No files need {label} compression (all up to date)")
+            tasks += [(kind, f) for f in pending]
 
-        # --- Brotli pass (parallel) ---
-        brotli_files = [f for f in all_files if self.should_compress(f)]
+        if tasks:
+            self._run_tasks(tasks)
 
-        if not brotli_files:
-            print("   ℹ️  No files need Brotli compression (all up to date)")
-        else:
-            print(f"\n   [Brotli] Processing {len(brotli_files)} files "
-                  f"({workers} workers)...")
-            logs = []
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
-                futures = {ex.submit(self._compress_one_brotli, f): f
-                           for f in brotli_files}
-                for future in concurrent.futures.as_completed(futures):
-                    r = future.result()
-                    self.stats['files_processed'] += 1
-                    if r['success'] is True:
-                        self.stats['files_compressed'] += 1
-                        self.stats['original_size'] += r['original_size']
-                        self.stats['compressed_size'] += r['compressed_size']
-                        if r['log']:
-                            logs.append(r['log'])
-                    elif r['success'] is False:
-                        self.stats['files_skipped'] += 1
-                    else:  # None = error
-                        if r['log']:
-                            print(r['log'])
-            # Print file results together after all workers finish so output
-            # isn't interleaved.  Sort for reproducible ordering.
-            for log in sorted(logs):
-                print(log)
-
-        # --- Gzip pass (parallel) ---
-        # Re-scan so newly created .br files are excluded automatically.
-        all_files = [f for f in self.public_dir.rglob('*') if f.is_file()]
-        gzip_files = [f for f in all_files if self.should_compress_gzip(f)]
+        removed = self._remove_stale_sidecars(all_files)
+        if removed:
+            print(f"   🧹 Removed {removed} sidecars that no longer match their source")
+        dropped = self._drop_unprofitable_variants()
+        if dropped:
+            print(f"   🧹 Dropped {dropped} dictionary variants no smaller than their .br")
 
-        if not gzip_files:
-            print("   ℹ️  No files need Gzip compression (all up to date)")
-        else:
-            print(f"\n   [Gzip]   Processing {len(gzip_files)} files "
-                  f"({workers} workers)...")
-            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
-                futures = {ex.submit(self._compress_one_gzip, f): f
-                           for f in gzip_files}
-                for future in concurrent.futures.as_completed(futures):
-                    r = future.result()
-                    if r['success'] is True:
-                        self.gzip_stats['files_compressed'] += 1
-                        self.gzip_stats['original_size'] += r['original_size']
-                        self.gzip_stats['compressed_size'] += r['compressed_size']
-                    elif r['success'] is False:
-                        self.gzip_stats['files_skipped'] += 1
-                    else:  # None = error
-                        if r['log']:
-                            print(r['log'])
+        self.save_manifest()
 
         # Print summary
         print(f"\n📊 Compression Summary:")
         print(f"   Brotli — compressed: {self.stats['files_compressed']}, "
+              f"reused: {self.stats['files_reused']}, "
               f"skipped: {self.stats['files_skipped']}")
         print(f"   Gzip   — compressed: {self.gzip_stats['files_compressed']}, "
+              f"reused: {self.gzip_stats['files_reused']}, "
               f"skipped: {self.gzip_stats['files_skipped']}")
 
         if self.stats['compressed_size'] > 0:
@@ -327,19 +621,201 @@ class BrotliCompressor:
             print(f"   Space saved: {gz_saved:,} bytes ({gz_saved/1024/1024:.2f} MB)")
             print(f"   Average compression: {gz_ratio:.1f}%")
 
+        self.print_dictionary_savings()
+        self.print_throughput()
+
+    def _remove_stale_sidecars(self, all_files):
+        """Delete .br/.gz/.dcb/.dcz files that no longer match their source.
+
+        A sidecar is kept if this run recorded it. Dictionary variants not
+        produced this run (no --dictionary, or an encoder missing) are kept,
+        with their manifest record, only while their source is unchanged.
+        A sidecar whose source is gone is deleted only if the manifest knew
+        it, so unrelated .gz downloads are left alone. Returns the count.
+        """
+        removed = 0
+        for f in all_files:
+            kind = f.suffix[1:]
+            source = f.with_suffix('')
+            if kind not in SIDECAR_KINDS or source.suffix.lower() not in self.compressible_extensions:
+                continue
+            rel = source.relative_to(self.public_dir).as_posix()
+            entry = self._records.get(rel)
+            previous = self.manifest.get(rel)
+            if entry is not None and entry.get(kind):
+                continue
+            if (entry is not None and kind not in self._kind_stats and previous
+                    and previous['hash'] == entry['hash'] and previous.get(kind)
+                    and matches_record(f, previous[kind])):
+                entry[kind] = previous[kind]
+                continue
+            if source.is_file() or (previous and kind in previous):
+                f.unlink()
+                removed += 1
+        return removed
+
+    def _drop_unprofitable_variants(self):
+        """Delete .dcb/.dcz variants that are not smaller than the file's .br.
+
+        They are recorded as not worthwhile, like a .br that saves too
+        little, so unchanged files are not re-encoded. Returns the count.
+        """
+        dropped = 0
+        for rel, entry in self._records.items():
+            br = entry.get('br')
+            for kind in DICTIONARY_KINDS:
+                variant = entry.get(kind)
+                if variant and br and variant['size'] >= br['size']:
+                    (self.public_dir / f'{rel}.{kind}').unlink(missing_ok=True)
+                    entry[kind] = None
+                    dropped += 1
+                    if kind in self.dictionary_stats:
+                        self.dictionary_stats[kind]['files_dropped'] += 1
+        return dropped
+
+    def _pending(self, kind, candidates, stats):
+        """Candidates whose .br or .gz (kind) must be compressed.
+
+        Up-to-date sidecars are recorded and reusable ones copied on the way.
+        """
+        pending = []
+        for f in candidates:
+            plan = self._plan(f, kind)
+            if plan[0] == 'fresh':
+                self._record(f, kind, plan[1])
+            elif plan[0] == 'reuse':
+                try:
+                    self._reuse(f, kind, plan[1], plan[2])
+                    stats['files_reused'] += 1
+                except OSError:
+                    pending.append(f)
+            else:
+                pending.append(f)
+        return pending
+
+    def _submit(self, executor, kind, file_path):
+        if kind == 'br':
+            return executor.submit(compress_brotli, file_path, self.public_dir,
+                                   self.brotli_quality(file_path), self._brotli_mode(file_path))
+        if kind == 'gz':
+            return executor.submit(compress_gzip, file_path)
+        return executor.submit(compress_with_dictionary, file_path, self.public_dir, kind,
+                               str(self.dictionary.path), self.quality)
+
+    def _run_tasks(self, tasks):
+        """Compress (kind, path) tasks in parallel, largest first."""
+        tasks.sort(key=lambda task: (-self._source(task[1])[1].st_size, task[0]))
+        processes = self.processes and len(tasks) > 1
+        executor_class = (concurrent.futures.ProcessPoolExecutor if processes
+                          else concurrent.futures.ThreadPoolExecutor)
+        print(f"\n   Compressing {len(tasks)} files, largest first "
+              f"({self.workers} {'processes' if processes else 'threads'})...")
+
+        started = time.perf_counter()
+        logs = []
+        with executor_class(max_workers=self.workers) as ex:
+            futures = {self._submit(ex, kind, f): (kind, f) for kind, f in tasks}
+            for future in concurrent.futures.as_completed(futures):
+                kind, f = futures[future]
+                stats = self._kind_stats[kind]
+                try:
+                    r = future.result()
+                except Exception as e:  # e.g. a worker process died
+                    r = {'success': None, 'log': f"   ❌ Error compressing {f}: {e}"}
+                if kind == 'br':
+                    stats['files_processed'] += 1
+                if r['success'] is not None:
+                    self._record(f, kind, r['sidecar'])
+                    self._count_throughput(kind, f, r)
+                if r['success'] is True:
+                    stats['files_compressed'] += 1
+                    stats['original_size'] += r['original_size']
+                    stats['compressed_size'] += r['compressed_size']
+                    if r['log']:
+                        logs.append(r['log'])
+                elif r['success'] is False:
+                    stats['files_skipped'] += 1
+                else:  # None = error
+                    if r['log']:
+                        print(r['log'])
+        self.wall_seconds += time.perf_counter() - started
+        # Print file results together after all workers finish so output
+        # isn't interleaved.  Sort for reproducible ordering.
+        for log in sorted(logs):
+            print(log)
+
+    def _count_throughput(self, kind, file_path, result):
+        key = (kind, file_path.suffix.lower())
+        entry = self.throughput.setdefault(key, {'files': 0, 'bytes': 0, 'seconds': 0.0,
+                                                 'qualities': set()})
+        entry['files'] += 1
+        entry['bytes'] += result['original_size']
+        entry['seconds'] += result['seconds']
+        if kind == 'br':
+            entry['qualities'].add(self.brotli_quality(file_path))
+
+    def print_dictionary_savings(self):
+        """Dictionary variants against per-file Brotli for the same files."""
+        for encoding, stats in self.dictionary_stats.items():
+            br_total = variant_total = files = 0
+            for entry in self._records.values():
+                if entry.get(encoding) and entry.get('br'):
+                    files += 1
+                    br_total += entry['br']['size']
+                    variant_total += entry[encoding]['size']
+            print(f"   {encoding:<6} — compressed: {stats['files_compressed']}, "
+                  f"reused: {stats['files_reused']}, skipped: {stats['files_skipped']}, "
+                  f"dropped (not smaller than .br): {stats['files_dropped']}")
+            if br_total:
+                saving = (1 - variant_total / br_total) * 100
+                print(f"\n📖 {encoding} with shared dictionary ({files} files): "
+                      f"{variant_total/1024/1024:.2f} MB vs {br_total/1024/1024:.2f} MB per-file "
+                      f"Brotli ({abs(saving):.1f}% {'smaller' if saving >= 0 else 'larger'})")
+
+    def print_throughput(self):
+        """Per-type compression throughput (input MB per worker-second)."""
+        if not self.throughput:
+            return
+        print(f"\n⚡ Throughput ({self.wall_seconds:.1f}s wall clock, {self.workers} workers):")
+        for (kind, ext), entry in sorted(self.throughput.items(),
+                                         key=lambda item: (item[0][0] != 'br', -item[1]['seconds'])):
+            mb = entry['bytes'] / 1024 / 1024
+            rate = mb / entry['seconds'] if entry['seconds'] else 0
+            qualities = ','.join(f"q{q}" for q in sorted(entry['qualities']))
+            label = {'br': 'Brotli', 'gz': 'Gzip'}.get(kind, kind)
+            print(f"   {label:<6} {ext:<6} {entry['files']:>6} files {mb:>8.2f} MB "
+                  f"{entry['seconds']:>7.1f}s {rate:>7.2f} MB/s {qualities}")
+
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python3 brotli_compress.py <public_directory> [quality]")
-        print("\nArguments:")
-        print("  public_directory  Path to the static site directory (e.g., ./public)")
-        print("  quality          Compression quality 0-11 (default: 11, max compression)")
-        print("\nExample:")
-        print("  python3 brotli_compress.py ./public")
-        print("  python3 brotli_compress.py ./public 9  # Faster compression")
-        sys.exit(1)
-    
-    public_dir = sys.argv[1]
-    quality = int(sys.argv[2]) if len(sys.argv) > 2 else 11
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Pre-compress static site files with Brotli + Gzip',
+        epilog='Example: python3 brotli_compress.py ./public 9  # Faster compression',
+    )
+    parser.add_argument('public_dir',
+                        help='Path to the static site directory (e.g., ./public)')
+    parser.add_argument('quality', nargs='?', type=int, default=11,
+                        help='Compression quality 0-11 (default: 11, max compression)')
+    parser.add_argument('--reuse-from', metavar='DIR', default=None,
+                        help='Previous build directory; its .br/.gz files are copied '
+                             'for content that has not changed')
+    parser.add_argument('--dictionary', action='store_true',
+                        help='Also write .dcb/.dcz variants of HTML/CSS compressed with the '
+                             'shared dictionary in <public_dir>/dictionaries/ (trained by '
+                             'compression_dictionary.py; skipped if missing)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Parallel compression workers (default: CPU count)')
+    parser.add_argument('--threads', action='store_true',
+                        help='Use a thread pool instead of a process pool')
+    parser.add_argument('--cold-quality', type=int, default=COLD_QUALITY,
+                        help=f'Brotli quality for data files (JSON, Markdown, ...) of '
+                             f'{COLD_MIN_SIZE // 1024}KB or more (default: {COLD_QUALITY}; '
+                             f'set to the main quality to disable)')
+    args = parser.parse_args()
+
+    public_dir = args.public_dir
+    quality = args.quality
     
     if not Path(public_dir).exists():
         print(f"❌ Error: Directory '{public_dir}' does not exist")
@@ -349,7 +825,24 @@ def main():
         print(f"❌ Error: Quality must be between 0 and 11 (got {quality})")
         sys.exit(1)
     
-    compressor = BrotliCompressor(public_dir, quality)
+    reuse_from = args.reuse_from if args.reuse_from and Path(args.reuse_from).is_dir() else None
+    dictionary = None
+    if args.dictionary:
+        # Never train here: _worker.js is already stamped with the hash
+        dictionary = CompressionDictionary.load(public_dir)
+        if dictionary is not None:
+            dictionary.metadata['encodings'] = [
+                encoding for encoding in dictionary.encodings
+                if encoding in compression_dictionary.available_encodings()
+            ]
+        if dictionary is None or not dictionary.encodings:
+            print("⚠️  No compression dictionary or dictionary encoder available — "
+                  "skipping .dcb/.dcz variants")
+            dictionary = None
+
+    compressor = BrotliCompressor(public_dir, quality, reuse_from=reuse_from,
+                                  workers=args.workers, processes=not args.threads,
+                                  cold_quality=args.cold_quality, dictionary=dictionary)
     compressor.compress_directory()
     
     print("\n✅ Brotli + Gzip compression complete!")
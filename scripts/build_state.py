@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Build state store (SQLite)
+
+Every cache the build keeps between runs lives in one SQLite database,
+.build-state.db in the project root, as JSON values keyed by (kind, key):
+
+    posts, pages, assets   incremental builder: content hash + dates per URL
+    graph                  dependency graph, one row per post URL
+    images                 image optimization cache, per original
+    image_quality          qualities chosen by --target-ssim searches
+    transform              HTML transform cache index (outputs stay on disk)
+    http                   conditional request validators (bodies stay on disk)
+    page_records           build manifest: per-page metadata and text
+
+plus a meta table of scalar values (build timestamps, cache salts).
+
+Entries are read with indexed lookups and written with per-entry upserts, so
+a build only touches the rows it looks up or changes instead of loading and
+rewriting whole JSON files. The database runs in WAL mode: readers never
+block the writer, and concurrent writers (parallel workers, overlapping
+scripts) wait on busy_timeout instead of failing.
+
+The compression manifest is not stored here: it describes the files of one
+deployed tree and travels with it (brotli_compress.py --reuse-from).
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_PATH = '.build-state.db'
+SCHEMA_VERSION = 1
+
+# Seconds a writer waits for another connection's transaction to finish
+BUSY_TIMEOUT = 30
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    kind    TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_updated ON entries (kind, updated);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+_UPSERT = '''
+INSERT INTO entries (kind, key, value, updated) VALUES (?, ?, ?, ?)
+ON CONFLICT (kind, key) DO UPDATE SET value = excluded.value, updated = excluded.updated
+'''
+
+
+def _dumps(value):
+    return json.dumps(value, separators=(',', ':'), sort_keys=True)
+
+
+class BuildState:
+    """Connection to the build state database."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # One connection shared by the build's threads, serialised by _lock;
+        # other processes open their own
+        self._conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT,
+                                     isolation_level=None, check_same_thread=False)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+        atexit.register(self.close)
+
+    @contextmanager
+    def transaction(self):
+        """Group writes into one transaction (nests; the outermost commits)."""
+        with self._lock:
+            if self._depth == 0:
+                self._conn.execute('BEGIN IMMEDIATE')
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._conn.execute('ROLLBACK')
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._conn.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    # ------------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------------
+
+    def table(self, kind):
+        """Dict-like view of one kind's entries."""
+        return StateTable(self, kind)
+
+    def get(self, kind, key, default=None):
+        rows = self._query('SELECT value FROM entries WHERE kind = ? AND key = ?', (kind, key))
+        return json.loads(rows[0][0]) if rows else default
+
+    def put(self, kind, key, value):
+        """Insert or replace one entry."""
+        with self._lock:
+            self._conn.execute(_UPSERT, (kind, key, _dumps(value), time.time()))
+
+    def put_many(self, kind, items):
+        """Insert or replace (key, value) pairs in one transaction."""
+        now = time.time()
+        with self.transaction():
+            self._conn.executemany(
+                _UPSERT, ((kind, key, _dumps(value), now) for key, value in items)
+            )
+
+    def delete(self, kind, keys):
+        """Delete the given keys; returns how many existed."""
+        with self.transaction():
+            cursor = self._conn.executemany(
+                'DELETE FROM entries WHERE kind = ? AND key = ?', ((kind, key) for key in keys)
+            )
+            return cursor.rowcount
+
+    def clear(self, kind):
+        """Delete every entry of kind."""
+        with self._lock:
+            self._conn.execute('DELETE FROM entries WHERE kind = ?', (kind,))
+
+    def count(self, kind):
+        return self._query('SELECT COUNT(*) FROM entries WHERE kind = ?', (kind,))[0][0]
+
+    def keys(self, kind):
+        return [row[0] for row in
+                self._query('SELECT key FROM entries WHERE kind = ? ORDER BY key', (kind,))]
+
+    def items(self, kind):
+        """[(key, value)] for every entry of kind, in key order."""
+        return [(key, json.loads(value)) for key, value in
+                self._query('SELECT key, value FROM entries WHERE kind = ? ORDER BY key', (kind,))]
+
+    def search(self, kind, pattern='', limit=None):
+        """[(key, value, updated)] whose key contains pattern, in key order."""
+        sql = ("SELECT key, value, updated FROM entries WHERE kind = ? AND key LIKE ? ESCAPE '\\' "
+               "ORDER BY key")
+        escaped = pattern.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params = (kind, f'%{escaped}%')
+        if limit:
+            sql += ' LIMIT ?'
+            params += (limit,)
+        return [(key, json.loads(value), updated) for key, value, updated in self._query(sql, params)]
+
+    def recent(self, kind, limit=10):
+        """[(key, value, updated)] most recently written first."""
+        return [(key, json.loads(value), updated) for key, value, updated in self._query(
+            'SELECT key, value, updated FROM entries WHERE kind = ? ORDER BY updated DESC LIMIT ?',
+            (kind, limit),
+        )]
+
+    def older_than(self, kind, cutoff):
+        """Keys of kind last written before cutoff (a Unix time)."""
+        return [row[0] for row in self._query(
+            'SELECT key FROM entries WHERE kind = ? AND updated < ?', (kind, cutoff))]
+
+    def kinds(self):
+        """{kind: entry count} for every kind in the store."""
+        return dict(self._query('SELECT kind, COUNT(*) FROM entries GROUP BY kind ORDER BY kind'))
+
+    # ------------------------------------------------------------------
+    # Meta
+    # ------------------------------------------------------------------
+
+    def get_meta(self, key, default=None):
+        rows = self._query('SELECT value FROM meta WHERE key = ?', (key,))
+        return json.loads(rows[0][0]) if rows else default
+
+    def set_meta(self, key, value):
+        with self._lock:
+            if value is None:
+                self._conn.execute('DELETE FROM meta WHERE key = ?', (key,))
+            else:
+                self._conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                   (key, _dumps(value)))
+
+    def all_meta(self):
+        return {key: json.loads(value) for key, value in
+                self._query('SELECT key, value FROM meta ORDER BY key')}
+
+    def close(self):
+        """Checkpoint the WAL into the database file and close."""
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            except sqlite3.Error:
+                pass  # another connection is still writing; it checkpoints on close
+            self._conn.close()
+            self._conn = None
+
+
+class StateTable(MutableMapping):
+    """One kind of a BuildState, as a mapping that reads and writes through."""
+
+    def __init__(self, state, kind):
+        self.state = state
+        self.kind = kind
+
+    def __getitem__(self, key):
+        value = self.state.get(self.kind, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return self.state.get(self.kind, key, default)
+
+    def __setitem__(self, key, value):
+        self.state.put(self.kind, key, value)
+
+    def __delitem__(self, key):
+        if not self.state.delete(self.kind, [key]):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.state.get(self.kind, key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.state.keys(self.kind))
+
+    def __len__(self):
+        return self.state.count(self.kind)
+
+    def items(self):
+        return self.state.items(self.kind)
+
+    def update(self, other=(), **kwargs):
+        items = other.items() if hasattr(other, 'items') else other
+        self.state.put_many(self.kind, list(items) + list(kwargs.items()))
+
+
+_MISSING = object()
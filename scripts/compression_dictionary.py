@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Shared Compression Dictionary (Compression Dictionary Transport)
+
+Every page repeats the same head, nav, footer, Plausible/Utterances snippets
+and theme markup, and per-file Brotli encodes that boilerplate again in every
+response. With Compression Dictionary Transport (RFC 9842) a browser that
+has fetched the site's dictionary once sends `Available-Dictionary` on later
+requests, and the worker answers with a variant compressed against it, where
+the boilerplate costs a few bytes of back-references:
+
+    page/index.html.dcb   Brotli + dictionary   (Content-Encoding: dcb)
+    page/index.html.dcz   Zstandard + dictionary (Content-Encoding: dcz)
+
+This module trains the dictionary and encodes files with it:
+
+  - Training samples generated HTML and CSS, splits them into markup / rule
+    fragments and keeps the fragments shared by the most files (weighted by
+    length) as a raw-content dictionary, most common last.
+  - The dictionary lives in <public_dir>/dictionaries/<id>.dict, with its
+    metadata (path, SHA-256, encodings) in dictionaries/dictionary.json.
+    It is reused across builds — changing it invalidates every variant and
+    every browser's copy — and retrained after MAX_AGE_DAYS or on --retrain.
+
+brotli_compress.py --dictionary writes the .dcb/.dcz variants and
+stamp_worker_manifest.py bakes the metadata into _worker.js.
+
+dcb needs the brotli command line tool (1.1+, which has --dictionary); dcz
+needs the zstandard package. Each encoding is skipped when unavailable.
+
+Usage:
+    python3 scripts/compression_dictionary.py <public_dir> [--retrain]
+"""
+
+import base64
+import functools
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DICTIONARY_DIR = 'dictionaries'
+METADATA_FILENAME = 'dictionary.json'
+DICTIONARY_SIZE = 64 * 1024
+SAMPLE_FILES = 200
+MAX_AGE_DAYS = 30
+
+# Files that get dictionary-compressed variants
+DICTIONARY_EXTENSIONS = {'.html', '.css'}
+
+# Requests the browser should advertise the dictionary on
+DICTIONARY_MATCH = '/*'
+DICTIONARY_MATCH_DEST = ('document', 'style')
+
+# RFC 9842 framing: magic bytes, then the SHA-256 of the dictionary
+DCB_MAGIC = b'\xff\x44\x43\x42'
+DCZ_MAGIC = b'\x5e\x2a\x4d\x18\x20\x00\x00\x00'
+
+ZSTD_LEVEL = 19
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Markup fragments (a tag and the text up to the next tag) and CSS rules;
+# longer fragments are page content, not boilerplate
+_FRAGMENT_RE = {
+    '.html': re.compile(rb'<[^<>]{1,2048}>[^<]{0,512}'),
+    '.css': re.compile(rb'[^{}]{1,512}\{[^{}]{0,2048}\}'),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def brotli_cli_supports_dictionary():
+    """True if a brotli CLI with --dictionary (1.1+) is on PATH."""
+    if not shutil.which('brotli'):
+        return False
+    try:
+        result = subprocess.run(['brotli', '--help'], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return False
+    return '--dictionary' in result.stdout + result.stderr
+
+
+def available_encodings():
+    """Dictionary content encodings this machine can produce."""
+    encodings = []
+    if brotli_cli_supports_dictionary():
+        encodings.append('dcb')
+    if zstandard is not None:
+        encodings.append('dcz')
+    return encodings
+
+
+def train_dictionary(samples, size=DICTIONARY_SIZE):
+    """Raw-content dictionary from [(suffix, bytes)] samples.
+
+    Fragments that occur in at least two samples are scored by
+    length x (files containing them - 1); the best fill the dictionary,
+    ordered so the most widely shared end up last (nearest to the data,
+    hence the cheapest back-references).
+    """
+    doc_freq = {}
+    for suffix, data in samples:
+        pattern = _FRAGMENT_RE.get(suffix)
+        if pattern is None:
+            continue
+        for fragment in set(pattern.findall(data)):
+            doc_freq[fragment] = doc_freq.get(fragment, 0) + 1
+
+    shared = [(len(fragment) * (count - 1), count, fragment)
+              for fragment, count in doc_freq.items() if count > 1]
+    shared.sort(key=lambda item: (-item[0], item[2]))
+
+    chosen = []
+    used = 0
+    for _, count, fragment in shared:
+        if used + len(fragment) > size:
+            continue
+        chosen.append((count, fragment))
+        used += len(fragment)
+    chosen.sort(key=lambda item: (item[0], item[1]))
+    return b''.join(fragment for _, fragment in chosen)
+
+
+def _frame_header(encoding, digest):
+    return (DCB_MAGIC if encoding == 'dcb' else DCZ_MAGIC) + digest
+
+
+@functools.lru_cache(maxsize=4)
+def _dictionary_bytes(dictionary_path):
+    data = Path(dictionary_path).read_bytes()
+    return data, hashlib.sha256(data).digest()
+
+
+@functools.lru_cache(maxsize=4)
+def _zstd_dictionary(dictionary_path):
+    data, _ = _dictionary_bytes(dictionary_path)
+    return zstandard.ZstdCompressionDict(data, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+
+def _zstd_compressor(dictionary_path):
+    # A compressor per call: they are not safe to share between threads
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dictionary(dictionary_path))
+
+
+def encode_file(encoding, src_path, out_path, dictionary_path, quality=11):
+    """Compress src_path with the dictionary into out_path, framed for
+    Content-Encoding dcb/dcz. Streams, so memory does not grow with the file.
+    """
+    dictionary_path = str(dictionary_path)
+    if encoding not in ('dcb', 'dcz'):
+        raise ValueError(f'unknown dictionary encoding: {encoding}')
+    _, digest = _dictionary_bytes(dictionary_path)
+    with open(src_path, 'rb') as src, open(out_path, 'wb') as out:
+        out.write(_frame_header(encoding, digest))
+        if encoding == 'dcz':
+            size = Path(src_path).stat().st_size
+            with _zstd_compressor(dictionary_path).stream_writer(out, size=size,
+                                                                 closefd=False) as writer:
+                shutil.copyfileobj(src, writer, STREAM_CHUNK_SIZE)
+        else:
+            out.flush()
+            subprocess.run(
+                ['brotli', '--stdout', f'--quality={quality}', f'--dictionary={dictionary_path}'],
+                stdin=src, stdout=out, stderr=subprocess.PIPE, check=True,
+            )
+
+
+class CompressionDictionary:
+    """The site dictionary: bytes on disk plus its metadata."""
+
+    def __init__(self, public_dir, metadata):
+        self.public_dir = Path(public_dir)
+        self.metadata = metadata
+
+    @property
+    def id(self):
+        return self.metadata['id']
+
+    @property
+    def path(self):
+        """Dictionary file on disk."""
+        return self.public_dir / self.metadata['path'].lstrip('/')
+
+    @property
+    def encodings(self):
+        return self.metadata['encodings']
+
+    @classmethod
+    def load(cls, public_dir):
+        """The dictionary in public_dir, or None if missing or unreadable."""
+        metadata_file = Path(public_dir) / DICTIONARY_DIR / METADATA_FILENAME
+        try:
+            metadata = json.loads(metadata_file.read_text(encoding='utf-8'))
+        except (IOError, ValueError):
+            return None
+        dictionary = cls(public_dir, metadata)
+        if not dictionary.path.exists():
+            return None
+        return dictionary
+
+    @classmethod
+    def train(cls, public_dir, size=DICTIONARY_SIZE, sample_files=SAMPLE_FILES):
+        """Train a dictionary from public_dir's HTML/CSS and write it there."""
+        public_dir = Path(public_dir)
+        files = sorted(f for f in public_dir.rglob('*')
+                       if f.suffix in DICTIONARY_EXTENSIONS and f.is_file())
+        if not files:
+            return None
+        # Evenly spaced, so the sample spans the whole site deterministically
+        step = max(1, len(files) // sample_files)
+        samples = [(f.suffix, f.read_bytes()) for f in files[::step][:sample_files]]
+        data = train_dictionary(samples, size)
+        if not data:
+            return None
+
+        digest = hashlib.sha256(data).digest()
+        dictionary_id = digest.hex()[:16]
+        out_dir = public_dir / DICTIONARY_DIR
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for old in out_dir.glob('*.dict'):
+            old.unlink()
+        (out_dir / f'{dictionary_id}.dict').write_bytes(data)
+
+        metadata = {
+            'id': dictionary_id,
+            'path': f'/{DICTIONARY_DIR}/{dictionary_id}.dict',
+            'hash': base64.b64encode(digest).decode('ascii'),
+            'match': DICTIONARY_MATCH,
+            'match_dest': list(DICTIONARY_MATCH_DEST),
+            'encodings': available_encodings(),
+            'size': len(data),
+            'samples': len(samples),
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        }
+        (out_dir / METADATA_FILENAME).write_text(
+            json.dumps(metadata, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+        return cls(public_dir, metadata)
+
+    @classmethod
+    def load_or_train(cls, public_dir, retrain=False, max_age_days=MAX_AGE_DAYS):
+        """The existing dictionary unless missing, stale or retrain is set."""
+        dictionary = None if retrain else cls.load(public_dir)
+        if dictionary is not None:
+            created = datetime.fromisoformat(dictionary.metadata['created'])
+            age_days = (datetime.now(timezone.utc) - created).days
+            if age_days <= max_age_days:
+                # Re-check encodings: the previous build may have had other tools
+                dictionary.metadata['encodings'] = available_encodings()
+                return dictionary
+        return cls.train(public_dir)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Train (or reuse) the shared compression dictionary for a static site'
+    )
+    parser.add_argument('public_dir', help='Path to the static site directory')
+    parser.add_argument('--retrain', action='store_true',
+                        help='Train a new dictionary even if a recent one exists')
+    args = parser.parse_args()
+
+    if not Path(args.public_dir).is_dir():
+        print(f"❌ Error: Directory '{args.public_dir}' does not exist")
+        return 1
+
+    existing = None if args.retrain else CompressionDictionary.load(args.public_dir)
+    started = time.time()
+    dictionary = CompressionDictionary.load_or_train(args.public_dir, retrain=args.retrain)
+    if dictionary is None:
+        print("⚠️  No HTML/CSS to train a compression dictionary from")
+        return 0
+    if existing is not None and existing.id == dictionary.id:
+        print(f"📖 Reusing compression dictionary {dictionary.id} "
+              f"({dictionary.metadata['size']:,} bytes, created {dictionary.metadata['created']})")
+    else:
+        print(f"📖 Trained compression dictionary {dictionary.id}: "
+              f"{dictionary.metadata['size']:,} bytes from {dictionary.metadata['samples']} files "
+              f"in {time.time() - started:.1f}s")
+    if dictionary.encodings:
+        print(f"   Encodings: {', '.join(dictionary.encodings)}")
+    else:
+        print("⚠️  Neither a brotli CLI with --dictionary nor zstandard is available — "
+              "no dictionary-compressed variants can be produced")
+    # Keep dictionary.json's encodings in line with this machine
+    (Path(args.public_dir) / DICTIONARY_DIR / METADATA_FILENAME).write_text(
+        json.dumps(dictionary.metadata, indent=2, sort_keys=True) + '\n', encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -34,6 +34,17 @@ class Config:
     MAX_WORKERS = 3
     REQUEST_TIMEOUT = 30
 
+    # Async crawl mode (wp_to_static_generator.py --async-crawl): size of the
+    # pooled HTTP connection set, and the starting / maximum in-flight
+    # requests per host for the adaptive concurrency limiter.
+    ASYNC_CRAWL_MAX_CONNECTIONS = 16
+    ASYNC_CRAWL_INITIAL_CONCURRENCY = 4
+    ASYNC_CRAWL_MAX_PER_HOST = 16
+
+    # Processes running process_html() in the page pipeline. 0 = one per
+    # CPU core; 1 = parse in-process on the fetch threads.
+    PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '0'))
+
     # Homepage stats — feeds the terminal stats block on the homepage.
     # vExpert membership year used to compute years.vexpert; update if the
     # source-of-truth changes.
@@ -64,6 +75,9 @@ class Config:
         print(f"Plausible URL:        {cls.PLAUSIBLE_URL}")
         print(f"Max Workers:          {cls.MAX_WORKERS}")
         print(f"Request Timeout:      {cls.REQUEST_TIMEOUT}s")
+        print(f"Async Crawl Pool:     {cls.ASYNC_CRAWL_MAX_CONNECTIONS} connections, "
+              f"{cls.ASYNC_CRAWL_INITIAL_CONCURRENCY}-{cls.ASYNC_CRAWL_MAX_PER_HOST}/host")
+        print(f"Parse Workers:        {cls.PARSE_WORKERS or 'one per core'}")
         print("=" * 60)
 
 
@@ -6,7 +6,9 @@ Processes HTML files to add modern image format support
 Features:
 - Creates <picture> elements with AVIF/WebP sources
 - Generates responsive srcsets for modern formats based on img srcset
-- Properly orders sources (AVIF > WebP > fallback img)
+- Properly orders sources (AVIF > JPEG XL > WebP > fallback img)
+- Answers "which formats exist for this image?" from one scan of
+  wp-content/uploads instead of probing the filesystem per image
 """
 
 import os
@@ -16,6 +18,8 @@ from pathlib import Path
 from typing import List, Tuple, Optional
 from bs4 import BeautifulSoup
 
+from image_manifest import ImageIndex
+
 
 class ImageToPictureConverter:
     """Converts img tags to picture elements with AVIF/WebP sources and responsive srcsets"""
@@ -28,7 +32,15 @@ class ImageToPictureConverter:
             'images_skipped': 0,
             'responsive_srcsets_added': 0,
         }
-        self.debug_count = 0  # For debugging first few images
+        self.index = ImageIndex.scan(self.directory)
+
+    def _has_variant(self, image_path: Path, format_ext: str) -> bool:
+        """Whether a modern-format version of image_path exists (from the index)."""
+        try:
+            rel_path = image_path.relative_to(self.directory).as_posix()
+        except ValueError:
+            return False
+        return self.index.has(rel_path, format_ext)
     
     def _get_responsive_srcset(self, img_srcset: str, format_ext: str) -> Optional[str]:
         """
@@ -62,64 +74,40 @@ class ImageToPictureConverter:
                 
                 # Check if modern format exists
                 modern_path = img_path.with_suffix(format_ext)
-                if modern_path.exists():
+                if self._has_variant(img_path, format_ext):
                     modern_url = '/' + str(modern_path.relative_to(self.directory))
                     srcset_parts.append(f"{modern_url} {width_descriptor}")
         
         return ', '.join(srcset_parts) if srcset_parts else None
     
-    def _has_modern_format(self, img_src: str, base_path: Path) -> Tuple[bool, bool]:
-        """Check if AVIF and WebP versions exist for an image"""
+    def _src_path(self, img_src: str) -> Optional[str]:
+        """Site-relative path for an img src, or None if it is not a local file"""
         if not img_src:
-            return False, False
+            return None
         
-        # Skip data URIs
-        if img_src.startswith('data:'):
-            return False, False
+        # Skip data URIs and protocol-relative URLs
+        if img_src.startswith(('data:', '//')):
+            return None
         
         # Handle absolute URLs with the site domain - convert to relative
         if img_src.startswith(('http://', 'https://')):
             # Extract path after domain (e.g., https://jameskilby.co.uk/wp-content/... -> wp-content/...)
             try:
                 from urllib.parse import urlparse
-                parsed = urlparse(img_src)
-                img_path = parsed.path.lstrip('/')
-            except:
-                return False, False
-        elif img_src.startswith('//'):
-            # Protocol-relative URLs
-            return False, False
-        else:
-            # Relative path
-            img_path = img_src.lstrip('/')
+                return urlparse(img_src).path.lstrip('/')
+            except ValueError:
+                return None
         
-        full_path = base_path / img_path
-        
-        # Debug first few images
-        if self.debug_count < 3:
-            self.debug_count += 1
-            print(f"\n🔍 DEBUG Image #{self.debug_count}:")
-            print(f"   img_src: {img_src}")
-            print(f"   img_path: {img_path}")
-            print(f"   full_path: {full_path}")
-            print(f"   full_path exists: {full_path.exists()}")
-        
-        if not full_path.exists():
-            if self.debug_count <= 3:
-                print(f"   ⚠️  Original image not found, checking for modern formats...")
-
-        # Check for AVIF and WebP versions
-        avif_path = full_path.with_suffix('.avif')
-        webp_path = full_path.with_suffix('.webp')
-        
-        if self.debug_count <= 3:
-            print(f"   avif_path: {avif_path}")
-            print(f"   avif exists: {avif_path.exists()}")
-            print(f"   webp_path: {webp_path}")
-            print(f"   webp exists: {webp_path.exists()}")
-        
-        return avif_path.exists(), webp_path.exists()
+        # Relative path
+        return img_src.lstrip('/')
     
+    def _has_modern_format(self, img_src: str) -> Tuple[bool, bool]:
+        """Check if AVIF and WebP versions exist for an image"""
+        img_path = self._src_path(img_src)
+        if not img_path:
+            return False, False
+        return self.index.has(img_path, 'avif'), self.index.has(img_path, 'webp')
+
     def _should_convert_img(self, img) -> bool:
         """Determine if an img tag should be converted"""
         # Skip if already inside a picture element
@@ -174,6 +162,14 @@ class ImageToPictureConverter:
             
             picture.append(source_avif)
         
+        # Add JPEG XL source if available (only optimize_images.py --jxl produces them)
+        jxl_srcset = self._get_responsive_srcset(img_srcset, '.jxl') if img_srcset else None
+        if jxl_srcset or self.index.has(self._src_path(src) or '', 'jxl'):
+            source_jxl = soup.new_tag('source')
+            source_jxl['type'] = 'image/jxl'
+            source_jxl['srcset'] = jxl_srcset or f"{base_src}.jxl"
+            picture.append(source_jxl)
+        
         # Add WebP source if available
         if has_webp:
             source_webp = soup.new_tag('source')
@@ -237,6 +233,8 @@ class ImageToPictureConverter:
                     format_ext = '.avif'
                 elif source_type == 'image/webp':
                     format_ext = '.webp'
+                elif source_type == 'image/jxl':
+                    format_ext = '.jxl'
                 else:
                     continue
                 
@@ -269,31 +267,17 @@ class ImageToPictureConverter:
             # Find all img tags
             img_tags = soup.find_all('img')
             
-            # Debug first file
-            if self.debug_count == 0 and img_tags:
-                print(f"\n🔍 DEBUG: First HTML file: {html_file}")
-                print(f"   Total img tags found: {len(img_tags)}")
-                print(f"   Picture elements updated: {pictures_updated}")
-                if img_tags:
-                    first_img = img_tags[0]
-                    print(f"   First img src: {first_img.get('src', 'NO SRC')}")
-            
             for img in img_tags:
                 if not self._should_convert_img(img):
                     self.stats['images_skipped'] += 1
                     continue
                 
                 # Check if modern formats exist
-                has_avif, has_webp = self._has_modern_format(
-                    img.get('src', ''),
-                    self.directory
-                )
+                has_avif, has_webp = self._has_modern_format(img.get('src', ''))
                 
                 # Only convert if at least one modern format exists
                 if not (has_avif or has_webp):
                     self.stats['images_skipped'] += 1
-                    if self.debug_count <= 3:
-                        print(f"   ⚠️  No AVIF or WebP found for this image")
                     continue
                 
                 # Create picture element and replace img
@@ -329,6 +313,7 @@ class ImageToPictureConverter:
             return self.stats
         
         print(f"📄 Found {len(html_files)} HTML files")
+        print(f"🗂️  Indexed {len(self.index)} images under wp-content/uploads")
         print("🖼️  Converting img tags to picture elements...")
         
         for html_file in html_files:
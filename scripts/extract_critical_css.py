@@ -11,10 +11,165 @@ This significantly improves First Contentful Paint (FCP) by 30-50%.
 import sys
 from pathlib import Path
 from bs4 import BeautifulSoup
+import hashlib
 import re
 import subprocess
 import json
 
+# At-rules whose blocks contain keyframe stops or font descriptors —
+# not selector-based, so we must not recurse.
+SKIP_AT_RULES = ('@keyframes', '@-webkit-keyframes', '@-moz-keyframes',
+                 '@-o-keyframes', '@font-face')
+
+# Distinct <style> blocks kept parsed per process before the cache is reset
+MAX_CACHED_INLINE_STYLES = 256
+
+
+def selector_keys(selector):
+    """Tokens a selector can match in a critical-selector set.
+
+    Pseudo-classes/elements and attribute selectors are dropped and the
+    compound selector is split on combinators; element parts also
+    contribute their bare tag name (e.g. 'h2.title' -> 'h2').
+    """
+    # Remove pseudo-classes and pseudo-elements for matching
+    clean_selector = re.sub(r':+[\w-]+(\([^)]*\))?', '', selector)
+    clean_selector = re.sub(r'\[[^\]]+\]', '', clean_selector)
+
+    keys = set()
+    # Split compound selectors
+    for part in re.split(r'[,\s>+~]', clean_selector):
+        part = part.strip()
+        keys.add(part)
+        # Check if it's an element selector (no . or #)
+        if part and not part.startswith('.') and not part.startswith('#'):
+            keys.add(re.sub(r'[^a-zA-Z0-9]', '', part))
+    return frozenset(keys)
+
+
+class ParsedStylesheet:
+    """A stylesheet tokenized once into rules with pre-split selectors.
+
+    Parsing is the expensive part of critical CSS extraction, and every page
+    links the same theme stylesheets, so CriticalCSSExtractor caches these
+    and each page only runs select() against its own critical selectors.
+
+    Rules are indexed by selector key (class, id, element token), so select()
+    only looks at rules that share a key with the page — its cost follows
+    the page's selector count and matches, not the stylesheet size.
+    """
+
+    def __init__(self, css_content):
+        self.groups = []   # at-rule headers (@media ..., @supports ...)
+        self.paths = []    # per rule: tuple of enclosing group ids, outermost first
+        self.texts = []    # per rule: 'selector{block}'
+        self.index = {}    # selector key -> ascending rule numbers
+        # Strip comments before parsing so that '{' / '}' inside comments
+        # don't confuse the depth tracker.
+        self._tokenize(re.sub(r'/\*.*?\*/', '', css_content, flags=re.DOTALL), ())
+
+    def _tokenize(self, css_content, path):
+        """Split CSS into rules with a brace-depth tokenizer.
+
+        Uses a brace-depth tokenizer rather than a regex so that nested
+        at-rules (@media, @supports) and minified CSS are handled correctly.
+
+        Strategy:
+          - @keyframes / @font-face blocks are skipped entirely (their inner
+            tokens are not selector-based and would produce false matches).
+          - @media / @supports / @layer blocks are recursed into; their rules
+            are recorded under the at-rule header.
+          - @import / @charset / @namespace end with ';' before the next '{';
+            these are skipped by detecting the semicolon first.
+          - Regular rules are recorded with their selector keys.
+        """
+        i = 0
+        n = len(css_content)
+
+        while i < n:
+            # Skip whitespace
+            while i < n and css_content[i].isspace():
+                i += 1
+            if i >= n:
+                break
+
+            brace_pos = css_content.find('{', i)
+            if brace_pos == -1:
+                break  # No more rules
+
+            # If a ';' comes before the next '{' this is an at-statement
+            # (@import, @charset, @namespace) with no block — skip it.
+            semi_pos = css_content.find(';', i)
+            if semi_pos != -1 and semi_pos < brace_pos:
+                i = semi_pos + 1
+                continue
+
+            selector = css_content[i:brace_pos].strip()
+
+            # Walk forward to find the matching closing brace, tracking depth.
+            depth = 1
+            j = brace_pos + 1
+            while j < n and depth > 0:
+                if css_content[j] == '{':
+                    depth += 1
+                elif css_content[j] == '}':
+                    depth -= 1
+                j += 1
+
+            block_content = css_content[brace_pos + 1:j - 1]
+            i = j  # Advance past the closing brace
+
+            if selector.startswith('@'):
+                # Normalise the at-keyword for comparison.
+                at_keyword = re.split(r'[\s(]', selector, maxsplit=1)[0].lower()
+
+                if at_keyword in SKIP_AT_RULES:
+                    # Keyframes / font-face: skip entirely.
+                    continue
+
+                # Conditional group rules (@media, @supports, @layer …):
+                # recurse, keeping only matching inner rules at select time.
+                self.groups.append(selector)
+                self._tokenize(block_content, path + (len(self.groups) - 1,))
+            else:
+                rule = len(self.texts)
+                self.paths.append(path)
+                self.texts.append(f"{selector}{{{block_content}}}")
+                for key in selector_keys(selector):
+                    self.index.setdefault(key, []).append(rule)
+
+    def select(self, critical_selectors):
+        """Rules matching critical_selectors, re-wrapped in their at-rules.
+
+        Returns one string per top-level rule or at-rule block, in source
+        order; at-rule blocks with no matching rules are omitted.
+        """
+        matched = set()
+        for selector in critical_selectors:
+            rules = self.index.get(selector)
+            if rules:
+                matched.update(rules)
+        return self._render(sorted(matched), 0)
+
+    def _render(self, indexes, depth):
+        rules = []
+        i = 0
+        while i < len(indexes):
+            path = self.paths[indexes[i]]
+            if len(path) == depth:
+                rules.append(self.texts[indexes[i]])
+                i += 1
+                continue
+            group = path[depth]
+            j = i
+            while j < len(indexes) and len(self.paths[indexes[j]]) > depth \
+                    and self.paths[indexes[j]][depth] == group:
+                j += 1
+            inner = ''.join(self._render(indexes[i:j], depth + 1))
+            rules.append(f"{self.groups[group]}{{{inner}}}")
+            i = j
+        return rules
+
 
 class CriticalCSSExtractor:
     """Extract and inline critical CSS for faster rendering"""
@@ -24,6 +179,9 @@ class CriticalCSSExtractor:
         self.files_processed = 0
         self.css_inlined = 0
         self.max_inline_critical = 12000
+        # Parsed stylesheets, reused across every page this process handles
+        self._stylesheets = {}    # path -> ((mtime_ns, size), ParsedStylesheet)
+        self._inline_styles = {}  # content hash -> ParsedStylesheet
 
     def process_all_files(self):
         """Process all HTML files in the public directory"""
@@ -144,9 +302,8 @@ class CriticalCSSExtractor:
         # Find all style tags
         for style_tag in soup.find_all('style'):
             if style_tag.string:
-                css_content = style_tag.string
-                rules = self._parse_css_rules(css_content, selectors)
-                critical_rules.extend(rules)
+                parsed = self._parsed_inline_css(str(style_tag.string))
+                critical_rules.extend(parsed.select(selectors))
 
         # Find all external CSS files and extract their rules
         for link in soup.find_all('link', rel='stylesheet'):
@@ -155,10 +312,8 @@ class CriticalCSSExtractor:
                 css_path = self._resolve_css_path(href)
                 if css_path and css_path.exists():
                     try:
-                        with open(css_path, 'r', encoding='utf-8') as f:
-                            css_content = f.read()
-                            rules = self._parse_css_rules(css_content, selectors)
-                            critical_rules.extend(rules)
+                        parsed = self._parsed_stylesheet(css_path)
+                        critical_rules.extend(parsed.select(selectors))
                     except Exception as e:
                         # Silently skip if we can't read the file
                         pass
@@ -178,108 +333,34 @@ class CriticalCSSExtractor:
         return minified_css
 
     def _parse_css_rules(self, css_content, critical_selectors):
-        """Parse CSS and extract rules matching critical selectors.
-
-        Uses a brace-depth tokenizer rather than a regex so that nested
-        at-rules (@media, @supports) and minified CSS are handled correctly.
-
-        Strategy:
-          - @keyframes / @font-face blocks are skipped entirely (their inner
-            tokens are not selector-based and would produce false matches).
-          - @media / @supports / @layer blocks are recursed into; only the
-            matching inner rules are kept, wrapped in the at-rule header.
-          - @import / @charset / @namespace end with ';' before the next '{';
-            these are skipped by detecting the semicolon first.
-          - Regular rules are tested against critical_selectors and included
-            when they match.
-        """
-        # Strip comments before parsing so that '{' / '}' inside comments
-        # don't confuse the depth tracker.
-        css_content = re.sub(r'/\*.*?\*/', '', css_content, flags=re.DOTALL)
-
-        rules = []
-        i = 0
-        n = len(css_content)
-
-        # At-rules whose blocks contain keyframe stops or font descriptors —
-        # not selector-based, so we must not recurse.
-        SKIP_AT_RULES = ('@keyframes', '@-webkit-keyframes', '@-moz-keyframes',
-                         '@-o-keyframes', '@font-face')
-
-        while i < n:
-            # Skip whitespace
-            while i < n and css_content[i].isspace():
-                i += 1
-            if i >= n:
-                break
-
-            brace_pos = css_content.find('{', i)
-            if brace_pos == -1:
-                break  # No more rules
-
-            # If a ';' comes before the next '{' this is an at-statement
-            # (@import, @charset, @namespace) with no block — skip it.
-            semi_pos = css_content.find(';', i)
-            if semi_pos != -1 and semi_pos < brace_pos:
-                i = semi_pos + 1
-                continue
-
-            selector = css_content[i:brace_pos].strip()
-
-            # Walk forward to find the matching closing brace, tracking depth.
-            depth = 1
-            j = brace_pos + 1
-            while j < n and depth > 0:
-                if css_content[j] == '{':
-                    depth += 1
-                elif css_content[j] == '}':
-                    depth -= 1
-                j += 1
-
-            block_content = css_content[brace_pos + 1:j - 1]
-            i = j  # Advance past the closing brace
-
-            if selector.startswith('@'):
-                # Normalise the at-keyword for comparison.
-                at_keyword = re.split(r'[\s(]', selector, maxsplit=1)[0].lower()
-
-                if at_keyword in SKIP_AT_RULES:
-                    # Keyframes / font-face: skip entirely.
-                    continue
-
-                # Conditional group rules (@media, @supports, @layer …):
-                # recurse and keep only the matching inner rules.
-                inner = self._parse_css_rules(block_content, critical_selectors)
-                if inner:
-                    rules.append(f"{selector}{{{''.join(inner)}}}")
-            else:
-                if self._is_critical_selector(selector, critical_selectors):
-                    rules.append(f"{selector}{{{block_content}}}")
-
-        return rules
+        """Parse CSS and extract rules matching critical selectors."""
+        return ParsedStylesheet(css_content).select(critical_selectors)
 
     def _is_critical_selector(self, selector, critical_selectors):
         """Check if a CSS selector matches critical selectors"""
-        # Remove pseudo-classes and pseudo-elements for matching
-        clean_selector = re.sub(r':+[\w-]+(\([^)]*\))?', '', selector)
-        clean_selector = re.sub(r'\[[^\]]+\]', '', clean_selector)
-
-        # Split compound selectors
-        parts = re.split(r'[,\s>+~]', clean_selector)
-
-        for part in parts:
-            part = part.strip()
-            if part in critical_selectors:
-                return True
-
-            # Check if it's an element selector (no . or #)
-            if part and not part.startswith('.') and not part.startswith('#'):
-                # Check if element name matches
-                element_name = re.sub(r'[^a-zA-Z0-9]', '', part)
-                if element_name in critical_selectors:
-                    return True
-
-        return False
+        return not selector_keys(selector).isdisjoint(critical_selectors)
+
+    def _parsed_stylesheet(self, css_path):
+        """ParsedStylesheet for a CSS file, reparsed only when it changes."""
+        stat = css_path.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        cached = self._stylesheets.get(css_path)
+        if cached and cached[0] == version:
+            return cached[1]
+        with open(css_path, 'r', encoding='utf-8') as f:
+            parsed = ParsedStylesheet(f.read())
+        self._stylesheets[css_path] = (version, parsed)
+        return parsed
+
+    def _parsed_inline_css(self, css_content):
+        """ParsedStylesheet for a <style> block, keyed by content hash."""
+        key = hashlib.blake2b(css_content.encode('utf-8'), digest_size=16).digest()
+        parsed = self._inline_styles.get(key)
+        if parsed is None:
+            if len(self._inline_styles) >= MAX_CACHED_INLINE_STYLES:
+                self._inline_styles.clear()
+            parsed = self._inline_styles[key] = ParsedStylesheet(css_content)
+        return parsed
 
     def _resolve_css_path(self, href):
         """Resolve CSS file path from href"""
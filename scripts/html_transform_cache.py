@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache for the single-pass HTML transformer
+
+An incremental build seeds static-output/ from public/, so most HTML files the
+transformer sees are either its own output from the previous run or a page the
+generator re-rendered byte-for-byte identically. Both are recognised by hash
+and handled without parsing:
+
+  - page hash is a known transformer *output*  -> skip (already transformed)
+  - page hash is a known transformer *input*   -> restore the stored output
+
+An entry is only trusted while the page's artefacts are unchanged: the
+stylesheets it links (critical CSS is extracted from them) and which AVIF/WebP
+variants exist for its images (drives <picture> conversion). Both are
+recorded per page and re-checked on lookup, with memoized stylesheet hashes
+and the picture converter's uploads index.
+
+The whole cache is salted with TRANSFORM_CACHE_VERSION, the source of the
+transform modules and the skip flags, so changing any transform invalidates
+it automatically.
+
+The index ({hash: entry}) lives in the build state store (kind 'transform',
+salt in meta 'transform_salt'); entries are looked up one by one and only
+this run's new entries are written. Outputs stay on disk (default
+.html_transform_cache/ in the project root):
+    objects/<aa>/<hash>.html.gz     transformer outputs, by output hash
+"""
+
+import gzip
+import hashlib
+import json
+from pathlib import Path
+from urllib.parse import urlparse
+
+from build_state import BuildState
+
+DEFAULT_CACHE_DIR = '.html_transform_cache'
+
+# Bump to invalidate every cached transform
+TRANSFORM_CACHE_VERSION = 1
+
+# Modules whose code determines the transformer output
+TRANSFORM_MODULES = (
+    'html_transformer.py',
+    'fix_seo_issues.py',
+    'convert_images_to_picture.py',
+    'enhance_html_performance.py',
+    'extract_critical_css.py',
+    'fix_duplicate_resource_hints.py',
+    'minify_html.py',
+    'image_manifest.py',
+)
+
+
+def hash_page(rel_path, html):
+    """Cache key for a page: its content plus its site-relative path.
+
+    The path is part of the key because transforms are path-dependent
+    (canonical URLs, externalized critical CSS file names).
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(rel_path).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(html.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def transformer_fingerprint(*flags):
+    """Salt covering the cache version, transform code and option flags."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'v{TRANSFORM_CACHE_VERSION}:{flags!r}'.encode('utf-8'))
+    scripts_dir = Path(__file__).parent
+    for name in TRANSFORM_MODULES:
+        try:
+            digest.update((scripts_dir / name).read_bytes())
+        except IOError:
+            digest.update(f'missing:{name}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _local_path(url):
+    """Site-relative file path for a same-site URL, or None."""
+    if not url or url.startswith(('data:', '//')):
+        return None
+    path = urlparse(url).path if url.startswith(('http://', 'https://')) else url
+    path = path.split('?')[0].split('#')[0].lstrip('/')
+    return path or None
+
+
+def page_dependencies(soup):
+    """(stylesheet paths, image paths) a transformed page depends on."""
+    css = set()
+    for link in soup.find_all('link', href=True):
+        path = _local_path(link['href'])
+        if path and path.endswith('.css'):
+            css.add(path)
+
+    images = set()
+    for img in soup.find_all('img'):
+        urls = [img.get('src', '')]
+        urls += [part.split()[0] for part in img.get('srcset', '').split(',') if part.strip()]
+        for url in urls:
+            path = _local_path(url)
+            if path and not path.endswith('.svg'):
+                images.add(path)
+
+    return sorted(css), sorted(images)
+
+
+class HTMLTransformCache:
+    """Maps page hashes to transformer outputs, validated against artefacts."""
+
+    def __init__(self, public_dir, cache_dir=DEFAULT_CACHE_DIR, salt='', load=True,
+                 image_index=None, state=None):
+        self.public_dir = Path(public_dir)
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / 'objects'
+        self.salt = salt
+        self.entries = {}       # stored this run, not yet saved
+        self._seen = set()      # hashes looked up or stored this run
+        self._css_hashes = {}   # memoized per run: many pages share stylesheets
+        self._variants = {}
+        self.image_index = image_index  # ImageIndex; probes the filesystem without one
+        # Worker processes (load=False) only collect entries for the parent
+        self.state = None
+        if load:
+            self.state = state or BuildState()
+            self._load()
+
+    def _load(self):
+        if self.state.get_meta('transform_salt') != self.salt:
+            if self.state.count('transform'):
+                print("📦 HTML transform cache is from another transformer version, starting fresh")
+            with self.state.transaction():
+                self.state.clear('transform')
+                self.state.set_meta('transform_salt', self.salt)
+            self._import_legacy_index()
+        print(f"📦 HTML transform cache has {self.state.count('transform')} entries")
+
+    def _import_legacy_index(self):
+        """Import the index.json the cache kept before the build state store."""
+        index = self.cache_dir / 'index.json'
+        if not index.exists():
+            return
+        try:
+            data = json.loads(index.read_text(encoding='utf-8'))
+        except (IOError, ValueError) as e:
+            print(f"⚠️  Could not import {index}, ignoring it: {e}")
+            return
+        if data.get('salt') == self.salt:
+            self.state.put_many('transform', data.get('entries', {}).items())
+
+    # ------------------------------------------------------------------
+    # Artefacts
+    # ------------------------------------------------------------------
+
+    def _css_hash(self, path):
+        if path not in self._css_hashes:
+            try:
+                data = (self.public_dir / path).read_bytes()
+                self._css_hashes[path] = hashlib.blake2b(data, digest_size=8).hexdigest()
+            except IOError:
+                self._css_hashes[path] = '-'
+        return self._css_hashes[path]
+
+    def _variant_flags(self, path):
+        if self.image_index is not None:
+            return (('a' if self.image_index.has(path, 'avif') else '-') +
+                    ('w' if self.image_index.has(path, 'webp') else '-'))
+        if path not in self._variants:
+            full_path = self.public_dir / path
+            self._variants[path] = (
+                ('a' if full_path.with_suffix('.avif').exists() else '-') +
+                ('w' if full_path.with_suffix('.webp').exists() else '-')
+            )
+        return self._variants[path]
+
+    def _artefact_digest(self, css, images):
+        digest = hashlib.blake2b(digest_size=8)
+        for path in css:
+            digest.update(f'c:{path}:{self._css_hash(path)}\n'.encode('utf-8'))
+        for path in images:
+            digest.update(f'i:{path}:{self._variant_flags(path)}\n'.encode('utf-8'))
+        return digest.hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def lookup(self, page_hash):
+        """Entry for page_hash if its artefacts are unchanged, else None."""
+        self._seen.add(page_hash)
+        entry = self.entries.get(page_hash)
+        if entry is None and self.state is not None:
+            entry = self.state.get('transform', page_hash)
+        if not entry:
+            return None
+        if self._artefact_digest(entry['css'], entry['images']) != entry['artefacts']:
+            return None
+        self._seen.add(entry['output'])
+        return entry
+
+    def restore(self, entry):
+        """Stored output HTML for entry, or None if the object is gone."""
+        try:
+            with gzip.open(self._object_path(entry['output']), 'rt', encoding='utf-8') as f:
+                return f.read()
+        except (IOError, EOFError):
+            return None
+
+    def store(self, rel_path, input_hash, soup, output_html=None):
+        """Record a transform; output_html None means the page was unchanged."""
+        css, images = page_dependencies(soup)
+        # The transform may have just (re)written stylesheets (externalized
+        # critical CSS), so don't trust hashes memoized before it ran
+        for path in css:
+            self._css_hashes.pop(path, None)
+        output_hash = hash_page(rel_path, output_html) if output_html is not None else input_hash
+        entry = {
+            'output': output_hash,
+            'css': css,
+            'images': images,
+            'artefacts': self._artefact_digest(css, images),
+        }
+        if output_hash != input_hash:
+            obj = self._object_path(output_hash)
+            if not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                with gzip.open(obj, 'wt', encoding='utf-8') as f:
+                    f.write(output_html)
+        self.entries[input_hash] = entry
+        # The output is a fixed point: seeing it again next run means "done"
+        self.entries[output_hash] = entry
+        self._seen.update((input_hash, output_hash))
+
+    def merge(self, entries):
+        """Add entries recorded by a worker process's cache."""
+        self.entries.update(entries)
+        self._seen.update(entries)
+
+    def _object_path(self, output_hash):
+        return self.objects_dir / output_hash[:2] / f'{output_hash}.html.gz'
+
+    def save(self):
+        """Store this run's entries, keeping only entries for pages seen this run."""
+        with self.state.transaction():
+            self.state.put_many('transform', self.entries.items())
+            stale = [h for h in self.state.keys('transform') if h not in self._seen]
+            self.state.delete('transform', stale)
+        live = {e['output'] for _, e in self.state.items('transform')}
+        if self.objects_dir.exists():
+            for obj in self.objects_dir.glob('*/*.html.gz'):
+                if obj.name[:-len('.html.gz')] not in live:
+                    obj.unlink()
+
+        print(f"💾 Saved HTML transform cache with {self.state.count('transform')} entries "
+              f"({len(self.entries)} updated)")
+        self.entries = {}
@@ -13,15 +13,24 @@ Transform order (each depends on the previous being stable):
   5. Dedup head links   — clean up any accumulated noscript/link duplicates
   6. Minification       — collapse whitespace, strip comments (string-level)
 
+Files are transformed on a process pool (--workers, one per core by default);
+each worker holds its own transform instances and returns per-file stat
+deltas, which the parent merges in file order.
+
+Files whose content hash is already known to the transform cache
+(html_transform_cache.py) are skipped, or restored from the stored output,
+without being parsed — on an incremental build that is every seeded page.
+
 The original standalone scripts remain functional for individual use.
 """
 
+import os
 import sys
 import re
 import time
 import argparse
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 
 # Ensure scripts/ is on the path for imports
@@ -32,15 +41,56 @@ from enhance_html_performance import HTMLPerformanceEnhancer
 from convert_images_to_picture import ImageToPictureConverter
 from extract_critical_css import CriticalCSSExtractor
 from minify_html import minify_html
+from html_transform_cache import (
+    DEFAULT_CACHE_DIR, HTMLTransformCache, hash_page, transformer_fingerprint,
+)
+
+
+# Per-process transformer used by pool workers (set by _init_worker).
+_worker_transformer = None
+
+
+def _init_worker(settings):
+    """Build the transformer (and its transform instances) a worker reuses."""
+    global _worker_transformer
+    _worker_transformer = HTMLTransformer(
+        settings['public_dir'],
+        skip_images=settings['skip_images'],
+        skip_critical_css=settings['skip_critical_css'],
+        use_cache=False,
+        workers=1,
+    )
+    if settings['cache_salt']:
+        # Records new entries only; the parent already did the lookups
+        _worker_transformer.cache = HTMLTransformCache(
+            settings['public_dir'], settings['cache_dir'],
+            salt=settings['cache_salt'], load=False,
+            image_index=_worker_transformer.pictures.index,
+        )
+
+
+def _transform_in_worker(path):
+    """Transform one file in a worker; return (modified, stat deltas, cache entries)."""
+    transformer = _worker_transformer
+    file_path = Path(path)
+    before = transformer._stat_counters()
+    modified = transformer._transform_file(file_path, file_path.read_text(encoding='utf-8'))
+    after = transformer._stat_counters()
+    entries = {}
+    if transformer.cache:
+        entries, transformer.cache.entries = transformer.cache.entries, {}
+    return modified, {k: after[k] - before[k] for k in after}, entries
 
 
 class HTMLTransformer:
     """Single-pass HTML transformer that applies all optimizations per file."""
 
-    def __init__(self, public_dir='public', skip_images=False, skip_critical_css=False):
+    def __init__(self, public_dir='public', skip_images=False, skip_critical_css=False,
+                 cache_dir=DEFAULT_CACHE_DIR, use_cache=True, workers=None):
         self.public_dir = Path(public_dir)
         self.skip_images = skip_images
         self.skip_critical_css = skip_critical_css
+        self.workers = workers or os.cpu_count() or 1
 
         # Instantiate the transform classes — we'll call their per-soup methods
         self.seo = SEOFixer(public_dir)
@@ -48,14 +98,24 @@ class HTMLTransformer:
         self.pictures = ImageToPictureConverter(str(public_dir))
         self.critical_css = CriticalCSSExtractor(public_dir)
 
+        self.cache_dir = cache_dir
+        self.cache = None
+        if use_cache:
+            self.cache = HTMLTransformCache(
+                public_dir, cache_dir,
+                salt=transformer_fingerprint(skip_images, skip_critical_css),
+                image_index=self.pictures.index,
+            )
+
         # Stats
         self.files_processed = 0
         self.files_modified = 0
+        self.files_cached = 0
         self.total_bytes_saved = 0
 
     def process_all_files(self):
         """Process all HTML files in a single pass each."""
-        html_files = list(self.public_dir.rglob('*.html'))
+        html_files = sorted(self.public_dir.rglob('*.html'))
 
         # Exclude feeds and sitemaps (same filter as SEOFixer)
         html_files = [f for f in html_files if not any(
@@ -69,25 +129,138 @@ class HTMLTransformer:
         print(f"🔄 Single-pass HTML transformer: {len(html_files)} files")
         start_time = time.time()
 
+        if self.workers > 1 and len(html_files) > 1:
+            self._process_parallel(html_files)
+        else:
+            for html_file in html_files:
+                self.files_processed += 1
+                try:
+                    if self._process_file(html_file):
+                        self.files_modified += 1
+                except Exception as e:
+                    print(f"⚠️  Error processing {html_file.name}: {e}")
+                self._report_progress(len(html_files))
+
+        if self.cache:
+            self.cache.save()
+
+        elapsed = time.time() - start_time
+        self._print_summary(elapsed)
+
+    def _process_parallel(self, html_files):
+        """Serve cache hits here, transform the rest on a process pool.
+
+        Results are merged in file order, so stats and cache contents do not
+        depend on which worker finished first.
+        """
+        misses = []
         for html_file in html_files:
-            self.files_processed += 1
+            if not self.cache:
+                misses.append(html_file)
+                continue
             try:
-                if self._process_file(html_file):
-                    self.files_modified += 1
+                cached = self._from_cache(html_file, html_file.read_text(encoding='utf-8'))
             except Exception as e:
                 print(f"⚠️  Error processing {html_file.name}: {e}")
+                cached = False
+            if cached is None:
+                misses.append(html_file)
+                continue
+            self.files_processed += 1
+            if cached:
+                self.files_modified += 1
+            self._report_progress(len(html_files))
 
-            # Progress every 50 files
-            if self.files_processed % 50 == 0:
-                print(f"   ⏳ {self.files_processed}/{len(html_files)} files...")
+        if not misses:
+            return
 
-        elapsed = time.time() - start_time
-        self._print_summary(elapsed)
+        workers = min(self.workers, len(misses))
+        print(f"   🧵 Transforming {len(misses)} files on {workers} worker processes")
+        settings = {
+            'public_dir': str(self.public_dir),
+            'skip_images': self.skip_images,
+            'skip_critical_css': self.skip_critical_css,
+            'cache_dir': str(self.cache_dir),
+            'cache_salt': self.cache.salt if self.cache else None,
+        }
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(settings,)) as pool:
+            futures = [pool.submit(_transform_in_worker, str(f)) for f in misses]
+            for html_file, future in zip(misses, futures):
+                self.files_processed += 1
+                try:
+                    modified, stats, entries = future.result()
+                except Exception as e:
+                    print(f"⚠️  Error processing {html_file.name}: {e}")
+                else:
+                    self._merge_stats(stats)
+                    if modified:
+                        self.files_modified += 1
+                    if self.cache:
+                        self.cache.merge(entries)
+                self._report_progress(len(html_files))
+
+    def _report_progress(self, total):
+        # Progress every 50 files
+        if self.files_processed % 50 == 0:
+            print(f"   ⏳ {self.files_processed}/{total} files...")
+
+    def _stat_counters(self):
+        """Flat snapshot of every counter a transform can bump."""
+        counters = {
+            'total_bytes_saved': self.total_bytes_saved,
+            'seo.issues_fixed': self.seo.issues_fixed,
+            'seo.files_fixed': self.seo.files_fixed,
+            'perf.optimizations_applied': self.perf.optimizations_applied,
+            'critical_css.css_inlined': self.critical_css.css_inlined,
+        }
+        for key, value in self.pictures.stats.items():
+            counters[f'pictures.{key}'] = value
+        return counters
+
+    def _merge_stats(self, delta):
+        """Add a worker's per-file counter deltas (see _stat_counters)."""
+        self.total_bytes_saved += delta['total_bytes_saved']
+        self.seo.issues_fixed += delta['seo.issues_fixed']
+        self.seo.files_fixed += delta['seo.files_fixed']
+        self.perf.optimizations_applied += delta['perf.optimizations_applied']
+        self.critical_css.css_inlined += delta['critical_css.css_inlined']
+        for key in self.pictures.stats:
+            self.pictures.stats[key] += delta[f'pictures.{key}']
 
     def _process_file(self, file_path):
         """Apply all transforms to a single HTML file in one parse cycle."""
         original_html = file_path.read_text(encoding='utf-8')
+        if self.cache:
+            cached = self._from_cache(file_path, original_html)
+            if cached is not None:
+                return cached
+        return self._transform_file(file_path, original_html)
+
+    def _from_cache(self, file_path, original_html):
+        """Skip or restore a file from the cache; None on a cache miss."""
+        rel_path = file_path.relative_to(self.public_dir).as_posix()
+        input_hash = hash_page(rel_path, original_html)
+        entry = self.cache.lookup(input_hash)
+        if not entry:
+            return None
+        if entry['output'] == input_hash:
+            self.files_cached += 1
+            return False
+        cached_html = self.cache.restore(entry)
+        if cached_html is None:
+            return None
+        self.files_cached += 1
+        original_size = len(original_html.encode('utf-8'))
+        self.total_bytes_saved += max(0, original_size - len(cached_html.encode('utf-8')))
+        file_path.write_text(cached_html, encoding='utf-8')
+        return True
+
+    def _transform_file(self, file_path, original_html):
+        """Run the transform phases on original_html and write the result."""
         original_size = len(original_html.encode('utf-8'))
+        rel_path = file_path.relative_to(self.public_dir).as_posix()
+        input_hash = hash_page(rel_path, original_html) if self.cache else None
 
         # ── Phase 0: Aggressive string-level cleanup ────────────────────
         # Seeded files from public/ may carry accumulated corruption from
@@ -118,6 +291,8 @@ class HTMLTransformer:
                 modified = True
 
         if not modified:
+            if self.cache:
+                self.cache.store(rel_path, input_hash, soup)
             return False
 
         # Serialize once
@@ -130,6 +305,9 @@ class HTMLTransformer:
         # ── Phase 6: Minification (string-level) ────────────────────────
         result_html = minify_html(result_html)
 
+        if self.cache:
+            self.cache.store(rel_path, input_hash, soup, result_html)
+
         # Write once
         new_size = len(result_html.encode('utf-8'))
         self.total_bytes_saved += max(0, original_size - new_size)
@@ -250,10 +428,7 @@ class HTMLTransformer:
                 self.pictures.stats['images_skipped'] += 1
                 continue
 
-            has_avif, has_webp = self.pictures._has_modern_format(
-                img.get('src', ''),
-                self.pictures.directory
-            )
+            has_avif, has_webp = self.pictures._has_modern_format(img.get('src', ''))
 
             if not (has_avif or has_webp):
                 self.pictures.stats['images_skipped'] += 1
@@ -325,6 +500,8 @@ class HTMLTransformer:
         print(f"{'='*60}")
         print(f"📄 Files processed:     {self.files_processed}")
         print(f"✏️  Files modified:      {self.files_modified}")
+        if self.cache:
+            print(f"📦 From cache:          {self.files_cached}")
         print(f"💾 Bytes saved:         {self.total_bytes_saved / 1024:.1f} KB")
         print(f"⏱️  Elapsed:            {elapsed:.1f}s")
         if self.files_processed > 0:
@@ -362,12 +539,31 @@ def main():
         action='store_true',
         help='Skip critical CSS extraction and inlining',
     )
+    parser.add_argument(
+        '--cache-dir',
+        default=DEFAULT_CACHE_DIR,
+        help=f'Directory for the transform cache (default: {DEFAULT_CACHE_DIR})',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Transform every file, ignoring and not updating the cache',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Worker processes (default: one per CPU core; 1 = serial)',
+    )
     args = parser.parse_args()
 
     transformer = HTMLTransformer(
         public_dir=args.directory,
         skip_images=args.skip_images,
         skip_critical_css=args.skip_critical_css,
+        cache_dir=args.cache_dir,
+        use_cache=not args.no_cache,
+        workers=args.workers,
     )
     transformer.process_all_files()
 
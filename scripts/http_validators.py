@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+HTTP validator store for conditional page and asset fetches
+
+Every page and asset the generator downloads is recorded with the
+validators WordPress sent for it (ETag, Last-Modified) and a hash of the
+body. The next build sends them back as If-None-Match / If-Modified-Since,
+and a 304 means the previous copy is still current:
+
+  - assets: the file already in the output directory (seeded from the
+    previous deploy) is kept as it is;
+  - pages: the stored response body is reprocessed. The rendered page also
+    depends on data outside the response (related posts, homepage stats,
+    the generator code), so the previous *output* is not reused — only the
+    download is saved.
+
+An asset whose file exists but which has no entry is fetched in full once,
+so copies left by older deploys get refreshed. If that response carried
+neither ETag nor Last-Modified there is nothing to revalidate with: the
+file is kept without a request until the entry expires, then fetched in
+full again — one full download per MAX_AGE_DAYS. Page bodies are only
+stored when there are validators to send.
+
+Entries live in the build state store (kind 'http', one row per URL,
+upserted as responses arrive); entries not checked for MAX_AGE_DAYS are
+dropped on save, along with their bodies.
+
+Page bodies are kept on disk (default .http_validator_cache/ in the
+project root):
+    bodies/<aa>/<url hash>.gz   stored page body, by URL
+"""
+
+import gzip
+import hashlib
+import threading
+import time
+from pathlib import Path
+
+from build_state import BuildState
+
+DEFAULT_CACHE_DIR = '.http_validator_cache'
+MAX_AGE_DAYS = 30
+
+
+def content_hash(data=b''):
+    """Hash object for response bodies (update() it while streaming)."""
+    return hashlib.blake2b(data, digest_size=16)
+
+
+def _charset(content_type):
+    for part in content_type.split(';')[1:]:
+        key, _, value = part.strip().partition('=')
+        if key.lower() == 'charset' and value:
+            return value.strip('"\'')
+    return 'utf-8'
+
+
+class ValidatorStore:
+    """{url: ETag, Last-Modified and body hash} across builds."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, state=None):
+        self.cache_dir = Path(cache_dir)
+        self.bodies_dir = self.cache_dir / 'bodies'
+        self.state = state or BuildState()
+        self.entries = self.state.table('http')
+        self._lock = threading.Lock()
+        self.stats = {'not_modified': 0, 'fetched': 0, 'bytes_saved': 0}
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def conditional_headers(self, url, need_body=False):
+        """If-None-Match / If-Modified-Since for url ({} if nothing to send).
+
+        need_body: only validate if the response body is stored (pages,
+        which are reprocessed from it on a 304).
+        """
+        entry = self.entries.get(url)
+        if not entry:
+            return {}
+        if need_body and not self._body_path(url).exists():
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def known(self, url):
+        """Whether url has an entry (fetched in full within MAX_AGE_DAYS)."""
+        return url in self.entries
+
+    def not_modified(self, url):
+        """Record a 304 for url."""
+        entry = self.entries.get(url)
+        if entry is None:
+            return
+        entry['checked'] = int(time.time())
+        self.entries[url] = entry
+        with self._lock:
+            self.stats['not_modified'] += 1
+            self.stats['bytes_saved'] += entry.get('size', 0)
+
+    def record(self, url, headers, digest, size, body=None):
+        """Record a 200 for url: its validators, body hash and size.
+
+        body (bytes) is stored too when given and the response has
+        validators, for reprocessing on a 304.
+        """
+        entry = {
+            'etag': headers.get('ETag', ''),
+            'last_modified': headers.get('Last-Modified', ''),
+            'content_type': headers.get('content-type', ''),
+            'hash': digest,
+            'size': size,
+            'checked': int(time.time()),
+        }
+        if body is not None:
+            path = self._body_path(url)
+            if entry['etag'] or entry['last_modified']:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+                with gzip.open(tmp, 'wb') as f:
+                    f.write(body)
+                tmp.replace(path)
+            else:
+                # Nothing to revalidate with, so it could never be reused
+                path.unlink(missing_ok=True)
+        self.entries[url] = entry
+        with self._lock:
+            self.stats['fetched'] += 1
+
+    def stored_page(self, url):
+        """The stored response for url, in _fetch_page's format, or None."""
+        entry = self.entries.get(url)
+        if not entry:
+            return None
+        try:
+            with gzip.open(self._body_path(url), 'rb') as f:
+                content = f.read()
+        except (IOError, EOFError):
+            return None
+        return {
+            'content_type': entry.get('content_type', ''),
+            'text': content.decode(_charset(entry.get('content_type', '')), errors='replace'),
+            'content': content,
+            'last_modified': entry.get('last_modified', ''),
+        }
+
+    def _body_path(self, url):
+        digest = content_hash(url.encode('utf-8')).hexdigest()
+        return self.bodies_dir / digest[:2] / f'{digest}.gz'
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, max_age_days=MAX_AGE_DAYS):
+        """Drop entries (and bodies) not checked for max_age_days.
+
+        Entries are written as responses arrive; returns how many remain.
+        """
+        stale = self.state.older_than('http', time.time() - max_age_days * 86400)
+        self.state.delete('http', stale)
+        for url in stale:
+            self._body_path(url).unlink(missing_ok=True)
+        return len(self.entries)
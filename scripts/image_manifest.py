@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Image Variant Index
+
+One scan of wp-content/uploads records which extensions exist for every
+image, so ImageToPictureConverter can answer "does an AVIF/WebP exist for
+this src / srcset entry?" without a stat call per image per page. Reading
+the disk rather than optimize_images.py's records means variants committed
+by an earlier deploy are seen too.
+"""
+
+import os
+from pathlib import Path
+
+# Only images under here are optimized, so only here can variants exist
+UPLOADS_DIR = 'wp-content/uploads'
+
+
+class ImageIndex:
+    """Extensions on disk per image, from one scan of wp-content/uploads.
+
+    Keys are site-relative paths without extension
+    ("wp-content/uploads/2024/01/photo-300x200"), values the lower-case
+    extensions found for them ({"jpg", "webp", "avif"}).
+    """
+
+    def __init__(self, images=None):
+        self.images = images or {}
+
+    @classmethod
+    def scan(cls, public_dir):
+        """Index every file under <public_dir>/wp-content/uploads."""
+        images = {}
+        # os.scandir gives file/dir type without a stat per entry
+        stack = [(Path(public_dir) / UPLOADS_DIR, UPLOADS_DIR)]
+        while stack:
+            directory, rel_dir = stack.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, f'{rel_dir}/{entry.name}'))
+                        continue
+                    base, dot, ext = entry.name.rpartition('.')
+                    if dot and base:
+                        images.setdefault(f'{rel_dir}/{base}', set()).add(ext.lower())
+        return cls(images)
+
+    def formats(self, rel_path):
+        """Extensions present for rel_path's image (any extension), possibly empty."""
+        rel_path = str(rel_path).split('?')[0].split('#')[0].lstrip('/')
+        directory, _, name = rel_path.rpartition('/')
+        base = name.rpartition('.')[0] or name
+        return self.images.get(f'{directory}/{base}' if directory else base, frozenset())
+
+    def has(self, rel_path, fmt):
+        """Whether a .fmt file exists next to rel_path's image."""
+        return fmt.lstrip('.').lower() in self.formats(rel_path)
+
+    def __len__(self):
+        return len(self.images)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Perceptual Quality Targeting for Image Encodes
+
+A single fixed quality wastes bytes on screenshots and diagrams (which
+survive heavy compression) while being about right for photos.
+search_quality() instead binary-searches the encoder quality for the lowest
+setting whose decoded output still scores at least a target SSIM against
+the image being encoded.
+
+SSIM is computed on luminance, downscaled to at most SSIM_MAX_SIDE pixels,
+with a uniform SSIM_WINDOW x SSIM_WINDOW window.
+
+Requires numpy; optimize_images.py falls back to its fixed quality without it.
+"""
+
+import io
+
+from PIL import Image
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SSIM_MAX_SIDE = 512
+SSIM_WINDOW = 8
+
+# Lowest quality the search will consider
+QUALITY_FLOOR = 30
+
+# Standard SSIM stabilisers for 8-bit data
+_C1 = (0.01 * 255) ** 2
+_C2 = (0.03 * 255) ** 2
+
+
+def is_available():
+    """True if numpy is installed."""
+    return np is not None
+
+
+def _luma(img):
+    img = img.convert('L')
+    scale = SSIM_MAX_SIDE / max(img.size)
+    if scale < 1:
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+                         Image.BOX)
+    return np.asarray(img, dtype=np.float64)
+
+
+def _window_mean(a, k):
+    """Mean over every k x k window (valid region), via an integral image."""
+    s = np.pad(a.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    return (s[k:, k:] - s[:-k, k:] - s[k:, :-k] + s[:-k, :-k]) / (k * k)
+
+
+def ssim(reference, candidate):
+    """Mean SSIM of candidate against reference (PIL images, same size)."""
+    x = _luma(reference)
+    y = _luma(candidate)
+    k = min(SSIM_WINDOW, *x.shape)
+    mx = _window_mean(x, k)
+    my = _window_mean(y, k)
+    sxx = _window_mean(x * x, k) - mx * mx
+    syy = _window_mean(y * y, k) - my * my
+    sxy = _window_mean(x * y, k) - mx * my
+    scores = ((2 * mx * my + _C1) * (2 * sxy + _C2)) / \
+             ((mx * mx + my * my + _C1) * (sxx + syy + _C2))
+    return float(scores.mean())
+
+
+def _encode(img, pil_format, options, quality):
+    buffer = io.BytesIO()
+    img.save(buffer, pil_format, quality=quality, **options)
+    data = buffer.getvalue()
+    with Image.open(io.BytesIO(data)) as decoded:
+        return data, ssim(img, decoded)
+
+
+def search_quality(img, pil_format, options, target, max_quality, min_quality=QUALITY_FLOOR):
+    """Lowest quality in [min_quality, max_quality] scoring >= target.
+
+    Returns (quality, encoded bytes, score); the bytes are the encode at
+    that quality, so the caller can write them without encoding again. If
+    even max_quality misses the target, max_quality is used.
+    """
+    best = None
+    low, high = min_quality, max_quality
+    while low <= high:
+        quality = (low + high) // 2
+        data, score = _encode(img, pil_format, options, quality)
+        if score >= target:
+            best = (quality, data, score)
+            high = quality - 1
+        else:
+            low = quality + 1
+    if best is None:
+        data, score = _encode(img, pil_format, options, max_quality)
+        best = (max_quality, data, score)
+    return best
@@ -2,6 +2,18 @@
 """
 Incremental Builder - Only regenerate changed content
 Massive time savings by tracking what's already been built
+
+The cache also holds a reverse dependency graph recorded at the end of each
+build: for every post, the pages that rendered a link to it (taxonomy
+archives, homepage and /page/N/ listings, other posts' related sections),
+plus the post's listing-relevant facts (date, title, archives) and every
+post's related posts. The next incremental build diffs the current post
+list against it and re-renders only the pages whose inputs changed.
+
+All of it lives in the SQLite build state store (build_state.py): one row
+per post/page URL and one graph row per post, upserted as they change, with
+the build timestamps in its meta table. A .build-cache.json left by older
+builds is imported the first time the store is opened.
 """
 
 import json
@@ -10,42 +22,57 @@ import re
 from pathlib import Path
 from datetime import datetime
 
+from build_state import BuildState
+from wp_api_cache import fetch_all
+
 # Matches individual post URLs: /YYYY/MM/slug/ or /YYYY/MM/slug (slug must be non-empty)
 # Distinguishes posts from monthly archives (/YYYY/MM/) and year archives (/YYYY/).
 # The trailing slash is optional so both canonical and non-canonical forms are handled.
 _POST_URL_RE = re.compile(r'^/\d{4}/\d{2}/[^/]+')
 
+# Taxonomy index pages, whose term lists and counts change with post taxonomy
+TAXONOMY_INDEX_URLS = ('/category/', '/tag/')
+
+# Pre-SQLite cache file, imported into an empty store
+LEGACY_CACHE_FILE = '.build-cache.json'
+
+# Build state kinds and meta keys owned by the incremental builder
+CACHE_TYPES = ('posts', 'pages', 'assets')
+META_KEYS = ('last_build_time', 'last_full_build', 'last_archive_build',
+             'graph_recorded', 'graph_posts', 'graph_edges')
+
 class IncrementalBuilder:
-    def __init__(self, cache_file='.build-cache.json'):
-        self.cache_file = Path(cache_file)
-        self.cache = self._load_cache()
-    
-    def _load_cache(self):
-        """Load build cache from disk"""
-        if self.cache_file.exists():
-            try:
-                return json.loads(self.cache_file.read_text())
-            except (json.JSONDecodeError, IOError) as e:
-                print(f"⚠️  Failed to load cache, starting fresh: {e}")
-                return self._empty_cache()
-        return self._empty_cache()
-    
-    def _empty_cache(self):
-        """Create empty cache structure"""
-        return {
-            'posts': {},
-            'pages': {},
-            'assets': {},
-            'last_build_time': None,
-            'last_full_build': None
-        }
-    
-    def _save_cache(self):
-        """Save build cache to disk"""
+    def __init__(self, state=None, legacy_cache_file=LEGACY_CACHE_FILE):
+        self.state = state or BuildState()
+        self.cache = {cache_type: self.state.table(cache_type) for cache_type in CACHE_TYPES}
+        self.graph = self.state.table('graph')
+        self._graph_rows = None  # graph as recorded by the last build, loaded on demand
+        self._archives_rebuilt = False  # recorded by finalize_build once the build succeeds
+        self._import_legacy_cache(Path(legacy_cache_file))
+
+    def _import_legacy_cache(self, cache_file):
+        """Import a .build-cache.json from before the SQLite store, once."""
+        if not cache_file.exists() or self.last_build_time or len(self.cache['posts']):
+            return
         try:
-            self.cache_file.write_text(json.dumps(self.cache, indent=2))
-        except IOError as e:
-            print(f"⚠️  Failed to save cache: {e}")
+            data = json.loads(cache_file.read_text())
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"⚠️  Could not import {cache_file}, ignoring it: {e}")
+            return
+        with self.state.transaction():
+            for cache_type in CACHE_TYPES:
+                self.cache[cache_type].update(data.get(cache_type) or {})
+            if data.get('graph'):
+                graph = data['graph']
+                self.record_dependencies(graph.get('posts', {}), {}, graph.get('related', {}),
+                                         dependents=graph.get('dependents', {}))
+            for key in ('last_build_time', 'last_full_build', 'last_archive_build'):
+                self.state.set_meta(key, data.get(key))
+        print(f"📦 Imported {cache_file} into {self.state.path}")
+
+    @property
+    def last_build_time(self):
+        return self.state.get_meta('last_build_time')
     
     def _hash_content(self, content):
         """Create hash of content for change detection.
@@ -62,10 +89,9 @@ class IncrementalBuilder:
         """Check if content needs regeneration"""
         cache_type = self._get_cache_type(url)
         
-        if url not in self.cache[cache_type]:
+        cached = self.cache[cache_type].get(url)
+        if cached is None:
             return True
-        
-        cached = self.cache[cache_type][url]
         return (
             cached.get('hash') != content_hash or
             cached.get('modified') != modified_date
@@ -87,8 +113,8 @@ class IncrementalBuilder:
     
     def get_changed_posts(self, session, wp_url):
         """Get only posts modified since last build"""
-        last_build = self.cache.get('last_build_time')
-        cached_count = len(self.cache.get('posts', {})) + len(self.cache.get('pages', {}))
+        last_build = self.last_build_time
+        cached_count = len(self.cache['posts']) + len(self.cache['pages'])
 
         if not last_build or cached_count == 0:
             print("📦 First build - processing all posts")
@@ -97,41 +123,10 @@ class IncrementalBuilder:
         print(f"🔄 Incremental build - checking posts modified since {last_build}")
         
         # Use WordPress API's modified_after parameter
-        params = {
+        changed_posts, _ = fetch_all(session, wp_url, 'posts', 'discovery', {
             'modified_after': last_build,
-            'per_page': 100,
-            'status': 'publish'
-        }
-        
-        changed_posts = []
-        page = 1
-        
-        while True:
-            params['page'] = page
-            try:
-                response = session.get(
-                    f'{wp_url}/wp-json/wp/v2/posts',
-                    params=params,
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    if response.status_code == 400:
-                        # No more pages
-                        break
-                    print(f"⚠️  API error {response.status_code} on page {page}")
-                    break
-                
-                posts = response.json()
-                if not posts:
-                    break
-                
-                changed_posts.extend(posts)
-                page += 1
-                
-            except Exception as e:
-                print(f"⚠️  Error fetching changed posts: {e}")
-                break
+            'status': 'publish',
+        })
         
         print(f"📊 Incremental build: {len(changed_posts)} changed posts")
         
@@ -143,72 +138,22 @@ class IncrementalBuilder:
     
     def _get_all_posts(self, session, wp_url):
         """Get all posts (for first build)"""
-        all_posts = []
-        page = 1
-        
-        while True:
-            try:
-                response = session.get(
-                    f'{wp_url}/wp-json/wp/v2/posts',
-                    params={'per_page': 100, 'page': page, 'status': 'publish'},
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    break
-                
-                posts = response.json()
-                if not posts:
-                    break
-                
-                all_posts.extend(posts)
-                page += 1
-                
-            except Exception as e:
-                print(f"⚠️  Error fetching posts: {e}")
-                break
-        
+        all_posts, _ = fetch_all(session, wp_url, 'posts', 'discovery',
+                                 {'status': 'publish'})
         return all_posts
     
     def get_changed_pages(self, session, wp_url):
         """Get only pages modified since last build"""
-        last_build = self.cache.get('last_build_time')
-        cached_count = len(self.cache.get('posts', {})) + len(self.cache.get('pages', {}))
+        last_build = self.last_build_time
+        cached_count = len(self.cache['posts']) + len(self.cache['pages'])
 
         if not last_build or cached_count == 0:
             return self._get_all_pages(session, wp_url)
         
-        params = {
+        changed_pages, _ = fetch_all(session, wp_url, 'pages', 'discovery', {
             'modified_after': last_build,
-            'per_page': 100,
-            'status': 'publish'
-        }
-        
-        changed_pages = []
-        page = 1
-        
-        while True:
-            params['page'] = page
-            try:
-                response = session.get(
-                    f'{wp_url}/wp-json/wp/v2/pages',
-                    params=params,
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    break
-                
-                pages = response.json()
-                if not pages:
-                    break
-                
-                changed_pages.extend(pages)
-                page += 1
-                
-            except Exception as e:
-                print(f"⚠️  Error fetching changed pages: {e}")
-                break
+            'status': 'publish',
+        })
         
         if changed_pages:
             print(f"📊 Incremental build: {len(changed_pages)} changed pages")
@@ -217,31 +162,8 @@ class IncrementalBuilder:
     
     def _get_all_pages(self, session, wp_url):
         """Get all pages (for first build)"""
-        all_pages = []
-        page = 1
-        
-        while True:
-            try:
-                response = session.get(
-                    f'{wp_url}/wp-json/wp/v2/pages',
-                    params={'per_page': 100, 'page': page, 'status': 'publish'},
-                    timeout=30
-                )
-                
-                if response.status_code != 200:
-                    break
-                
-                pages = response.json()
-                if not pages:
-                    break
-                
-                all_pages.extend(pages)
-                page += 1
-                
-            except Exception as e:
-                print(f"⚠️  Error fetching pages: {e}")
-                break
-        
+        all_pages, _ = fetch_all(session, wp_url, 'pages', 'discovery',
+                                 {'status': 'publish'})
         return all_pages
     
     def mark_processed(self, url, content_hash, modified_date):
@@ -256,9 +178,10 @@ class IncrementalBuilder:
     
     def should_rebuild_archives(self):
         """Determine if archive pages (categories, tags, home) need rebuild"""
-        # Always rebuild archives if posts changed
-        # Or if it's been more than a day since last full build
-        last_full = self.cache.get('last_full_build')
+        # Rebuild every archive if it's been more than a day since they were
+        # all last rebuilt — a safety net for anything the dependency graph
+        # can't see (theme or widget changes on the WordPress side)
+        last_full = self.state.get_meta('last_archive_build') or self.state.get_meta('last_full_build')
         
         if not last_full:
             return True
@@ -270,15 +193,146 @@ class IncrementalBuilder:
         except (ValueError, TypeError):
             return True
     
-    def finalize_build(self, is_full_build=False):
-        """Mark build complete and save cache"""
-        self.cache['last_build_time'] = datetime.now().isoformat()
-        
-        if is_full_build:
-            self.cache['last_full_build'] = datetime.now().isoformat()
+    def mark_archives_rebuilt(self):
+        """Note that this build re-renders every archive page.
+
+        Stored by finalize_build, so a build that fails partway leaves the
+        daily refresh due.
+        """
+        self._archives_rebuilt = True
+
+    # ------------------------------------------------------------------
+    # Dependency graph
+    # ------------------------------------------------------------------
+
+    def has_dependency_graph(self):
+        """Whether a previous build recorded a dependency graph"""
+        return bool(self.state.get_meta('graph_recorded'))
+
+    def record_dependencies(self, posts, links_by_page, related, dependents=None):
+        """Store the dependency graph for the build that just finished.
+
+        posts: {post url: {'date', 'title', 'archives', ...}} — anything
+            that, when it changes, changes the pages listing the post
+        links_by_page: {page url: [post urls it links to]}
+        related: {post url: [related post urls]}
+        dependents: {post url: [page urls]} — instead of links_by_page
+
+        Only graph rows that differ from the stored ones are written.
+        """
+        if dependents is None:
+            dependents = {}
+            for page, links in links_by_page.items():
+                for post in links:
+                    if post != page:
+                        dependents.setdefault(post, set()).add(page)
+        rows = {}
+        for url in set(posts) | set(dependents) | set(related):
+            row = {'dependents': sorted(dependents.get(url, ()))}
+            if url in posts:
+                row['post'] = posts[url]
+            if url in related:
+                row['related'] = related[url]
+            rows[url] = row
+
+        old_rows = dict(self.graph.items())
+        with self.state.transaction():
+            self.graph.update((url, row) for url, row in rows.items() if old_rows.get(url) != row)
+            self.state.delete('graph', old_rows.keys() - rows.keys())
+            self.state.set_meta('graph_recorded', datetime.now().isoformat())
+            self.state.set_meta('graph_posts', len(posts))
+            self.state.set_meta('graph_edges', sum(len(row['dependents']) for row in rows.values()))
+        self._graph_rows = rows
+
+    def _recorded_graph(self):
+        if self._graph_rows is None:
+            self._graph_rows = dict(self.graph.items())
+        return self._graph_rows
+
+    def dependents(self, url):
+        """Pages that rendered a link to url in the last recorded build"""
+        row = self._recorded_graph().get(url) or {}
+        return set(row.get('dependents', ()))
+
+    def pages_to_rebuild(self, changed_urls, posts, related):
+        """Pages whose inputs changed since the recorded graph.
+
+        changed_urls: posts/pages WordPress reports as modified
+        posts, related: current values, same shape as record_dependencies()
+
+        Returns (urls, listings_shifted). listings_shifted means the
+        date-ordered post list changed (a post was added, removed or
+        re-dated), so the homepage and every /page/N/ listing must be
+        re-rendered as well.
+        """
+        graph = self._recorded_graph()
+        old_posts = {url: row['post'] for url, row in graph.items() if 'post' in row}
+        old_related = {url: row['related'] for url, row in graph.items() if 'related' in row}
+
+        urls = set(changed_urls)
+        listings_shifted = False
+        moved = set()  # new or re-dated: their neighbours' prev/next links change
+
+        for url in changed_urls:
+            urls.update(self.dependents(url))
+
+        for url, info in posts.items():
+            old = old_posts.get(url)
+            if old == info:
+                continue
+            urls.add(url)
+            urls.update(info.get('archives', ()))
+            if old is None:
+                # New post: joins its archives and the top of every listing
+                listings_shifted = True
+                moved.add(url)
+                urls.update(TAXONOMY_INDEX_URLS)
+                continue
+            # Archives it left still link to it, so they are dependents
+            urls.update(self.dependents(url))
+            if old.get('date') != info.get('date'):
+                listings_shifted = True
+                moved.add(url)
+            if set(old.get('archives', ())) != set(info.get('archives', ())):
+                urls.update(TAXONOMY_INDEX_URLS)
+
+        for url in old_posts.keys() - posts.keys():
+            # Deleted or unpublished: drop it from everything that listed it
+            listings_shifted = True
+            urls.update(self.dependents(url))
+            urls.update(old_posts[url].get('archives', ()))
+            urls.update(TAXONOMY_INDEX_URLS)
+            urls.discard(url)
+
+        if moved:
+            by_date = sorted(posts, key=lambda u: (posts[u].get('date') or '', u))
+            for i, url in enumerate(by_date):
+                if url in moved:
+                    urls.update(by_date[max(i - 1, 0):i + 2])
+
+        for url, links in related.items():
+            if old_related.get(url) != links:
+                urls.add(url)
+
+        return urls, listings_shifted
+
+    def finalize_build(self, is_full_build=False, complete=True):
+        """Mark build complete (entries were stored as they were processed)
+
+        complete: every page rendered; the archive refresh is only recorded
+        then, so pages that failed are picked up by the next one.
+        """
+        now = datetime.now().isoformat()
+        with self.state.transaction():
+            self.state.set_meta('last_build_time', now)
+
+            if is_full_build:
+                self.state.set_meta('last_full_build', now)
+            if complete and (is_full_build or self._archives_rebuilt):
+                self.state.set_meta('last_archive_build', now)
+        self._archives_rebuilt = False
         
-        self._save_cache()
-        print(f"💾 Build cache saved to {self.cache_file}")
+        print(f"💾 Build state saved to {self.state.path}")
     
     def get_stats(self):
         """Get cache statistics"""
@@ -286,14 +340,20 @@ class IncrementalBuilder:
             'posts_cached': len(self.cache['posts']),
             'pages_cached': len(self.cache['pages']),
             'assets_cached': len(self.cache['assets']),
-            'last_build': self.cache.get('last_build_time'),
-            'last_full_build': self.cache.get('last_full_build')
+            'graph_posts': self.state.get_meta('graph_posts', 0),
+            'graph_edges': self.state.get_meta('graph_edges', 0),
+            'last_build': self.last_build_time,
+            'last_full_build': self.state.get_meta('last_full_build')
         }
     
     def clear_cache(self):
         """Clear all cache data (force full rebuild)"""
-        self.cache = self._empty_cache()
-        self._save_cache()
+        with self.state.transaction():
+            for kind in CACHE_TYPES + ('graph',):
+                self.state.clear(kind)
+            for key in META_KEYS:
+                self.state.set_meta(key, None)
+        self._graph_rows = None
         print("🗑️  Build cache cleared - next build will be full")
     
     def remove_stale_entries(self, current_urls):
@@ -301,14 +361,10 @@ class IncrementalBuilder:
         removed = 0
         
         for cache_type in ['posts', 'pages']:
-            cached_urls = list(self.cache[cache_type].keys())
-            for url in cached_urls:
-                if url not in current_urls:
-                    del self.cache[cache_type][url]
-                    removed += 1
+            stale = [url for url in self.cache[cache_type] if url not in current_urls]
+            removed += self.state.delete(cache_type, stale)
         
         if removed > 0:
             print(f"🧹 Removed {removed} stale cache entries")
-            self._save_cache()
         
         return removed
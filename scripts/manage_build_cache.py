@@ -12,20 +12,32 @@ Use this script to:
 - Get cache statistics
 
 Usage:
-    python3 scripts/manage_build_cache.py view   # View cache contents
-    python3 scripts/manage_build_cache.py clear  # Clear cache (forces full rebuild)
-    python3 scripts/manage_build_cache.py stats  # Show cache statistics
+    python3 scripts/manage_build_cache.py inspect  # View cache contents
+    python3 scripts/manage_build_cache.py clear    # Clear cache (forces full rebuild)
+    python3 scripts/manage_build_cache.py stats    # Show cache statistics
+    python3 scripts/manage_build_cache.py kinds    # Entry counts for every cache in the store
+    python3 scripts/manage_build_cache.py query images 2024/01   # Entries whose key matches
+    python3 scripts/manage_build_cache.py get posts /2024/01/some-post/
+    python3 scripts/manage_build_cache.py count images
+    python3 scripts/manage_build_cache.py meta last_build_time
 
-The cache is stored in .build-cache.json and tracks:
+The cache is stored in the build state database (.build-state.db, see
+build_state.py) and tracks:
 - Content hashes (to detect changes)
 - Modified timestamps
 - Post/page/media metadata
+- The dependency graph (which pages list or link to each post)
+- The image optimization, HTML transform and HTTP validator caches
+
+count and meta print bare values, for use in shell scripts.
 
 Manage the incremental build cache
 """
 
+import json
 import sys
 from pathlib import Path
+from build_state import BuildState
 from incremental_builder import IncrementalBuilder
 from datetime import datetime
 
@@ -39,6 +51,10 @@ def print_stats(builder):
     print(f"Pages cached:      {stats['pages_cached']}")
     print(f"Assets cached:     {stats['assets_cached']}")
     print(f"Total entries:     {stats['posts_cached'] + stats['pages_cached'] + stats['assets_cached']}")
+    if stats['graph_posts']:
+        print(f"Dependency graph:  {stats['graph_posts']} posts, {stats['graph_edges']} page links")
+    else:
+        print(f"Dependency graph:  Not recorded (next change rebuilds all archives)")
     
     if stats['last_build']:
         try:
@@ -80,11 +96,19 @@ def print_usage():
     print("  python manage_build_cache.py stats       - Show cache statistics")
     print("  python manage_build_cache.py clear       - Clear cache (force full rebuild)")
     print("  python manage_build_cache.py inspect     - Show detailed cache contents")
+    print("  python manage_build_cache.py kinds       - Entry counts per cache kind, plus meta")
+    print("  python manage_build_cache.py query KIND [TEXT] [LIMIT]")
+    print("                                           - Entries of KIND whose key contains TEXT")
+    print("  python manage_build_cache.py get KIND KEY - Print one entry as JSON")
+    print("  python manage_build_cache.py count KIND  - Print the number of KIND entries")
+    print("  python manage_build_cache.py meta [KEY]  - Print build metadata")
     print("  python manage_build_cache.py help        - Show this help message")
     print()
     print("Examples:")
     print("  python manage_build_cache.py stats")
     print("  python manage_build_cache.py clear")
+    print("  python manage_build_cache.py query images 2024/01 20")
+    print("  python manage_build_cache.py get graph /2024/01/some-post/")
 
 def inspect_cache(builder):
     """Show detailed cache contents"""
@@ -92,16 +116,10 @@ def inspect_cache(builder):
     print("=" * 60)
     
     # Show recent posts
-    posts = builder.cache['posts']
-    if posts:
-        print(f"\n📝 Recent Posts ({len(posts)} total):")
-        sorted_posts = sorted(
-            posts.items(),
-            key=lambda x: x[1].get('processed', ''),
-            reverse=True
-        )[:10]
-        
-        for url, data in sorted_posts:
+    posts_total = len(builder.cache['posts'])
+    if posts_total:
+        print(f"\n📝 Recent Posts ({posts_total} total):")
+        for url, data, _ in builder.state.recent('posts', 10):
             processed = data.get('processed', 'Unknown')
             try:
                 proc_dt = datetime.fromisoformat(processed)
@@ -116,16 +134,10 @@ def inspect_cache(builder):
         print("\n📝 Posts: None cached")
     
     # Show recent pages
-    pages = builder.cache['pages']
-    if pages:
-        print(f"\n📄 Recent Pages ({len(pages)} total):")
-        sorted_pages = sorted(
-            pages.items(),
-            key=lambda x: x[1].get('processed', ''),
-            reverse=True
-        )[:10]
-        
-        for url, data in sorted_pages:
+    pages_total = len(builder.cache['pages'])
+    if pages_total:
+        print(f"\n📄 Recent Pages ({pages_total} total):")
+        for url, data, _ in builder.state.recent('pages', 10):
             processed = data.get('processed', 'Unknown')
             try:
                 proc_dt = datetime.fromisoformat(processed)
@@ -140,6 +152,39 @@ def inspect_cache(builder):
     
     print("\n" + "=" * 60)
 
+def print_kinds(state):
+    """Entry counts for every cache kind, plus the meta values"""
+    print(f"🗄️  Build state: {state.path}")
+    print("=" * 60)
+    kinds = state.kinds()
+    if not kinds:
+        print("No entries")
+    for kind, count in kinds.items():
+        print(f"{kind:<18} {count:>8} entries")
+    meta = state.all_meta()
+    if meta:
+        print()
+        for key, value in meta.items():
+            print(f"{key:<18} {value}")
+    print("=" * 60)
+
+def query_entries(state, kind, text='', limit=50):
+    """List entries of kind whose key contains text"""
+    rows = state.search(kind, text, limit)
+    if not rows:
+        print(f"No {kind} entries matching '{text}'")
+        return
+    for key, value, updated in rows:
+        when = datetime.fromtimestamp(updated).strftime('%Y-%m-%d %H:%M')
+        summary = json.dumps(value, separators=(',', ':'))
+        if len(summary) > 100:
+            summary = summary[:97] + '...'
+        print(f"  • {key}  ({when})")
+        print(f"    {summary}")
+    total = len(state.search(kind, text))
+    if total > len(rows):
+        print(f"\n… {total - len(rows)} more (pass a limit to see them)")
+
 def main():
     if len(sys.argv) < 2:
         print_usage()
@@ -151,6 +196,34 @@ def main():
         print_usage()
         sys.exit(0)
     
+    # Commands that read the store directly
+    args = sys.argv[2:]
+    if command in ('kinds', 'query', 'get', 'count', 'meta'):
+        state = BuildState()
+        if command == 'kinds':
+            print_kinds(state)
+        elif command == 'query' and args:
+            limit = int(args[2]) if len(args) > 2 else 50
+            query_entries(state, args[0], args[1] if len(args) > 1 else '', limit)
+        elif command == 'get' and len(args) == 2:
+            value = state.get(args[0], args[1])
+            if value is None:
+                print(f"❌ No {args[0]} entry for {args[1]}")
+                sys.exit(1)
+            print(json.dumps(value, indent=2, sort_keys=True))
+        elif command == 'count' and args:
+            print(state.count(args[0]))
+        elif command == 'meta':
+            if args:
+                value = state.get_meta(args[0])
+                print('' if value is None else value)
+            else:
+                print(json.dumps(state.all_meta(), indent=2, sort_keys=True))
+        else:
+            print_usage()
+            sys.exit(1)
+        sys.exit(0)
+
     # Initialize builder
     builder = IncrementalBuilder()
     
@@ -2,6 +2,9 @@
 """
 Markdown Content Exporter
 Converts HTML content to clean, readable markdown with frontmatter
+
+Page metadata comes from the generator's build manifest (page records in
+.build-state.db) when available; HTML is only parsed for the content.
 """
 
 import os
@@ -12,7 +15,7 @@ from pathlib import Path
 from bs4 import BeautifulSoup
 from datetime import datetime
 import html2text
-import yaml
+from page_manifest import BuildManifest, url_for_file
 
 class MarkdownExporter:
     def __init__(self, html_dir, markdown_dir, base_url):
@@ -34,6 +37,11 @@ class MarkdownExporter:
             'pages_exported': 0,
             'errors': 0
         }
+        
+        self.manifest = BuildManifest(self.html_dir)
+        # Flat post files written this run: {filename: metadata}, used for
+        # index.json and SITEMAP.md instead of re-reading the frontmatter
+        self.exported_posts = {}
     
     def export_all_content(self):
         """Export all HTML content to markdown"""
@@ -119,6 +127,7 @@ class MarkdownExporter:
         flat_file = self.markdown_dir / 'posts' / f"{slug}.md"
         flat_file.parent.mkdir(parents=True, exist_ok=True)
         flat_file.write_text(full_markdown, encoding='utf-8')
+        self.exported_posts[flat_file.name] = metadata
         
         print(f"   ✅ {relative_path}")
     
@@ -185,8 +194,43 @@ class MarkdownExporter:
         output_file.write_text(full_markdown, encoding='utf-8')
         print(f"   ✅ {output_file.relative_to(self.markdown_dir)}")
     
+    def _metadata_from_record(self, record, html_file):
+        """Frontmatter metadata from a build manifest record"""
+        metadata = {}
+        
+        if record['heading'] or record['title']:
+            metadata['title'] = record['heading'] or record['title']
+        if record['description']:
+            metadata['description'] = record['description']
+        if record['image'] is not None:
+            metadata['image'] = record['image']
+        metadata.update(record['jsonld'])
+        if record['categories']:
+            metadata['categories'] = record['categories']
+        if record['tags']:
+            metadata['tags'] = record['tags']
+        metadata['author'] = record['author'] or 'James Kilby'
+        
+        if record['canonical'] is not None:
+            metadata['url'] = record['canonical']
+        else:
+            metadata['url'] = self._url_from_path(html_file)
+        
+        return metadata
+    
+    def _url_from_path(self, html_file):
+        """Construct a page URL from its file path"""
+        relative_path = html_file.parent.relative_to(self.html_dir)
+        if relative_path == Path('.'):
+            return self.base_url + '/'
+        return f"{self.base_url}/{relative_path}/"
+    
     def _extract_metadata(self, soup, html_file):
-        """Extract metadata from HTML"""
+        """Extract metadata from the build manifest, or from HTML"""
+        record = self.manifest.get(url_for_file(self.html_dir, html_file))
+        if record:
+            return self._metadata_from_record(record, html_file)
+        
         metadata = {}
         
         # Title
@@ -250,11 +294,7 @@ class MarkdownExporter:
             metadata['url'] = canonical.get('href', '')
         else:
             # Construct from file path
-            relative_path = html_file.parent.relative_to(self.html_dir)
-            if relative_path == Path('.'):
-                metadata['url'] = self.base_url + '/'
-            else:
-                metadata['url'] = f"{self.base_url}/{relative_path}/"
+            metadata['url'] = self._url_from_path(html_file)
         
         return metadata
     
@@ -430,29 +470,13 @@ class MarkdownExporter:
         }
         
         # Index posts
-        posts_dir = self.markdown_dir / 'posts'
-        if posts_dir.exists():
-            for md_file in sorted(posts_dir.glob('*.md')):
-                # Extract frontmatter
-                content = md_file.read_text(encoding='utf-8')
-                frontmatter_match = re.search(r'^---\n(.*?)\n---', content, re.DOTALL)
-                
-                if frontmatter_match:
-                    try:
-                        fm = yaml.safe_load(frontmatter_match.group(1))
-                        # Convert date to string if it's a datetime object
-                        date_value = fm.get('date', '')
-                        if isinstance(date_value, datetime):
-                            date_value = date_value.strftime('%Y-%m-%dT%H:%M:%SZ')
-                        
-                        index_data['posts'].append({
-                            'file': f"posts/{md_file.name}",
-                            'title': fm.get('title', ''),
-                            'date': date_value,
-                            'url': fm.get('url', '')
-                        })
-                    except (yaml.YAMLError, KeyError, AttributeError, TypeError):
-                        pass
+        for filename, metadata in sorted(self.exported_posts.items()):
+            index_data['posts'].append({
+                'file': f"posts/{filename}",
+                'title': metadata.get('title', ''),
+                'date': self._index_date(metadata.get('date_published', '')),
+                'url': metadata.get('url', '')
+            })
         
         # Save index
         index_file = self.markdown_dir / 'index.json'
@@ -460,6 +484,16 @@ class MarkdownExporter:
         
         print(f"   ✅ Created index: {index_file}")
     
+    @staticmethod
+    def _index_date(value):
+        """Normalise a JSON-LD date to the index.json format"""
+        if not value:
+            return ''
+        try:
+            return datetime.fromisoformat(str(value).replace('Z', '+00:00')).strftime('%Y-%m-%dT%H:%M:%SZ')
+        except ValueError:
+            return str(value)
+    
     def _create_markdown_sitemap(self):
         """Create sitemap of markdown files"""
         print("🗺️  Creating markdown sitemap...")
@@ -470,23 +504,13 @@ class MarkdownExporter:
         
         # List posts
         sitemap_lines.append('## Blog Posts\n')
-        posts_dir = self.markdown_dir / 'posts'
-        if posts_dir.exists():
-            for md_file in sorted(posts_dir.glob('*.md'), reverse=True):
-                content = md_file.read_text(encoding='utf-8')
-                frontmatter_match = re.search(r'^---\n(.*?)\n---', content, re.DOTALL)
-                
-                if frontmatter_match:
-                    try:
-                        fm = yaml.safe_load(frontmatter_match.group(1))
-                        title = fm.get('title', md_file.stem)
-                        url = fm.get('url', '')
-                        date = fm.get('date', '')
-                        
-                        sitemap_lines.append(f"- [{title}]({url}) - {date}")
-                        sitemap_lines.append(f"  - Markdown: `/markdown/posts/{md_file.name}`\n")
-                    except (yaml.YAMLError, KeyError, AttributeError, TypeError):
-                        sitemap_lines.append(f"- {md_file.name}\n")
+        for filename, metadata in sorted(self.exported_posts.items(), reverse=True):
+            title = metadata.get('title', Path(filename).stem)
+            url = metadata.get('url', '')
+            date = metadata.get('date_published', '')
+            
+            sitemap_lines.append(f"- [{title}]({url}) - {date}")
+            sitemap_lines.append(f"  - Markdown: `/markdown/posts/{filename}`\n")
         
         # Save sitemap
         sitemap_file = self.markdown_dir / 'SITEMAP.md'
@@ -4,8 +4,9 @@ Image Optimization Script for WordPress Static Site
 Fetches images from WordPress API, optimizes them, and replaces in static site.
 
 Features:
-- Converts JPEG/PNG to WebP and AVIF formats
-- Generates responsive image variants
+- Converts JPEG/PNG to WebP and AVIF (optionally JPEG XL) formats
+- Decodes each original once and cuts its WordPress size variants from it
+- Optional perceptual quality targeting (--target-ssim), searched once per image
 - Updates HTML to use <picture> elements with format fallbacks
 - Maintains original images as fallback
 - Tracks optimization metrics
@@ -15,19 +16,19 @@ Requirements:
 - pillow-avif-plugin for AVIF support
 """
 
-import os
+import re
 import sys
 import json
 import time
 import requests
 from pathlib import Path
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple, Optional
 import hashlib
 from datetime import datetime
 
 try:
-    from PIL import Image
+    from PIL import Image, ImageOps
     import pillow_avif
 except ImportError:
     print("ERROR: Required packages not installed")
@@ -36,13 +37,301 @@ except ImportError:
 
 from bs4 import BeautifulSoup
 
+from build_state import BuildState
+import image_quality
+
+
+# WordPress size variants are named <original>-<width>x<height>.<ext>
+WP_SIZE_RE = re.compile(r'^(?P<base>.+)-(?P<width>\d+)x(?P<height>\d+)$')
+
+# Pillow save format and options per output format, in encode order
+ENCODERS = {
+    'webp': ('WEBP', {'method': 6}),   # Slower but better compression
+    'avif': ('AVIF', {'speed': 4}),    # Balance between speed and compression
+    'jxl': ('JXL', {'effort': 7}),
+}
+DEFAULT_FORMATS = ('webp', 'avif')
+
+# EXIF orientation tag and the transpose that makes each value upright
+EXIF_ORIENTATION = 0x0112
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+# The optimization cache (kind 'images', keyed by site-relative path) and the
+# qualities chosen by --target-ssim (kind 'image_quality', keyed by
+# "<image hash>:<target>") live in the build state store. These files in the
+# cache directory held them before and are imported into an empty store.
+CACHE_FILENAME = 'optimization_cache.jsonl'
+LEGACY_CACHE_FILENAME = 'optimization_cache.json'
+QUALITY_CACHE_FILENAME = 'quality_cache.jsonl'
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_hash(path: Path) -> str:
+    """BLAKE2b-128 of a file, streamed in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stat_signature(st) -> Dict[str, int]:
+    """Fields compared before falling back to a content hash."""
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'inode': st.st_ino}
+
+
+def jxl_available() -> bool:
+    """True if a Pillow JPEG XL plugin is installed."""
+    try:
+        import pillow_jxl  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def wordpress_source(image_path: Path) -> Optional[Path]:
+    """Full-size original a WordPress size variant was generated from."""
+    match = WP_SIZE_RE.match(image_path.stem)
+    if not match:
+        return None
+    return image_path.with_name(match.group('base') + image_path.suffix)
+
+
+def new_result(image_path: Path) -> Dict[str, any]:
+    """Empty result record for one image."""
+    suffix = image_path.suffix.lower()
+    if suffix in ['.jpg', '.jpeg']:
+        format_type = 'JPEG'
+    elif suffix == '.png':
+        format_type = 'PNG'
+    else:
+        format_type = 'UNKNOWN'
+    return {
+        'original': str(image_path),
+        'webp': None,
+        'avif': None,
+        'jxl': None,
+        'original_size': 0,
+        'webp_size': 0,
+        'avif_size': 0,
+        'jxl_size': 0,
+        'success': False,
+        'error': None,
+        'was_cached': False,
+        'avif_created': False,
+        'webp_created': False,
+        'jxl_created': False,
+        'derived_from': None,
+        'quality': None,
+        'quality_searched': False,
+        'saved_bytes': 0,
+        'duration_ms': 0,
+        'format_type': format_type
+    }
+
+
+def skipped_result(image_path: Path) -> Dict[str, any]:
+    """Result record for an image the cache says is already optimized."""
+    result = new_result(image_path)
+    result['was_cached'] = True
+    return result
+
+
+def _decode_rgb(image_path: Path):
+    """Decode an image to RGB (alpha flattened onto white)."""
+    with Image.open(image_path) as img:
+        # Convert RGBA to RGB for JPEG compatibility
+        if img.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+            return background
+        return img.convert('RGB')
+
+
+def _resize_from_source(source, width: int, height: int):
+    """The WordPress size variant width x height, cut from the decoded source.
+
+    Proportional sizes are resized; hard-cropped sizes (e.g. 150x150
+    thumbnails) are centre-cropped the way WordPress does. Returns None if
+    the source is smaller than the variant.
+    """
+    source_width, source_height = source.size
+    if width > source_width or height > source_height:
+        return None
+    # Same aspect ratio, allowing for WordPress rounding one side
+    if abs(source_width * height - source_height * width) <= max(source_width, source_height):
+        return source.resize((width, height), Image.LANCZOS)
+    return ImageOps.fit(source, (width, height), Image.LANCZOS)
+
+
+def _encode_formats(img, image_path: Path, public_dir: Path, quality: int,
+                    formats, started: float, known_hash: Optional[str] = None,
+                    target_ssim: Optional[float] = None, known_quality: Optional[Dict] = None):
+    """Write every format for one decoded target; return its merge record.
+
+    With target_ssim, each format is encoded at the lowest quality (capped
+    at quality) meeting that SSIM; known_quality ({format: quality}, from
+    an earlier search on the same image) skips the search.
+    """
+    result = new_result(image_path)
+    chosen = {}
+    cache_entry = None
+    warnings = []
+
+    try:
+        original_stat = image_path.stat()
+        original_size = original_stat.st_size
+        result['original_size'] = original_size
+
+        for fmt in formats:
+            pil_format, options = ENCODERS[fmt]
+            out_path = image_path.with_suffix(f'.{fmt}')
+            try:
+                if target_ssim and (known_quality or {}).get(fmt) is None:
+                    chosen[fmt], data, _ = image_quality.search_quality(
+                        img, pil_format, options, target_ssim, quality)
+                    out_path.write_bytes(data)
+                    result['quality_searched'] = True
+                else:
+                    chosen[fmt] = min((known_quality or {}).get(fmt) or quality, quality)
+                    img.save(out_path, pil_format, quality=chosen[fmt], **options)
+            except Exception as e:
+                if fmt == 'webp':
+                    raise  # WebP is the baseline format — treat as an error
+                # AVIF / JPEG XL might fail on some systems
+                warnings.append(f"⚠️  {fmt.upper()} generation failed for {image_path.name}: {e}")
+                continue
+            result[fmt] = str(out_path)
+            result[f'{fmt}_size'] = out_path.stat().st_size
+            result[f'{fmt}_created'] = True
+
+        result['success'] = True
+        result['quality'] = chosen
+
+        # Calculate savings (use smallest modern format vs original)
+        smallest_size = min(result[f'{fmt}_size'] for fmt in formats if result[f'{fmt}_created'])
+        result['saved_bytes'] = original_size - smallest_size
+
+        # Cache entry with new format tracking
+        cache_entry = {
+            'hash': known_hash or file_hash(image_path),
+            'optimized_at': datetime.now().isoformat(),
+            'optimized_size': result['webp_size'],
+            'timestamp': time.time(),
+            'target_ssim': target_ssim,
+            **stat_signature(original_stat),
+        }
+        for fmt in formats:
+            created = result[f'{fmt}_created']
+            cache_entry[f'{fmt}_created'] = created
+            cache_entry[fmt] = str(Path(result[fmt]).relative_to(public_dir)) if created else None
+
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['duration_ms'] = int((time.time() - started) * 1000)
+    return result, cache_entry, tuple(warnings)
+
+
+def encode_image_group(source_path: Path, targets: List[Path], public_dir: Path,
+                       quality: int = 85, formats=DEFAULT_FORMATS, hashes=None,
+                       target_ssim: Optional[float] = None, qualities=None):
+    """
+    Decode source_path once and encode every target from it.
+
+    targets are the source itself and/or its WordPress size variants
+    (photo-300x200.jpg, ...). Each variant is resized from the decoded
+    original rather than decoding its own JPEG; if that is not possible
+    (source unreadable or smaller than the variant) the variant is decoded
+    on its own. hashes ({str(path): hash}) are content hashes the parent
+    already computed this run, so they are not recomputed here.
+
+    With target_ssim, qualities ({str(path): {format: quality}}) are the
+    per-format qualities previously chosen for unchanged content; targets
+    without one get a quality search (see image_quality.search_quality).
+
+    Runs in encoder worker processes, so it touches no shared state: it
+    returns one (result record, cache entry or None, warnings) per target
+    and the parent merges them with ImageOptimizer._merge_result.
+    """
+    records = []
+    try:
+        source = _decode_rgb(source_path)
+        # Variants are cut from the upright image, as WordPress does
+        with Image.open(source_path) as header:
+            orientation = header.getexif().get(EXIF_ORIENTATION, 1)
+        source_upright = source.transpose(EXIF_TRANSPOSE[orientation]) \
+            if orientation in EXIF_TRANSPOSE else source
+    except Exception:
+        source = source_upright = None
+
+    for target in targets:
+        started = time.time()
+        img = None
+        derived = False
+        if target == source_path:
+            img = source
+        elif source_upright is not None:
+            match = WP_SIZE_RE.match(target.stem)
+            img = _resize_from_source(source_upright, int(match.group('width')),
+                                      int(match.group('height')))
+            derived = img is not None
+        try:
+            if img is None:
+                img = _decode_rgb(target)
+        except Exception as e:
+            result = new_result(target)
+            result['error'] = str(e)
+            result['duration_ms'] = int((time.time() - started) * 1000)
+            records.append((result, None, ()))
+            continue
+        record = _encode_formats(img, target, public_dir, quality, formats, started,
+                                 (hashes or {}).get(str(target)), target_ssim,
+                                 (qualities or {}).get(str(target)))
+        if derived:
+            record[0]['derived_from'] = str(source_path)
+        records.append(record)
+    return records
+
+
+def encode_image(image_path: Path, public_dir: Path, quality: int = 85,
+                 formats=DEFAULT_FORMATS, hashes=None, target_ssim: Optional[float] = None,
+                 qualities=None):
+    """Encode a single image on its own (see encode_image_group)."""
+    return encode_image_group(image_path, [image_path], public_dir, quality, formats, hashes,
+                              target_ssim, qualities)[0]
+
 
 class ImageOptimizer:
     """Optimizes images for static site performance"""
 
-    def __init__(self, public_dir: str, wp_api_url: str = None, cache_dir: str = None):
+    def __init__(self, public_dir: str, wp_api_url: str = None, cache_dir: str = None,
+                 jxl: bool = False, target_ssim: Optional[float] = None,
+                 state: Optional[BuildState] = None):
         self.public_dir = Path(public_dir)
         self.wp_api_url = wp_api_url
+        self.formats = DEFAULT_FORMATS
+        if jxl:
+            if jxl_available():
+                self.formats = DEFAULT_FORMATS + ('jxl',)
+            else:
+                print("⚠️  JPEG XL requested but pillow-jxl-plugin is not installed, skipping JXL")
+        self.target_ssim = target_ssim
+        if target_ssim and not image_quality.is_available():
+            print("⚠️  --target-ssim needs numpy (pip install numpy), using fixed quality")
+            self.target_ssim = None
         # Use project root cache directory for consistency with GitHub Actions
         if cache_dir:
             self.cache_dir = Path(cache_dir)
@@ -59,92 +348,173 @@ class ImageOptimizer:
             'original_size': 0,
             'optimized_size': 0,
             'webp_generated': 0,
-            'avif_generated': 0
+            'avif_generated': 0,
+            'jxl_generated': 0,
+            'variants_derived': 0,
+            'quality_searches': 0
         }
         self.optimization_results = []  # For JSON output
-        self.optimization_cache = {}
+        # Entries are looked up and upserted one at a time in the build state store
+        self.state = state or BuildState()
+        self.optimization_cache = self.state.table('images')
+        self._updated_cache_keys = set()
+        self._hashes = {}  # path -> (stat signature, hash), reused within a run
+        self.quality_cache = self.state.table('image_quality')  # "<hash>:<target>" -> {format: quality}
+        self._new_qualities = 0
         self.load_optimization_cache()
 
     def load_optimization_cache(self):
-        """Load cache of previously optimized images to avoid reprocessing"""
-        cache_file = self.cache_dir / 'optimization_cache.json'
-        if cache_file.exists():
-            try:
-                with open(cache_file, 'r') as f:
-                    self.optimization_cache = json.load(f)
-                print(f"📦 Loaded optimization cache with {len(self.optimization_cache)} entries")
-            except Exception as e:
-                print(f"⚠️  Could not load cache: {e}")
-
-    def save_optimization_cache(self):
-        """Save optimization cache for future runs"""
-        cache_file = self.cache_dir / 'optimization_cache.json'
+        """Report the optimization cache, importing pre-SQLite cache files once."""
+        if not len(self.optimization_cache):
+            self._import_legacy_cache()
+        if not len(self.quality_cache):
+            self._import_legacy_quality_cache()
+        print(f"📦 Optimization cache has {len(self.optimization_cache)} entries")
+
+    def _import_legacy_cache(self):
+        cache_file = self.cache_dir / CACHE_FILENAME
+        legacy_file = self.cache_dir / LEGACY_CACHE_FILENAME
+        entries = {}
         try:
-            with open(cache_file, 'w') as f:
-                json.dump(self.optimization_cache, f, indent=2)
-            print(f"💾 Saved optimization cache with {len(self.optimization_cache)} entries")
+            if cache_file.exists():
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # e.g. a line cut short by an interrupted run
+                        entries[record['path']] = record['entry']
+            elif legacy_file.exists():
+                with open(legacy_file, 'r') as f:
+                    entries = json.load(f)
         except Exception as e:
-            print(f"⚠️  Could not save cache: {e}")
+            print(f"⚠️  Could not import legacy optimization cache: {e}")
+            return
+        if entries:
+            self.optimization_cache.update(entries)
+            print(f"📦 Imported {len(entries)} optimization cache entries into {self.state.path}")
+
+    def _import_legacy_quality_cache(self):
+        cache_file = self.cache_dir / QUALITY_CACHE_FILENAME
+        if not cache_file.exists():
+            return
+        qualities = {}
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    qualities[record['key']] = record['quality']
+        except Exception as e:
+            print(f"⚠️  Could not import legacy quality cache: {e}")
+            return
+        self.quality_cache.update(qualities)
 
-    def get_image_hash(self, image_path: Path) -> str:
-        """Calculate hash of image file for cache checking"""
+    def save_optimization_cache(self):
+        """Report cache updates (entries were upserted as they changed)."""
+        print(f"💾 Optimization cache has {len(self.optimization_cache)} entries "
+              f"({len(self._updated_cache_keys)} updated)")
+        self._updated_cache_keys.clear()
+
+    def save_quality_cache(self):
+        """Report quality search results stored this run."""
+        if self._new_qualities:
+            print(f"💾 Saved {self._new_qualities} new quality search results")
+            self._new_qualities = 0
+
+    def _quality_key(self, image_hash: str) -> str:
+        return f'{image_hash}:{self.target_ssim}'
+
+    def _known_qualities(self, images: List[Path]) -> Dict[str, Dict[str, int]]:
+        """Qualities found by earlier searches on the same content, for workers."""
+        if not self.target_ssim:
+            return {}
+        known = {}
+        for img in images:
+            chosen = self.quality_cache.get(self._quality_key(self.get_image_hash(img)))
+            if chosen:
+                known[str(img)] = chosen
+        return known
+
+    def _cache_put(self, key: str, entry: Dict):
+        self.optimization_cache[key] = entry
+        self._updated_cache_keys.add(key)
+
+    def get_image_hash(self, image_path: Path, st=None) -> str:
+        """Calculate hash of image file for cache checking (once per run per file)"""
         try:
-            with open(image_path, 'rb') as f:
-                return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+            st = st or image_path.stat()
+            signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+            cached = self._hashes.get(image_path)
+            if cached and cached[0] == signature:
+                return cached[1]
+            image_hash = file_hash(image_path)
+            self._hashes[image_path] = (signature, image_hash)
+            return image_hash
         except Exception:
             return ""
 
+    def _source_unchanged(self, image_path: Path, cache_key: str, entry: Dict, st) -> bool:
+        """Stat-first check that an original still matches its cache entry.
+
+        (size, mtime_ns, inode) equal to the recorded values means unchanged;
+        otherwise the file is hashed, and on a match the recorded stat
+        fields are refreshed so the next run takes the fast path.
+        """
+        signature = stat_signature(st)
+        if all(entry.get(field) == value for field, value in signature.items()):
+            return True
+        if self.get_image_hash(image_path, st) != entry.get('hash'):
+            return False
+        self._cache_put(cache_key, {**entry, **signature})
+        return True
+
     def should_optimize_image(self, image_path: Path) -> bool:
         """Check if image should be optimized based on cache and existing files"""
-        if not image_path.exists():
+        try:
+            st = image_path.stat()
+        except OSError:
             return False
 
-        # Skip if already webp or avif
-        if image_path.suffix.lower() in ['.webp', '.avif']:
+        # Skip if already a modern format
+        if image_path.suffix.lower() in ['.webp', '.avif', '.jxl']:
             return False
 
-        # Check if AVIF and WebP already exist (even if not in cache)
-        avif_path = image_path.with_suffix('.avif')
-        webp_path = image_path.with_suffix('.webp')
-
-        # If both modern formats exist on disk, skip (trust the files)
-        if avif_path.exists() and webp_path.exists():
-            # Populate cache if missing so future runs are fast
-            cache_key = str(image_path.relative_to(self.public_dir))
-            if cache_key not in self.optimization_cache:
-                self.optimization_cache[cache_key] = {
-                    'hash': self.get_image_hash(image_path),
-                    'optimized_at': '',
-                    'optimized_size': 0,
-                    'timestamp': 0,
-                    'webp_created': True,
-                    'avif_created': True,
-                    'webp': str(webp_path.relative_to(self.public_dir)),
-                    'avif': str(avif_path.relative_to(self.public_dir))
-                }
-            return False
+        # Every modern format must exist on disk
+        modern_paths = {fmt: image_path.with_suffix(f'.{fmt}') for fmt in self.formats}
+        if not all(path.exists() for path in modern_paths.values()):
+            return True
 
-        # Check cache for unchanged images that need AVIF/WebP created
         cache_key = str(image_path.relative_to(self.public_dir))
-        if cache_key in self.optimization_cache:
-            cached_data = self.optimization_cache[cache_key]
-            cached_hash = cached_data.get('hash', '')
-            current_hash = self.get_image_hash(image_path)
-            
-            # If hash matches and cache says AVIF was created, verify file exists
-            if cached_hash == current_hash:
-                avif_created = cached_data.get('avif_created', False)
-                webp_created = cached_data.get('webp_created', False)
-                
-                # Only skip if both formats were created AND files still exist
-                if avif_created and webp_created and avif_path.exists() and webp_path.exists():
-                    return False
+        entry = self.optimization_cache.get(cache_key)
+        if entry is None:
+            # Files exist but aren't cached (trust them): populate the cache
+            # so future runs are fast
+            entry = {
+                'hash': self.get_image_hash(image_path, st),
+                'optimized_at': '',
+                'optimized_size': 0,
+                'timestamp': 0,
+                'target_ssim': self.target_ssim,
+                **stat_signature(st),
+            }
+            for fmt, path in modern_paths.items():
+                entry[f'{fmt}_created'] = True
+                entry[fmt] = str(path.relative_to(self.public_dir))
+            self._cache_put(cache_key, entry)
+            return False
 
-        return True
+        # Re-encode if the quality mode changed or the original changed
+        # since it was optimized
+        if entry.get('target_ssim') != self.target_ssim:
+            return True
+        return not self._source_unchanged(image_path, cache_key, entry, st)
 
     def optimize_image(self, image_path: Path, quality: int = 85) -> Dict[str, any]:
         """
-        Optimize a single image by creating WebP and AVIF versions
+        Optimize a single image in this process by creating its modern-format versions
 
         Args:
             image_path: Path to the original image
@@ -153,125 +523,57 @@ class ImageOptimizer:
         Returns:
             Dictionary with optimization results
         """
-        start_time = time.time()
-        result = {
-            'original': str(image_path),
-            'webp': None,
-            'avif': None,
-            'original_size': 0,
-            'webp_size': 0,
-            'avif_size': 0,
-            'success': False,
-            'error': None,
-            'was_cached': False,
-            'avif_created': False,
-            'webp_created': False,
-            'saved_bytes': 0,
-            'duration_ms': 0,
-            'format_type': 'UNKNOWN'
-        }
+        if not self.should_optimize_image(image_path):
+            return self._merge_result(skipped_result(image_path))
+        known_qualities = self._known_qualities([image_path])
+        return self._merge_result(*encode_image(image_path, self.public_dir, quality, self.formats,
+                                                self._known_hashes([image_path]),
+                                                self.target_ssim, known_qualities))
+
+    def _merge_result(self, result: Dict[str, any], cache_entry: Optional[Dict] = None,
+                      warnings: Tuple[str, ...] = ()) -> Dict[str, any]:
+        """Fold one result record into stats, results and the cache (parent only)."""
+        image_name = Path(result['original']).name
+        for warning in warnings:
+            print(warning)
 
-        try:
-            # Determine format type
-            suffix = image_path.suffix.lower()
-            if suffix in ['.jpg', '.jpeg']:
-                result['format_type'] = 'JPEG'
-            elif suffix == '.png':
-                result['format_type'] = 'PNG'
-
-            # Check if should optimize
-            if not self.should_optimize_image(image_path):
-                self.stats['skipped'] += 1
-                result['was_cached'] = True
-                result['duration_ms'] = int((time.time() - start_time) * 1000)
-                self.optimization_results.append(result)
-                return result
-
-            # Get original size
-            original_size = image_path.stat().st_size
-            result['original_size'] = original_size
-            self.stats['original_size'] += original_size
-
-            # Open image
-            with Image.open(image_path) as img:
-                # Convert RGBA to RGB for JPEG compatibility
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
-
-                # Generate WebP version
-                webp_path = image_path.with_suffix('.webp')
-                img.save(
-                    webp_path,
-                    'WEBP',
-                    quality=quality,
-                    method=6  # Slower but better compression
-                )
-                webp_size = webp_path.stat().st_size
-                result['webp'] = str(webp_path)
-                result['webp_size'] = webp_size
-                result['webp_created'] = True
-                self.stats['webp_generated'] += 1
-                self.stats['optimized_size'] += webp_size
-
-                # Generate AVIF version (best compression)
-                avif_created = False
-                try:
-                    avif_path = image_path.with_suffix('.avif')
-                    img.save(
-                        avif_path,
-                        'AVIF',
-                        quality=quality,
-                        speed=4  # Balance between speed and compression
-                    )
-                    avif_size = avif_path.stat().st_size
-                    result['avif'] = str(avif_path)
-                    result['avif_size'] = avif_size
-                    result['avif_created'] = True
-                    avif_created = True
-                    self.stats['avif_generated'] += 1
-                    self.stats['optimized_size'] += avif_size
-                except Exception as e:
-                    # AVIF might fail on some systems
-                    print(f"⚠️  AVIF generation failed for {image_path.name}: {e}")
-
-                result['success'] = True
-                self.stats['optimized'] += 1
-
-                # Calculate savings (use smallest modern format vs original)
-                smallest_size = min(webp_size, avif_size if avif_created else webp_size)
-                result['saved_bytes'] = original_size - smallest_size
-
-                # Update cache with new format tracking
-                cache_key = str(image_path.relative_to(self.public_dir))
-                self.optimization_cache[cache_key] = {
-                    'hash': self.get_image_hash(image_path),
-                    'optimized_at': datetime.now().isoformat(),
-                    'optimized_size': webp_size,
-                    'timestamp': time.time(),
-                    'webp_created': True,
-                    'avif_created': avif_created,
-                    'webp': str(webp_path.relative_to(self.public_dir)),
-                    'avif': str(avif_path.relative_to(self.public_dir)) if avif_created else None
-                }
-
-                # Calculate savings for display
-                savings = original_size - webp_size
-                savings_pct = (savings / original_size * 100) if original_size > 0 else 0
-                print(f"✅ {image_path.name}: {original_size/1024:.1f}KB → {webp_size/1024:.1f}KB ({savings_pct:.1f}% saved)")
-
-        except Exception as e:
-            result['error'] = str(e)
+        self.optimization_results.append(result)
+        if result['was_cached']:
+            self.stats['skipped'] += 1
+            return result
+
+        self.stats['original_size'] += result['original_size']
+        for fmt in ENCODERS:
+            if result[f'{fmt}_created']:
+                self.stats[f'{fmt}_generated'] += 1
+                self.stats['optimized_size'] += result[f'{fmt}_size']
+        if result['derived_from']:
+            self.stats['variants_derived'] += 1
+        if result['quality_searched']:
+            self.stats['quality_searches'] += 1
+
+        if result['success']:
+            self.stats['optimized'] += 1
+            if cache_entry:
+                cache_key = str(Path(result['original']).relative_to(self.public_dir))
+                self._cache_put(cache_key, cache_entry)
+                if result['quality_searched']:
+                    quality_key = self._quality_key(cache_entry['hash'])
+                    self.quality_cache[quality_key] = result['quality']
+                    self._new_qualities += 1
+
+            # Calculate savings for display
+            original_size = result['original_size']
+            savings = original_size - result['webp_size']
+            savings_pct = (savings / original_size * 100) if original_size > 0 else 0
+            quality_note = ''
+            if result['quality'] and self.target_ssim:
+                quality_note = ' [q ' + ', '.join(f'{fmt} {q}' for fmt, q in result['quality'].items()) + ']'
+            print(f"✅ {image_name}: {original_size/1024:.1f}KB → {result['webp_size']/1024:.1f}KB ({savings_pct:.1f}% saved){quality_note}")
+        else:
             self.stats['errors'] += 1
-            print(f"❌ Error optimizing {image_path.name}: {e}")
+            print(f"❌ Error optimizing {image_name}: {result['error']}")
 
-        result['duration_ms'] = int((time.time() - start_time) * 1000)
-        self.optimization_results.append(result)
         return result
 
     def find_all_images(self) -> List[Path]:
@@ -285,37 +587,93 @@ class ImageOptimizer:
                 images.extend(uploads_dir.rglob(f'*{ext}'))
                 images.extend(uploads_dir.rglob(f'*{ext.upper()}'))
 
-        return images
+        return sorted(set(images))
+
+    def _known_hashes(self, images: List[Path]) -> Dict[str, str]:
+        """Hashes already computed this run, to pass to encoder workers."""
+        return {str(img): self._hashes[img][1] for img in images if img in self._hashes}
+
+    def group_by_source(self, images: List[Path]) -> Dict[Path, List[Path]]:
+        """
+        Group images to encode under the original they should be decoded from.
+
+        A WordPress size variant (photo-300x200.jpg) joins its full-size
+        original (photo.jpg) when that exists on disk, even if the original
+        itself needs no encoding; anything else is its own group.
+        """
+        groups = {}
+        for img in images:
+            source = wordpress_source(img)
+            if source is None or not source.exists():
+                source = img
+            groups.setdefault(source, []).append(img)
+        return groups
 
     def optimize_all_images(self, max_workers: int = 4, quality: int = 85):
         """
         Optimize all images in parallel
 
         Args:
-            max_workers: Number of parallel workers
+            max_workers: Number of encoder processes (1 = encode in this process)
             quality: Image quality (0-100)
         """
         images = self.find_all_images()
         self.stats['total_images'] = len(images)
 
         print(f"\n🖼️  Found {len(images)} images to process")
-        print(f"⚙️  Using {max_workers} workers with quality={quality}\n")
+        if self.target_ssim:
+            print(f"⚙️  Using {max_workers} workers, targeting SSIM {self.target_ssim} "
+                  f"(quality ≤ {quality})\n")
+        else:
+            print(f"⚙️  Using {max_workers} workers with quality={quality}\n")
 
         start_time = time.time()
 
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {
-                executor.submit(self.optimize_image, img, quality): img
-                for img in images
-            }
-
-            for future in as_completed(futures):
-                result = future.result()
+        # Cache checks are cheap and need the cache, so they stay here;
+        # only the encodes go to the pool.
+        to_encode = []
+        for img in images:
+            if self.should_optimize_image(img):
+                to_encode.append(img)
+            else:
+                self._merge_result(skipped_result(img))
+
+        # One task per original: decoded once, every size variant cut from it
+        groups = self.group_by_source(to_encode)
+        if max_workers > 1 and len(groups) > 1:
+            print(f"🧵 Encoding {len(to_encode)} images ({len(groups)} originals) "
+                  f"on {max_workers} worker processes")
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = [
+                    executor.submit(encode_image_group, source, targets, self.public_dir,
+                                    quality, self.formats, self._known_hashes(targets),
+                                    self.target_ssim, self._known_qualities(targets))
+                    for source, targets in groups.items()
+                ]
+                # Merge in submission order so results/stats are deterministic
+                for (source, targets), future in zip(groups.items(), futures):
+                    try:
+                        records = future.result()
+                    except Exception as e:
+                        records = []
+                        for img in targets:
+                            result = new_result(img)
+                            result['error'] = str(e)
+                            records.append((result,))
+                    for record in records:
+                        self._merge_result(*record)
+        else:
+            for source, targets in groups.items():
+                for record in encode_image_group(source, targets, self.public_dir, quality,
+                                                 self.formats, self._known_hashes(targets),
+                                                 self.target_ssim, self._known_qualities(targets)):
+                    self._merge_result(*record)
 
         duration = time.time() - start_time
 
         # Save cache
         self.save_optimization_cache()
+        self.save_quality_cache()
 
         # Print statistics
         self.print_statistics(duration)
@@ -524,6 +882,11 @@ class ImageOptimizer:
         print(f"Errors:                  {self.stats['errors']}")
         print(f"\nWebP images generated:   {self.stats['webp_generated']}")
         print(f"AVIF images generated:   {self.stats['avif_generated']}")
+        if 'jxl' in self.formats:
+            print(f"JPEG XL images generated: {self.stats['jxl_generated']}")
+        print(f"Size variants derived:   {self.stats['variants_derived']} (resized from a decoded original)")
+        if self.target_ssim:
+            print(f"Quality searches:        {self.stats['quality_searches']} (target SSIM {self.target_ssim})")
         print(f"\nOriginal size:           {self.stats['original_size'] / 1024 / 1024:.2f} MB")
         print(f"Optimized size:          {self.stats['optimized_size'] / 1024 / 1024:.2f} MB")
 
@@ -559,7 +922,19 @@ def main():
         '--workers',
         type=int,
         default=4,
-        help='Number of parallel workers (default: 4)'
+        help='Number of encoder processes (default: 4, 1 = no pool)'
+    )
+    parser.add_argument(
+        '--target-ssim',
+        type=float,
+        default=None,
+        help='Encode each image at the lowest quality (up to --quality) whose '
+             'output reaches this SSIM, e.g. 0.985 (requires numpy)'
+    )
+    parser.add_argument(
+        '--jxl',
+        action='store_true',
+        help='Also generate JPEG XL versions (requires pillow-jxl-plugin)'
     )
     parser.add_argument(
         '--skip-html',
@@ -576,7 +951,14 @@ def main():
         '--cache-dir',
         type=str,
         default='.image_optimization_cache',
-        help='Directory for optimization cache (default: .image_optimization_cache)'
+        help='Directory of the pre-SQLite optimization cache files, imported into '
+             'an empty build state store (default: .image_optimization_cache)'
+    )
+    parser.add_argument(
+        '--state-db',
+        type=str,
+        default=None,
+        help='Build state database holding the optimization cache (default: .build-state.db)'
     )
 
     args = parser.parse_args()
@@ -586,7 +968,9 @@ def main():
     print(f"📦 Cache directory: {args.cache_dir}\n")
 
     # Initialize optimizer with cache directory
-    optimizer = ImageOptimizer(args.public_dir, cache_dir=args.cache_dir)
+    state = BuildState(args.state_db) if args.state_db else None
+    optimizer = ImageOptimizer(args.public_dir, cache_dir=args.cache_dir, jxl=args.jxl,
+                               target_ssim=args.target_ssim, state=state)
 
     # Optimize images
     optimizer.optimize_all_images(
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Build Manifest - per-page metadata captured once during generation
+
+process_html() records everything the post-processing consumers need about a
+page (title, description, dates, images, taxonomy, noindex, text...) while it
+still has the parsed tree in hand. The records hold each page's full text,
+so they are kept with the other build state (kind 'page_records' in
+.build-state.db, one row per URL) rather than in the deployed tree.
+Incremental builds (which seed output from public/) keep records for pages
+they didn't regenerate; records whose page is gone are dropped on save.
+A build-manifest.jsonl left in the output directory by older builds is
+imported into an empty store and removed.
+
+create_sitemap(), generate_rss_feed(), generate_search_index() and
+markdown_exporter.py look pages up here and only parse HTML for files that
+have no record (e.g. pages seeded from a build that predates the manifest).
+"""
+
+import json
+import re
+import threading
+from pathlib import Path
+
+from build_state import BuildState
+
+STATE_KIND = 'page_records'
+LEGACY_MANIFEST_FILENAME = 'build-manifest.jsonl'
+
+# Bump when the record layout changes; older records are ignored on load
+RECORD_VERSION = 1
+
+_SITE_SUFFIX_RE = re.compile(r'\s*[-–|]\s*jameskilby.*$', re.IGNORECASE)
+_POST_LINK_RE = re.compile(r'^(?:https?://[^/]+)?/\d{4}/\d{2}/[^/]+/?$')
+_JSONLD_TYPES = ('Article', 'BlogPosting', 'WebPage')
+
+
+def url_key(url_path):
+    """Canonical '/path/' key for a page ('/' for the homepage)."""
+    stripped = url_path.strip('/')
+    return f'/{stripped}/' if stripped else '/'
+
+
+def url_for_file(output_dir, html_file):
+    """Manifest key for an index.html under output_dir."""
+    relative = Path(html_file).relative_to(output_dir)
+    if relative.name == 'index.html':
+        return url_key(str(relative.parent)) if relative.parent != Path('.') else '/'
+    return url_key(str(relative.with_suffix('')))
+
+
+def file_for_url(output_dir, url):
+    """The HTML file under output_dir a manifest key was captured from.
+
+    Inverse of url_for_file: '/a/' is a/index.html, or a.html for pages
+    written as flat files (404.html). None if neither exists.
+    """
+    stripped = url.strip('/')
+    if not stripped:
+        candidates = [Path(output_dir) / 'index.html']
+    else:
+        candidates = [Path(output_dir) / stripped / 'index.html',
+                      Path(output_dir) / f'{stripped}.html']
+    return next((path for path in candidates if path.exists()), None)
+
+
+def collapse_whitespace(text):
+    """Join text lines/phrases with single spaces."""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return ' '.join(chunk for chunk in chunks if chunk)
+
+
+def extract_page_images(soup, target_domain):
+    """Image sitemap entries (loc/title/caption) for the page's main content.
+
+    Only same-domain images are kept; <picture> <source> variants are
+    ignored in favour of the <img> fallback to avoid duplicates.
+    """
+    content = soup.find('article') or soup.find('main') or soup.find('body')
+    if not content:
+        return []
+
+    images = []
+    seen_locs = set()
+
+    for img in content.find_all('img'):
+        src = img.get('src', '').strip()
+        if not src:
+            continue
+
+        # Convert to absolute URL
+        if src.startswith('/'):
+            abs_src = f'{target_domain}{src}'
+        elif src.startswith('http'):
+            # Skip external images
+            if target_domain not in src:
+                continue
+            abs_src = src
+        else:
+            continue  # relative path without leading slash — skip
+
+        # Skip duplicates (e.g. responsive srcset variations already seen)
+        loc_key = abs_src.split('?')[0]
+        if loc_key in seen_locs:
+            continue
+        seen_locs.add(loc_key)
+
+        alt = img.get('alt', '').strip()
+        title = img.get('title', '').strip()
+
+        # Derive a title from alt text, explicit title, or filename
+        if not title and alt:
+            title = alt
+        if not title:
+            title = Path(src).stem.replace('-', ' ').replace('_', ' ').title()
+
+        images.append({
+            'loc': abs_src,
+            'title': title[:200],  # Google recommends ≤200 chars
+            'caption': alt[:200] if alt else '',
+        })
+
+    return images
+
+
+def _link_texts(soup, pattern):
+    texts = []
+    for link in soup.find_all('a', href=re.compile(pattern)):
+        text = link.get_text().strip()
+        if text and text not in texts:
+            texts.append(text)
+    return texts
+
+
+def _jsonld_fields(soup):
+    """(lastmod, {date_published, date_modified, word_count, reading_time})"""
+    lastmod = None
+    fields = {}
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string)
+        except (TypeError, ValueError):
+            continue
+        items = data.get('@graph', [data]) if isinstance(data, dict) else [data]
+        for item in items:
+            if not isinstance(item, dict) or item.get('@type') not in _JSONLD_TYPES:
+                continue
+            if lastmod is None and item.get('dateModified'):
+                lastmod = item['dateModified']
+            if not fields:
+                for src, dst in (('datePublished', 'date_published'),
+                                 ('dateModified', 'date_modified'),
+                                 ('wordCount', 'word_count'),
+                                 ('timeRequired', 'reading_time')):
+                    if src in item:
+                        fields[dst] = item[src]
+    return lastmod, fields
+
+
+def capture_page_record(soup, url_path, target_domain):
+    """Build the manifest record for a rendered page.
+
+    Destructive: strips script/style/nav/footer from soup to extract the
+    visible text, so call it only after the page has been serialised.
+    """
+    title_tag = soup.find('title')
+    title = _SITE_SUFFIX_RE.sub('', title_tag.get_text().strip()) if title_tag else ''
+    heading_tag = soup.find('h1', class_=re.compile(r'entry-title', re.I))
+
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    og_image = soup.find('meta', property='og:image')
+    canonical = soup.find('link', rel='canonical')
+    robots = soup.find('meta', attrs={'name': 'robots'})
+
+    date_elem = soup.find('time', class_=re.compile(r'(entry-date|published)', re.I))
+    published_elem = soup.find('time', class_=re.compile(r'published', re.I))
+    author_elem = soup.find('a', class_=re.compile(r'author', re.I))
+    feed_author_elem = soup.find('a', class_=re.compile(r'author|fn', re.I))
+
+    lastmod, jsonld = _jsonld_fields(soup)
+
+    record = {
+        'v': RECORD_VERSION,
+        'url': url_key(url_path),
+        'title': title,
+        'heading': heading_tag.get_text().strip() if heading_tag else None,
+        'description': meta_desc.get('content', '').strip() if meta_desc else '',
+        'image': og_image.get('content', '') if og_image else None,
+        'canonical': canonical.get('href', '') if canonical else None,
+        'noindex': bool(robots and 'noindex' in robots.get('content', '').lower()),
+        'refresh': soup.find('meta', attrs={'http-equiv': 'refresh'}) is not None,
+        'date': (date_elem.get('datetime', '') or date_elem.get_text().strip()) if date_elem else '',
+        'published': published_elem.get('datetime', '') if published_elem else '',
+        'lastmod': lastmod,
+        'jsonld': jsonld,
+        'author': author_elem.get_text().strip() if author_elem else None,
+        'feed_author': feed_author_elem.get_text().strip() if feed_author_elem else None,
+        'categories': _link_texts(soup, r'/category/'),
+        'tags': _link_texts(soup, r'/tag/'),
+        'images': extract_page_images(soup, target_domain),
+        'post_links': sorted({a['href'] for a in soup.find_all('a', href=True)
+                              if _POST_LINK_RE.match(a['href'])}),
+    }
+
+    # Text-based fields last: stripping non-content elements mutates soup
+    for element in soup(['script', 'style', 'nav', 'footer']):
+        element.decompose()
+
+    content_areas = soup.find_all(['div'], class_=re.compile(r'(content|entry|post|article)', re.I))
+    excerpt_words = collapse_whitespace(content_areas[0].get_text()).split() if content_areas else []
+    record['excerpt'] = ' '.join(excerpt_words[:150]) + ('...' if len(excerpt_words) > 150 else '')
+
+    feed_div = soup.find('div', class_=re.compile(r'entry-content|entry-summary', re.I))
+    feed_words = feed_div.get_text().split()[:50] if feed_div else []
+    record['feed_excerpt'] = ' '.join(feed_words) + ('...' if len(feed_words) >= 50 else '')
+
+    record['text'] = collapse_whitespace(soup.get_text())
+    return record
+
+
+class BuildManifest:
+    """Per-page records keyed by URL, persisted in the build state store."""
+
+    def __init__(self, output_dir, state=None):
+        self.output_dir = Path(output_dir)
+        self.legacy_path = self.output_dir / LEGACY_MANIFEST_FILENAME
+        self._state = state    # opened lazily — parse workers never need it
+        self._records = None   # loaded lazily, likewise
+        self._pending = {}     # records captured this build
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self._state is None:
+            self._state = BuildState()
+        return self._state
+
+    def _load(self):
+        if self._records is not None:
+            return
+        if not self.state.count(STATE_KIND):
+            self._import_legacy_manifest()
+        self._records = {url: record for url, record in self.state.items(STATE_KIND)
+                         if record.get('v') == RECORD_VERSION}
+
+    def _import_legacy_manifest(self):
+        """Import a build-manifest.jsonl from before the SQLite store."""
+        if not self.legacy_path.exists():
+            return
+        records = {}
+        try:
+            with open(self.legacy_path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record.get('v') == RECORD_VERSION:
+                            records[record['url']] = record
+        except (IOError, ValueError) as e:
+            print(f"   ⚠️  Could not import {self.legacy_path.name}, ignoring it: {e}")
+            return
+        self.state.put_many(STATE_KIND, records.items())
+        print(f"   📥 Imported {len(records)} page records from {self.legacy_path.name}")
+
+    def update(self, record):
+        with self._lock:
+            self._pending[record['url']] = record
+
+    def pop_pending(self, url_path):
+        """Remove and return a record captured this build (parse workers)."""
+        with self._lock:
+            return self._pending.pop(url_key(url_path), None)
+
+    def get(self, url_path):
+        key = url_key(url_path)
+        with self._lock:
+            if key in self._pending:
+                return self._pending[key]
+            self._load()
+            return self._records.get(key)
+
+    def records(self):
+        """Every record — this build's over the saved ones — keyed by URL."""
+        with self._lock:
+            self._load()
+            return {**self._records, **self._pending}
+
+    def save(self):
+        """Write this build's records to the store; returns the record count.
+
+        Records whose page no longer exists on disk are dropped, and a
+        legacy build-manifest.jsonl is removed from the output directory.
+        """
+        with self._lock:
+            self._load()
+            self._records.update(self._pending)
+            gone = [url for url in self._records if file_for_url(self.output_dir, url) is None]
+            with self.state.transaction():
+                self.state.put_many(STATE_KIND, self._pending.items())
+                # Stale keys too: records with an older RECORD_VERSION
+                self.state.delete(STATE_KIND, gone + [url for url in self.state.keys(STATE_KIND)
+                                                      if url not in self._records])
+            for url in gone:
+                del self._records[url]
+            self._pending = {}
+            self.legacy_path.unlink(missing_ok=True)
+            return len(self._records)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Two-stage Page Pipeline
+
+Splits page generation into a network stage and a CPU stage so a full build
+uses every core instead of running ~30 BeautifulSoup transforms per page
+under one GIL:
+
+  fetch stage   a few I/O threads download raw pages and push them onto a
+                bounded queue (blocking when it is full, so a fast origin
+                can't outrun the parsers)
+  parse stage   a ProcessPoolExecutor runs process_html() in worker
+                processes, each holding its own WordPressStaticGenerator
+
+The parent process writes every page, merges the assets / extracted CSS /
+manifest record each worker produced back into the generator, and reports
+results in the same order the URLs were given, regardless of completion order.
+"""
+
+import concurrent.futures
+import os
+import queue
+import threading
+
+
+# Per-process generator used by parse workers (set by _init_worker).
+_worker_generator = None
+
+
+def _init_worker(settings):
+    """Build the generator a parse worker reuses for every page it handles."""
+    global _worker_generator
+    from wp_to_static_generator import WordPressStaticGenerator
+    from wp_api_cache import WordPressAPICache
+    from related_posts import RelatedPostsIndex
+    api_data = settings.pop('api_data')
+    related = settings.pop('related_posts')
+    _worker_generator = WordPressStaticGenerator(use_incremental=False, **settings)
+    # Reuse the parent's prefetched API data instead of refetching per worker
+    _worker_generator.api = WordPressAPICache(
+        _worker_generator.session, _worker_generator.wp_url, data=api_data
+    )
+    _worker_generator.related_index = RelatedPostsIndex(related)
+
+
+def _process_page(url_path, html):
+    """Run process_html in a worker; return the page plus its side effects."""
+    gen = _worker_generator
+    gen.downloaded_assets = set()
+    processed = gen.process_html(html, url_path)
+    record = gen.manifest.pop_pending(url_path)
+    return processed, gen.downloaded_assets, dict(gen.extracted_css_files), record
+
+
+def default_parse_workers():
+    """One parse worker per core (at least one)."""
+    return max(1, os.cpu_count() or 1)
+
+
+class PagePipeline:
+    """Fetch pages on I/O threads and process them on a pool of processes."""
+
+    def __init__(self, generator, fetch_workers=3, parse_workers=None, queue_size=None):
+        self.generator = generator
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers or default_parse_workers()
+        # Fetched-but-unparsed pages allowed in memory at once.
+        self.queue_size = queue_size or self.parse_workers * 2
+        self._pool = None
+        self._merge_lock = threading.Lock()
+
+    def __enter__(self):
+        gen = self.generator
+        settings = {
+            'wp_url': gen.wp_url,
+            'auth_token': gen.auth_token,
+            'output_dir': str(gen.output_dir),
+            'target_domain': gen.target_domain,
+            'api_data': gen.api.snapshot(),
+            'related_posts': gen.related_index.related,
+        }
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.parse_workers,
+            initializer=_init_worker,
+            initargs=(settings,),
+        )
+        return self
+
+    def __exit__(self, *exc):
+        self._pool.shutdown(wait=True)
+        self._pool = None
+
+    def run(self, url_paths):
+        """Fetch and process url_paths; return status strings in input order."""
+        url_paths = list(url_paths)
+        results = [None] * len(url_paths)
+        pages = queue.Queue(maxsize=self.queue_size)
+        gen = self.generator
+
+        print(f"   🧵 Pipeline: {self.fetch_workers} fetch threads → "
+              f"{self.parse_workers} parse processes (queue {self.queue_size})")
+
+        def fetch(index, url_path):
+            try:
+                if url_path in gen.processed_urls:
+                    page = f"⏭️  {url_path} (already processed)"
+                else:
+                    page = gen._fetch_page(url_path)
+            except Exception as e:
+                page = f"❌ {url_path} (Error: {str(e)[:50]})"
+            pages.put((index, url_path, page))  # blocks while parsers catch up
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.fetch_workers) as fetchers:
+            for index, url_path in enumerate(url_paths):
+                fetchers.submit(fetch, index, url_path)
+
+            pending = {}
+            received = 0
+            while received < len(url_paths) or pending:
+                if received < len(url_paths) and len(pending) < self.queue_size:
+                    try:
+                        item = pages.get(timeout=0.05 if pending else None)
+                    except queue.Empty:
+                        item = None
+                    if item is not None:
+                        received += 1
+                        index, url_path, page = item
+                        if isinstance(page, str):
+                            results[index] = page
+                        elif 'text/html' not in page['content_type'].lower():
+                            results[index] = gen._store_fetched_page(url_path, **page)
+                        else:
+                            future = self._pool.submit(_process_page, url_path, page['text'])
+                            pending[future] = (index, url_path, page['last_modified'])
+                        continue
+
+                if pending:
+                    # Block on the parsers when the queue budget is spent or
+                    # nothing is left to fetch; otherwise just harvest.
+                    saturated = received == len(url_paths) or len(pending) >= self.queue_size
+                    done, _ = concurrent.futures.wait(
+                        pending, timeout=None if saturated else 0,
+                        return_when=concurrent.futures.FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        index, url_path, last_modified = pending.pop(future)
+                        results[index] = self._finish(future, url_path, last_modified)
+
+        return results
+
+    def process(self, url_path, content_type, text, content, last_modified=''):
+        """Process one already-fetched page on the pool (blocking).
+
+        Drop-in replacement for generator._store_fetched_page, used by the
+        async crawl engine so its pages are parsed on all cores too.
+        """
+        if 'text/html' not in content_type.lower():
+            return self.generator._store_fetched_page(
+                url_path, content_type, text, content, last_modified
+            )
+        future = self._pool.submit(_process_page, url_path, text)
+        concurrent.futures.wait([future])
+        return self._finish(future, url_path, last_modified)
+
+    def _finish(self, future, url_path, last_modified):
+        """Merge a worker's side effects into the generator and write the page."""
+        gen = self.generator
+        try:
+            processed, assets, css_files, record = future.result()
+        except Exception as e:
+            return f"❌ {url_path} (Error: {str(e)[:50]})"
+
+        with self._merge_lock:
+            gen.downloaded_assets.update(assets)
+            gen.extracted_css_files.update(css_files)
+            if record:
+                gen.manifest.update(record)
+            return gen._write_processed_page(url_path, processed, last_modified)
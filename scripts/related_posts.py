@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Related Posts Index
+
+Computes related posts for the whole corpus once per build, so rendering a
+post's "Related Posts" section is a dictionary lookup instead of live REST
+queries.
+
+Each post gets three sparse vectors:
+  - tags        (IDF-weighted: a rare shared tag says more than a common one)
+  - categories  (IDF-weighted)
+  - text        (TF-IDF over the article text, top terms only)
+
+Similarity is a weighted sum of the per-vector cosines. Candidates are
+gathered through inverted indexes, so only posts sharing at least one tag,
+category or text term are ever scored.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+
+# Relative weight of each signal in the final score
+TAG_WEIGHT = 0.4
+CATEGORY_WEIGHT = 0.2
+TEXT_WEIGHT = 0.4
+
+# Highest-weighted text terms kept per post (keeps the index sparse)
+MAX_TEXT_TERMS = 60
+
+TOKEN_RE = re.compile(r'[a-z][a-z0-9]{2,}')
+
+STOPWORDS = frozenset('''
+    the and for are but not you all any can had her was one our out day get has
+    him his how man new now old see two way who boy did its let put say she too
+    use that with have this will your from they know want been good much some
+    time very when come here just like long make many more only over such take
+    than them well were what which while would there their these those about
+    into also then could other after first should where because being through
+    using used each most need does done same both onto
+'''.split())
+
+
+def tokenize(text):
+    """Lowercase word tokens, stopwords removed."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _url_key(url_path):
+    """Canonical '/slug/' form used to key the index."""
+    stripped = url_path.strip('/')
+    return f'/{stripped}/' if stripped else '/'
+
+
+def _normalise(vector):
+    norm = math.sqrt(sum(w * w for w in vector.values()))
+    if not norm:
+        return {}
+    return {k: w / norm for k, w in vector.items()}
+
+
+def _idf_vectors(docs):
+    """{doc: {term: count}} -> {doc: {term: tf-idf weight}}."""
+    df = Counter()
+    for terms in docs.values():
+        df.update(terms.keys())
+    n = len(docs)
+    vectors = {}
+    for doc, terms in docs.items():
+        vectors[doc] = {
+            t: (1 + math.log(c)) * math.log((1 + n) / (1 + df[t]))
+            for t, c in terms.items()
+        }
+    return vectors
+
+
+class RelatedPostsIndex:
+    """Precomputed related posts, keyed by site-relative URL path."""
+
+    def __init__(self, related=None):
+        # {url_path: [{'link': ..., 'title': {'rendered': ...}}, ...]}
+        self.related = related or {}
+
+    def get(self, url_path):
+        """Related posts for url_path (same shape as the REST posts API)."""
+        return self.related.get(_url_key(url_path), [])
+
+    @classmethod
+    def build(cls, posts, bodies, extract_text, wp_url, limit=3):
+        """Build the index from API post summaries and rendered bodies.
+
+        posts: summaries with id/link/title/tags/categories (newest first)
+        bodies: {post id: content HTML}
+        extract_text: callable(html) -> article text or None
+        """
+        by_id = {p['id']: p for p in posts if p.get('link')}
+        order = {pid: i for i, pid in enumerate(by_id)}  # newer = lower
+
+        tag_docs = {pid: Counter(p.get('tags') or []) for pid, p in by_id.items()}
+        cat_docs = {pid: Counter(p.get('categories') or []) for pid, p in by_id.items()}
+        text_docs = {}
+        for pid, p in by_id.items():
+            title = (p.get('title') or {}).get('rendered', '')
+            text = extract_text(bodies.get(pid, '')) or ''
+            text_docs[pid] = Counter(tokenize(f'{title} {title} {text}'))
+
+        vectors = []
+        for weight, docs in ((TAG_WEIGHT, tag_docs),
+                             (CATEGORY_WEIGHT, cat_docs),
+                             (TEXT_WEIGHT, text_docs)):
+            idf = _idf_vectors(docs)
+            if docs is text_docs:
+                idf = {pid: dict(sorted(v.items(), key=lambda kv: -kv[1])[:MAX_TEXT_TERMS])
+                       for pid, v in idf.items()}
+            unit = {pid: _normalise(v) for pid, v in idf.items()}
+            postings = defaultdict(list)
+            for pid, vec in unit.items():
+                for term, w in vec.items():
+                    postings[term].append((pid, w))
+            vectors.append((weight, unit, postings))
+
+        related = {}
+        for pid, post in by_id.items():
+            scores = defaultdict(float)
+            for weight, unit, postings in vectors:
+                for term, w in unit[pid].items():
+                    for other, ow in postings[term]:
+                        if other != pid:
+                            scores[other] += weight * w * ow
+            best = sorted(scores.items(), key=lambda kv: (-kv[1], order[kv[0]]))[:limit]
+            related[_url_key(post['link'].replace(wp_url, ''))] = [
+                {'id': other, 'link': by_id[other]['link'], 'title': by_id[other].get('title', {}),
+                 'featured_media': by_id[other].get('featured_media', 0)}
+                for other, score in best if score > 0
+            ]
+        return cls(related)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Sharded inverted search index
+
+Built by WordPressStaticGenerator.generate_search_index() alongside the flat
+search-index.json, and served by workers/search-api.js from Workers KV so a
+query only touches the postings for its own terms:
+
+    public/search/meta.json              build id, shard prefix length, shard list
+    public/search/docs.json              compact doc table (id -> title/url/...)
+    public/search/shards/<prefix>.json   {token: [[doc_id, score], ...]}
+
+Tokens are sharded by their first SHARD_PREFIX_LEN characters, so a prefix
+(type-ahead) lookup reads one shard rather than the whole vocabulary.
+Postings are sorted by score, highest first.
+
+Usage (CI):
+    python3 scripts/search_index.py kv-bulk public/search search-kv-bulk.json
+    wrangler kv bulk put search-kv-bulk.json ...
+    wrangler kv key put search:meta --path public/search/meta.json ...
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+SHARD_PREFIX_LEN = 2
+
+# Score contributed per occurrence of a token in each field
+FIELD_WEIGHTS = {
+    'title': 10,
+    'description': 5,
+    'categories': 3,
+    'tags': 3,
+    'content': 1,
+}
+
+# Occurrences beyond this in one field stop adding to the score
+MAX_TF = 5
+
+# Per-build KV keys expire on their own once a newer build is live
+KV_EXPIRATION_TTL = 30 * 24 * 3600
+
+TOKEN_RE = re.compile(r'[a-z0-9]{2,}')
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of two or more characters."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndexBuilder:
+    """Accumulates documents and writes the sharded inverted index."""
+
+    def __init__(self, prefix_len=SHARD_PREFIX_LEN):
+        self.prefix_len = prefix_len
+        self.docs = []
+        self.postings = defaultdict(dict)  # token -> {doc_id: score}
+
+    def add(self, entry, content):
+        """Index one search entry; content is the page's full visible text."""
+        doc_id = len(self.docs)
+        self.docs.append({
+            'title': entry['title'],
+            'url': entry['url'],
+            'description': entry['description'],
+            'categories': entry['categories'],
+            'tags': entry['tags'],
+            'date': entry['date'],
+        })
+        fields = {
+            'title': entry['title'],
+            'description': entry['description'],
+            'categories': ' '.join(entry['categories']),
+            'tags': ' '.join(entry['tags']),
+            'content': content,
+        }
+        scores = Counter()
+        for field, text in fields.items():
+            for token, tf in Counter(tokenize(text)).items():
+                scores[token] += FIELD_WEIGHTS[field] * min(tf, MAX_TF)
+        for token, score in scores.items():
+            self.postings[token][doc_id] = score
+
+    def shards(self):
+        """{prefix: {token: [[doc_id, score], ...]}}"""
+        shards = defaultdict(dict)
+        for token in sorted(self.postings):
+            docs = self.postings[token]
+            shards[token[:self.prefix_len]][token] = sorted(
+                ([d, s] for d, s in docs.items()), key=lambda p: (-p[1], p[0])
+            )
+        return shards
+
+    def write(self, search_dir):
+        """Write meta.json, docs.json and shards/ under search_dir; return meta."""
+        search_dir = Path(search_dir)
+        shard_dir = search_dir / 'shards'
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        for old in shard_dir.glob('*.json'):
+            old.unlink()
+
+        shards = self.shards()
+        digest = hashlib.blake2b(digest_size=6)
+        for prefix, shard in sorted(shards.items()):
+            data = json.dumps(shard, ensure_ascii=False, separators=(',', ':'))
+            (shard_dir / f'{prefix}.json').write_text(data, encoding='utf-8')
+            digest.update(data.encode('utf-8'))
+
+        docs = json.dumps(self.docs, ensure_ascii=False, separators=(',', ':'))
+        (search_dir / 'docs.json').write_text(docs, encoding='utf-8')
+        digest.update(docs.encode('utf-8'))
+
+        meta = {
+            'build': digest.hexdigest(),
+            'prefix_len': self.prefix_len,
+            'doc_count': len(self.docs),
+            'token_count': len(self.postings),
+            'shards': sorted(shards),
+        }
+        (search_dir / 'meta.json').write_text(json.dumps(meta, separators=(',', ':')),
+                                              encoding='utf-8')
+        return meta
+
+
+def kv_bulk_entries(search_dir):
+    """Workers KV bulk-put entries for a written index.
+
+    Shards and docs are stored under build-scoped keys
+    (search:<build>:shard:<prefix>, search:<build>:doc:<id>). search:meta is
+    not included: upload meta.json to it after the bulk put succeeds, so the
+    worker only switches to a build once all of its keys exist.
+    """
+    search_dir = Path(search_dir)
+    meta = json.loads((search_dir / 'meta.json').read_text(encoding='utf-8'))
+    build = meta['build']
+    entries = []
+    for prefix in meta['shards']:
+        entries.append({
+            'key': f'search:{build}:shard:{prefix}',
+            'value': (search_dir / 'shards' / f'{prefix}.json').read_text(encoding='utf-8'),
+            'expiration_ttl': KV_EXPIRATION_TTL,
+        })
+    docs = json.loads((search_dir / 'docs.json').read_text(encoding='utf-8'))
+    for doc_id, doc in enumerate(docs):
+        entries.append({
+            'key': f'search:{build}:doc:{doc_id}',
+            'value': json.dumps(doc, ensure_ascii=False, separators=(',', ':')),
+            'expiration_ttl': KV_EXPIRATION_TTL,
+        })
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded search index tools')
+    sub = parser.add_subparsers(dest='command', required=True)
+    bulk = sub.add_parser('kv-bulk', help='Write a wrangler `kv bulk put` file')
+    bulk.add_argument('search_dir', help='Directory containing meta.json (e.g. public/search)')
+    bulk.add_argument('output', help='Bulk JSON file to write')
+    args = parser.parse_args()
+
+    if args.command == 'kv-bulk':
+        if not (Path(args.search_dir) / 'meta.json').exists():
+            print(f"❌ No search index found in {args.search_dir}")
+            sys.exit(1)
+        entries = kv_bulk_entries(args.search_dir)
+        Path(args.output).write_text(json.dumps(entries, ensure_ascii=False), encoding='utf-8')
+        print(f"✅ Wrote {len(entries)} KV entries to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
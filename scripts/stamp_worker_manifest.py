@@ -11,6 +11,14 @@ This script replaces `null` with a JS array literal of every legitimate
 content path, then writes the result to public/_worker.js.  That replaces
 the `cp _worker.template.js public/_worker.js` step in the deploy workflow.
 
+If <public_dir>/dictionaries/dictionary.json exists (see
+scripts/compression_dictionary.py), the shared compression dictionary's
+metadata is stamped into
+
+    const COMPRESSION_DICTIONARY = /*__DICTIONARY_START__*/null/*__DICTIONARY_END__*/;
+
+the same way; without it the worker leaves dictionary compression off.
+
 Usage:
     python3 scripts/stamp_worker_manifest.py
     python3 scripts/stamp_worker_manifest.py <public_dir>
@@ -30,11 +38,29 @@ PUBLIC_DIR = Path(
 TEMPLATE = REPO_ROOT / "_worker.template.js"
 OUTPUT = PUBLIC_DIR / "_worker.js"
 MANIFEST = PUBLIC_DIR / "path-manifest.json"
+DICTIONARY = PUBLIC_DIR / "dictionaries" / "dictionary.json"
 
 PLACEHOLDER_RE = re.compile(
     r"/\*__PATH_MANIFEST_START__\*/.*?/\*__PATH_MANIFEST_END__\*/",
     re.DOTALL,
 )
+DICTIONARY_RE = re.compile(
+    r"/\*__DICTIONARY_START__\*/.*?/\*__DICTIONARY_END__\*/",
+    re.DOTALL,
+)
+
+# dictionary.json fields the worker needs
+DICTIONARY_FIELDS = ("path", "hash", "id", "match", "match_dest", "encodings")
+
+
+def dictionary_literal() -> str | None:
+    """JS literal for the compression dictionary, or None if there is none."""
+    if not DICTIONARY.exists():
+        return None
+    metadata = json.loads(DICTIONARY.read_text(encoding="utf-8"))
+    if not metadata.get("encodings"):
+        return None
+    return json.dumps({k: metadata[k] for k in DICTIONARY_FIELDS}, separators=(",", ":"))
 
 
 def main() -> int:
@@ -70,6 +96,22 @@ def main() -> int:
         count=1,
     )
 
+    dictionary = dictionary_literal()
+    if dictionary is not None:
+        if not DICTIONARY_RE.search(stamped):
+            print(
+                "❌ placeholder /*__DICTIONARY_START__*/…/*__DICTIONARY_END__*/ "
+                "not found in _worker.template.js",
+                file=sys.stderr,
+            )
+            return 1
+        stamped = DICTIONARY_RE.sub(
+            f"/*__DICTIONARY_START__*/{dictionary}/*__DICTIONARY_END__*/",
+            stamped,
+            count=1,
+        )
+        print(f"📖 Compression dictionary stamped: {dictionary}")
+
     OUTPUT.write_text(stamped, encoding="utf-8")
     print(
         f"✅ _worker.js stamped: {len(paths)} paths baked in "
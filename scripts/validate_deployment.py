@@ -3,29 +3,37 @@
 Comprehensive post-optimization validation for static site deployment.
 
 This script validates that all optimization steps completed successfully:
-- Brotli compression integrity (.br files match originals)
+- Brotli compression integrity (.br files match originals, compared by
+  hashing both as streams so memory stays bounded for large files).
+  Pairs that the compression manifest (<site_directory>.compression-manifest.json,
+  beside the site) vouches for (original and .br both
+  still the files whose hashes brotli_compress.py recorded) are not
+  decompressed again unless --deep is given.
 - Modern image formats (AVIF/WebP exist and are valid)
 - Picture elements (correct structure and fallback order)
 - Minification (no broken HTML/CSS/JS)
 - Critical CSS inlining
 
 Usage:
-    python3 validate_deployment.py <site_directory>
+    python3 validate_deployment.py <site_directory> [--deep]
 """
 
 import sys
 from pathlib import Path
-import brotli
 from PIL import Image
 from bs4 import BeautifulSoup
 import json
 
+from brotli_compress import (brotli_stream_hash, file_hash, load_compression_manifest,
+                             matches_record)
+
 
 class DeploymentValidator:
     """Validates optimized static site before deployment."""
 
-    def __init__(self, site_dir):
+    def __init__(self, site_dir, deep=False):
         self.site_dir = Path(site_dir)
+        self.deep = deep  # decompress every .br, ignoring the compression manifest
         self.errors = []
         self.warnings = []
         self.stats = {}
@@ -51,11 +59,17 @@ class DeploymentValidator:
         Checks:
         1. All compressible files (>1KB) have .br variants
         2. .br files are valid and can decompress
-        3. Decompressed content matches original
+        3. Decompressed content matches original (hash of the decompressed
+           stream against the hash of the original, both read in chunks)
         4. No orphaned .br files
+
+        2 and 3 are skipped for pairs the compression manifest vouches for,
+        unless self.deep is set.
         """
         print("📦 Validating Brotli compression...")
 
+        manifest = {} if self.deep else load_compression_manifest(self.site_dir)
+
         compressible_exts = ['.html', '.css', '.js', '.json', '.xml', '.svg']
         compressible_files = self.find_files(compressible_exts)
 
@@ -65,6 +79,7 @@ class DeploymentValidator:
         brotli_found = 0
         brotli_valid = 0
         brotli_mismatch = 0
+        brotli_from_manifest = 0
 
         for file_path in compressible_files:
             br_path = Path(str(file_path) + '.br')
@@ -76,17 +91,14 @@ class DeploymentValidator:
 
             brotli_found += 1
 
-            # Verify .br is valid by decompressing
-            try:
-                with open(br_path, 'rb') as f:
-                    compressed = f.read()
-                decompressed = brotli.decompress(compressed)
-
-                # Verify content matches original
-                with open(file_path, 'rb') as f:
-                    original = f.read()
+            if self._manifest_vouches(file_path, br_path, manifest):
+                brotli_valid += 1
+                brotli_from_manifest += 1
+                continue
 
-                if decompressed != original:
+            # Verify .br is valid by decompressing, and matches the original
+            try:
+                if brotli_stream_hash(br_path) != file_hash(file_path):
                     self.errors.append(
                         f"Brotli mismatch: {br_path.relative_to(self.site_dir)} "
                         f"doesn't match {file_path.relative_to(self.site_dir)}"
@@ -113,9 +125,24 @@ class DeploymentValidator:
         self.stats['brotli_files_found'] = brotli_found
         self.stats['brotli_files_valid'] = brotli_valid
         self.stats['brotli_files_mismatch'] = brotli_mismatch
+        self.stats['brotli_files_verified_by_manifest'] = brotli_from_manifest
 
         print(f"  ✓ Found {brotli_found} Brotli compressed files")
         print(f"  ✓ {brotli_valid} valid, {brotli_mismatch} mismatches")
+        if manifest:
+            print(f"  ✓ {brotli_from_manifest} confirmed from compression manifest, "
+                  f"{brotli_found - brotli_from_manifest} decompressed")
+
+    def _manifest_vouches(self, file_path, br_path, manifest):
+        """Whether the manifest records this exact original and .br pair.
+
+        Both files must still be the ones whose hashes brotli_compress.py
+        recorded when it wrote (and so checked) the .br.
+        """
+        entry = manifest.get(file_path.relative_to(self.site_dir).as_posix())
+        if not entry or not entry.get('br'):
+            return False
+        return matches_record(file_path, entry) and matches_record(br_path, entry['br'])
 
     def validate_image_formats(self):
         """
@@ -619,19 +646,25 @@ class DeploymentValidator:
 
 def main():
     """Main entry point."""
-    if len(sys.argv) != 2:
-        print("Usage: validate_deployment.py <site_directory>")
-        print("\nExample:")
-        print("  python3 validate_deployment.py ./static-output")
-        sys.exit(1)
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Post-optimization validation for static site deployment',
+        epilog='Example: python3 validate_deployment.py ./static-output',
+    )
+    parser.add_argument('site_dir', help='Path to the optimized static site')
+    parser.add_argument('--deep', action='store_true',
+                        help='Decompress and compare every .br file, even those the '
+                             'compression manifest already vouches for')
+    args = parser.parse_args()
 
-    site_dir = sys.argv[1]
+    site_dir = args.site_dir
 
     if not Path(site_dir).exists():
         print(f"❌ Error: Directory not found: {site_dir}")
         sys.exit(1)
 
-    validator = DeploymentValidator(site_dir)
+    validator = DeploymentValidator(site_dir, deep=args.deep)
     success = validator.validate_all()
 
     sys.exit(0 if success else 1)
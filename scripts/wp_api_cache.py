@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Per-build WordPress REST API cache
+
+Categories, tags and published post summaries are fetched once per build
+(prefetch() at build start, or lazily on first use) and served from memory
+afterwards. Related posts, URL discovery, the homepage stats block and the
+topic index all read from here instead of re-paging the same endpoints —
+related posts alone used to cost two REST calls per post page.
+
+The cache is a plain snapshot of JSON data, so the page pipeline ships it to
+its parse workers rather than having every worker refetch it.
+
+fetch_all() is the paginated fetch every collection loop in the generator
+uses: page 1's X-WP-TotalPages header gives the page count, and pages 2..N
+are then requested concurrently, so a collection of any size costs two
+round trips instead of one per 100 items. A page that still fails after
+PAGE_ATTEMPTS tries raises IncompleteCollectionError: a missing page must
+not read as an empty one, or discovery and the incremental post lists would
+silently lose items.
+
+Every request the generator makes goes through fetch_all() / get_json()
+with a key of FIELDS, which names the fields its consumer reads: WordPress
+otherwise returns whole objects (rendered content and excerpt, meta, guid,
+_links) that are downloaded and JSON-decoded only to be thrown away.
+"""
+
+import concurrent.futures
+import json
+import threading
+import time
+
+# Fields kept per collection — enough for every consumer in the generator.
+TAXONOMY_FIELDS = 'id,name,slug,count,link,parent'
+POST_SUMMARY_FIELDS = 'id,link,title,date_gmt,modified_gmt,categories,tags,featured_media'
+
+# The fields each consumer reads; every request names one of these
+FIELDS = {
+    'taxonomy': TAXONOMY_FIELDS,
+    'post_summary': POST_SUMMARY_FIELDS,
+    'post_body': 'id,content',
+    # URL discovery (full and incremental builds)
+    'discovery': 'link,title',
+    # Image asset discovery
+    'media_sizes': 'source_url,media_details.sizes,title',
+    # Homepage pagination
+    'reading_settings': 'posts_per_page,show_on_front',
+}
+
+# WordPress's maximum page size
+PER_PAGE = 100
+
+# Concurrent page requests once the page count is known
+PAGE_WORKERS = 4
+
+# Seconds before a request is abandoned (and retried)
+REQUEST_TIMEOUT = 30
+
+# Tries per page for network errors, timeouts, 429/5xx and invalid JSON;
+# waits RETRY_DELAY * attempt seconds between them
+PAGE_ATTEMPTS = 3
+RETRY_DELAY = 2
+
+
+class IncompleteCollectionError(RuntimeError):
+    """A page of a collection could not be fetched."""
+
+
+def request_params(fields, params=None):
+    """Query parameters trimmed to FIELDS[fields]."""
+    return {**(params or {}), '_fields': FIELDS[fields]}
+
+
+def get_json(session, wp_url, endpoint, fields, params=None, timeout=REQUEST_TIMEOUT):
+    """Single object from /wp-json/wp/v2/<endpoint> (e.g. settings), or None."""
+    try:
+        r = session.get(f'{wp_url.rstrip("/")}/wp-json/wp/v2/{endpoint}',
+                        params=request_params(fields, params), timeout=timeout)
+        if r.status_code != 200:
+            return None
+        return r.json()
+    except Exception:
+        return None
+
+
+def _fetch_page(session, wp_url, endpoint, params, page):
+    """(items, response) for one page; items is None past the last page.
+
+    Transient failures are retried; raises IncompleteCollectionError once
+    PAGE_ATTEMPTS are spent or on a client error other than past-the-end.
+    """
+    for attempt in range(1, PAGE_ATTEMPTS + 1):
+        retry = True
+        try:
+            r = session.get(
+                f'{wp_url}/wp-json/wp/v2/{endpoint}',
+                params={**params, 'per_page': PER_PAGE, 'page': page},
+                timeout=REQUEST_TIMEOUT,
+            )
+        except Exception as e:
+            error = str(e)
+        else:
+            if r.status_code == 200:
+                try:
+                    return r.json(), r
+                except (json.JSONDecodeError, ValueError):
+                    error = 'invalid JSON'
+            elif r.status_code == 400 and page > 1:  # past the last page
+                return None, r
+            else:
+                error = f'status {r.status_code}'
+                if r.status_code == 401:
+                    print(f"   ❌ Authentication failed - check WP_AUTH_TOKEN")
+                retry = r.status_code == 429 or r.status_code >= 500
+        if not retry or attempt == PAGE_ATTEMPTS:
+            break
+        print(f"   ⚠️  {endpoint} page {page}: {error}, retrying ({attempt}/{PAGE_ATTEMPTS})")
+        time.sleep(RETRY_DELAY * attempt)
+    raise IncompleteCollectionError(f"{endpoint} page {page} could not be fetched: {error}")
+
+
+def fetch_all(session, wp_url, endpoint, fields, params=None, workers=PAGE_WORKERS):
+    """Every item of /wp-json/wp/v2/<endpoint>, in order, trimmed to FIELDS[fields].
+
+    Returns (items, requests made). Pages 2..N are fetched concurrently once
+    page 1's X-WP-TotalPages is known; a response without the header (e.g.
+    stripped by a proxy) falls back to paging serially until a short page.
+    Raises IncompleteCollectionError if any page cannot be fetched.
+    """
+    wp_url = wp_url.rstrip('/')
+    params = request_params(fields, params)
+    items, response = _fetch_page(session, wp_url, endpoint, params, 1)
+    if not items:
+        return [], 1
+    try:
+        total_pages = int(response.headers['X-WP-TotalPages'])
+    except (KeyError, TypeError, ValueError):
+        total_pages = None
+
+    requests_made = 1
+    if total_pages is None:
+        page_items = items
+        page = 1
+        while len(page_items) >= PER_PAGE:
+            page += 1
+            page_items, _ = _fetch_page(session, wp_url, endpoint, params, page)
+            requests_made += 1
+            if not page_items:
+                break
+            items.extend(page_items)
+        return items, requests_made
+
+    if total_pages > 1:
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(workers, total_pages - 1)) as executor:
+            pages = executor.map(
+                lambda page: _fetch_page(session, wp_url, endpoint, params, page)[0],
+                range(2, total_pages + 1),
+            )
+            for page, page_items in enumerate(pages, start=2):
+                if page_items is None:
+                    # Past the end although page 1 counted this page: the
+                    # collection shrank mid-fetch, so later pages shifted
+                    raise IncompleteCollectionError(
+                        f"{endpoint} page {page} of {total_pages} disappeared during the fetch")
+                items.extend(page_items)
+        requests_made += total_pages - 1
+    return items, requests_made
+
+
+class WordPressAPICache:
+    """Memoized view of the WordPress taxonomy and post-summary endpoints."""
+
+    COLLECTIONS = {
+        'categories': ('categories', 'taxonomy', None),
+        'tags': ('tags', 'taxonomy', None),
+        'posts': ('posts', 'post_summary', {'status': 'publish'}),
+        # Full rendered bodies — only loaded on demand (related-posts index,
+        # homepage word count)
+        'post_bodies': ('posts', 'post_body', {'status': 'publish'}),
+    }
+
+    # Loaded by prefetch() and shipped to parse workers
+    PREFETCHED = ('categories', 'tags', 'posts')
+
+    def __init__(self, session, wp_url, data=None):
+        self.session = session
+        self.wp_url = wp_url.rstrip('/')
+        self._data = dict(data or {})
+        self._lock = threading.Lock()
+        self._category_slugs = None
+        self.requests_made = 0
+
+    def prefetch(self):
+        """Load the shared collections up front (one paginated pass each)."""
+        print("📥 Prefetching WordPress API data...")
+        for name in self.PREFETCHED:
+            items = self._collection(name)
+            print(f"   ✅ {name}: {len(items)}")
+        print(f"   🌐 {self.requests_made} API requests")
+
+    def snapshot(self):
+        """Plain-data copy of the prefetched collections (picklable)."""
+        return {k: v for k, v in self._data.items() if k in self.PREFETCHED}
+
+    # ------------------------------------------------------------------
+    # Accessors
+    # ------------------------------------------------------------------
+
+    def categories(self):
+        return self._collection('categories')
+
+    def tags(self):
+        return self._collection('tags')
+
+    def posts(self):
+        """Published post summaries, newest first."""
+        return self._collection('posts')
+
+    def post_bodies(self):
+        """{post id: rendered content HTML} for every published post."""
+        return {p['id']: (p.get('content') or {}).get('rendered', '')
+                for p in self._collection('post_bodies')}
+
+    def category_by_slug(self, slug):
+        if self._category_slugs is None:
+            self._category_slugs = {c.get('slug'): c for c in self.categories()}
+        return self._category_slugs.get(slug)
+
+    def posts_in_category(self, category_id, limit=None):
+        """Newest posts filed under category_id (matches ?categories=<id>)."""
+        matches = [p for p in self.posts() if category_id in (p.get('categories') or [])]
+        return matches[:limit] if limit else matches
+
+    # ------------------------------------------------------------------
+    # Fetching
+    # ------------------------------------------------------------------
+
+    def _collection(self, name):
+        if name in self._data:
+            return self._data[name]
+        with self._lock:
+            if name not in self._data:
+                self._data[name] = self._fetch_all(*self.COLLECTIONS[name])
+            return self._data[name]
+
+    def _fetch_all(self, endpoint, fields, params):
+        """Every item of /wp-json/wp/v2/<endpoint> (see fetch_all)."""
+        items, requests_made = fetch_all(self.session, self.wp_url, endpoint, fields, params)
+        self.requests_made += requests_made
+        return items
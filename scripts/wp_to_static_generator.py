@@ -18,13 +18,19 @@ from bs4 import BeautifulSoup
 import concurrent.futures
 from datetime import datetime
 from incremental_builder import IncrementalBuilder
+from build_state import BuildState
+from http_validators import ValidatorStore, content_hash
+from wp_api_cache import WordPressAPICache, fetch_all, get_json
+from related_posts import RelatedPostsIndex
+from page_manifest import BuildManifest, capture_page_record, url_for_file, url_key
 
 # Default timeout (seconds) applied to every session HTTP call. Individual
 # calls can still pass an explicit `timeout=` to override this.
 DEFAULT_HTTP_TIMEOUT = 30
 
 class WordPressStaticGenerator:
-    def __init__(self, wp_url, auth_token, output_dir, target_domain, use_incremental=True):
+    def __init__(self, wp_url, auth_token, output_dir, target_domain, use_incremental=True,
+                 async_crawl=False, parse_workers=None):
         self.wp_url = wp_url.rstrip('/')
         self.auth_token = auth_token
         self.output_dir = Path(output_dir)
@@ -45,7 +51,20 @@ class WordPressStaticGenerator:
         self.extracted_css_files = {}  # Map CSS hash to filename
         self.css_output_dir = self.output_dir / 'assets' / 'css'
         self.use_incremental = use_incremental
-        self.incremental_builder = IncrementalBuilder() if use_incremental else None
+        # Build state shared across runs (SQLite): incremental cache, dependency
+        # graph, and ETag/Last-Modified per URL for conditional fetches
+        self.state = BuildState() if use_incremental else None
+        self.incremental_builder = IncrementalBuilder(self.state) if use_incremental else None
+        self.validators = ValidatorStore(state=self.state) if use_incremental else None
+        # Categories, tags and post summaries, fetched once per build
+        self.api = WordPressAPICache(self.session, self.wp_url)
+        self.related_index = RelatedPostsIndex()
+        # Per-page metadata for sitemap/RSS/search/markdown (kept in the build state)
+        self.manifest = BuildManifest(self.output_dir, state=self.state)
+        self.async_crawl = async_crawl
+        # Processes for the HTML parse stage; None = one per core, 1 = parse
+        # in-process on the fetch threads (the original behaviour).
+        self.parse_workers = parse_workers
         
     def get_all_content_urls(self):
         """Get all content URLs from WordPress REST API"""
@@ -68,44 +87,43 @@ class WordPressStaticGenerator:
                 urls.add(relative_url)
                 print(f"   📑 Changed page: {page['title']['rendered']}")
             
-            # Check if we need to rebuild archives
-            if changed_posts or changed_pages or self.incremental_builder.should_rebuild_archives():
+            # Rebuild every archive when the daily refresh is due, or when
+            # something changed and there is no dependency graph to say what
+            # depends on it; otherwise only the pages whose inputs changed
+            builder = self.incremental_builder
+            changed = changed_posts or changed_pages
+            if builder.should_rebuild_archives() or (changed and not builder.has_dependency_graph()):
                 print("   🔄 Rebuilding archive pages...")
+                builder.mark_archives_rebuilt()
                 # Add essential pages and archives
                 urls.update(['/', '/category/', '/tag/'])
                 
                 # Get all categories and tags (archives need full list)
-                categories_response = self.session.get(f'{self.wp_url}/wp-json/wp/v2/categories?per_page=100')
-                if categories_response.status_code == 200:
-                    for category in categories_response.json():
-                        if category['count'] > 0:
-                            relative_url = category['link'].replace(self.wp_url, '')
-                            urls.add(relative_url)
-                            print(f"   📁 Category: {category['name']}")
+                for category in self.api.categories():
+                    if category['count'] > 0:
+                        relative_url = category['link'].replace(self.wp_url, '')
+                        urls.add(relative_url)
+                        print(f"   📁 Category: {category['name']}")
                 
-                tags_response = self.session.get(f'{self.wp_url}/wp-json/wp/v2/tags?per_page=100')
-                if tags_response.status_code == 200:
-                    for tag in tags_response.json():
-                        if tag['count'] > 0:
-                            relative_url = tag['link'].replace(self.wp_url, '')
-                            urls.add(relative_url)
-                            print(f"   🏷️  Tag: {tag['name']}")
-
-                # Discover homepage pagination pages (/page/2/, /page/3/, etc.)
-                pagination_page = 2
-                while True:
-                    pagination_url = f'/page/{pagination_page}/'
-                    check_url = f'{self.wp_url}{pagination_url}'
-                    try:
-                        resp = self.session.head(check_url, timeout=15, allow_redirects=False)
-                        if resp.status_code == 200:
-                            urls.add(pagination_url)
-                            print(f"   📄 Homepage page: {pagination_url}")
-                            pagination_page += 1
-                        else:
-                            break
-                    except Exception:
-                        break
+                for tag in self.api.tags():
+                    if tag['count'] > 0:
+                        relative_url = tag['link'].replace(self.wp_url, '')
+                        urls.add(relative_url)
+                        print(f"   🏷️  Tag: {tag['name']}")
+
+                urls.update(self._discover_pagination_urls())
+            elif builder.has_dependency_graph():
+                changed_urls = {url_key(url) for url in urls}
+                dependents, listings_shifted = builder.pages_to_rebuild(
+                    changed_urls, self._post_graph_nodes(), self._related_graph()
+                )
+                for url in sorted(dependents - changed_urls):
+                    print(f"   🔗 Depends on changed content: {url}")
+                urls.update(dependents)
+                if listings_shifted:
+                    print("   🔄 Post listing changed - rebuilding homepage and pagination")
+                    urls.add('/')
+                    urls.update(self._discover_pagination_urls())
 
             print(f"\n✅ Incremental build: {len(urls)} URLs to process")
             return sorted(list(urls))
@@ -113,103 +131,94 @@ class WordPressStaticGenerator:
         # Full build mode
         print("📋 Discovering content from WordPress REST API...")
         
-        # Get posts with pagination
-        page = 1
+        # Get posts (summaries are paged once by the API cache)
         post_count = 0
-        while True:
-            print(f"   🔍 Fetching posts page {page}...")
-            posts_response = self.session.get(
-                f'{self.wp_url}/wp-json/wp/v2/posts',
-                params={'per_page': 100, 'page': page, 'status': 'publish'}
-            )
-            
-            if posts_response.status_code != 200:
-                print(f"   ⚠️  Posts API returned status {posts_response.status_code} on page {page}")
-                if posts_response.status_code == 400:
-                    # Reached end of pagination
-                    print(f"   ℹ️  Reached end of posts (page {page})")
-                elif posts_response.status_code == 401:
-                    print(f"   ❌ Authentication failed - check WP_AUTH_TOKEN")
-                else:
-                    print(f"   ❌ Error: {posts_response.text[:200]}")
-                break
-                
-            try:
-                posts = posts_response.json()
-            except (json.JSONDecodeError, ValueError):
-                print(f"   ⚠️  Invalid JSON on post page {page}, stopping")
-                break
-            if not posts:
-                print(f"   ℹ️  No more posts on page {page}")
-                break
-                
-            for post in posts:
-                # Convert WordPress URL to relative path
-                relative_url = post['link'].replace(self.wp_url, '')
-                urls.add(relative_url)
-                post_count += 1
-                print(f"   📄 Post: {post['title']['rendered']}")
-            
-            page += 1
+        for post in self.api.posts():
+            # Convert WordPress URL to relative path
+            relative_url = post['link'].replace(self.wp_url, '')
+            urls.add(relative_url)
+            post_count += 1
+            print(f"   📄 Post: {post['title']['rendered']}")
         
         print(f"   ✅ Discovered {post_count} posts from REST API")
         
         # Get pages
-        page = 1
-        while True:
-            pages_response = self.session.get(
-                f'{self.wp_url}/wp-json/wp/v2/pages',
-                params={'per_page': 100, 'page': page, 'status': 'publish'}
-            )
-            if pages_response.status_code != 200:
-                break
-                
-            try:
-                pages = pages_response.json()
-            except (json.JSONDecodeError, ValueError):
-                break
-            if not pages:
-                break
-
-            for page_item in pages:
-                relative_url = page_item['link'].replace(self.wp_url, '')
-                urls.add(relative_url)
-                print(f"   📑 Page: {page_item['title']['rendered']}")
-            
-            page += 1
+        pages, _ = fetch_all(self.session, self.wp_url, 'pages', 'discovery',
+                             {'status': 'publish'})
+        for page_item in pages:
+            relative_url = page_item['link'].replace(self.wp_url, '')
+            urls.add(relative_url)
+            print(f"   📑 Page: {page_item['title']['rendered']}")
         
         # Get categories
-        categories_response = self.session.get(f'{self.wp_url}/wp-json/wp/v2/categories?per_page=100')
-        if categories_response.status_code == 200:
-            try:
-                categories = categories_response.json()
-            except (json.JSONDecodeError, ValueError):
-                categories = []
-            for category in categories:
-                if category['count'] > 0:  # Only categories with posts
-                    relative_url = category['link'].replace(self.wp_url, '')
-                    urls.add(relative_url)
-                    print(f"   📁 Category: {category['name']}")
+        for category in self.api.categories():
+            if category['count'] > 0:  # Only categories with posts
+                relative_url = category['link'].replace(self.wp_url, '')
+                urls.add(relative_url)
+                print(f"   📁 Category: {category['name']}")
         
         # Get tags with posts
-        tags_response = self.session.get(f'{self.wp_url}/wp-json/wp/v2/tags?per_page=100')
-        if tags_response.status_code == 200:
-            try:
-                tags = tags_response.json()
-            except (json.JSONDecodeError, ValueError):
-                tags = []
-            for tag in tags:
-                if tag['count'] > 0:  # Only tags with posts
-                    relative_url = tag['link'].replace(self.wp_url, '')
-                    urls.add(relative_url)
-                    print(f"   🏷️  Tag: {tag['name']}")
+        for tag in self.api.tags():
+            if tag['count'] > 0:  # Only tags with posts
+                relative_url = tag['link'].replace(self.wp_url, '')
+                urls.add(relative_url)
+                print(f"   🏷️  Tag: {tag['name']}")
         
         # Add essential pages
         essential_urls = ['/', '/category/', '/tag/']
         urls.update(essential_urls)
 
-        # Discover homepage pagination pages (/page/2/, /page/3/, etc.)
         print("   🔍 Discovering homepage pagination pages...")
+        pagination_urls = self._discover_pagination_urls()
+        urls.update(pagination_urls)
+        if pagination_urls:
+            print(f"   ✅ Found {len(pagination_urls)} homepage pagination pages")
+
+        print(f"\n✅ Total URLs to process: {len(urls)}")
+        return sorted(list(urls))
+
+    def _posts_per_page(self):
+        """WordPress's "Blog pages show at most" setting, or None if unreadable."""
+        settings = get_json(self.session, self.wp_url, 'settings', 'reading_settings')
+        if not isinstance(settings, dict):
+            return None
+        if settings.get('show_on_front') == 'page':
+            return None  # static front page: no /page/N/ post listing
+        per_page = settings.get('posts_per_page')
+        return per_page if isinstance(per_page, int) and per_page > 0 else None
+
+    def _discover_pagination_urls(self):
+        """Homepage pagination pages (/page/2/, /page/3/, ...) that exist.
+
+        The page count is derived from the post count and posts_per_page,
+        then confirmed with two concurrent HEADs: the last page must exist
+        and the one after it must not. If the settings are unreadable or the
+        check fails, pages are probed one by one.
+        """
+        per_page = self._posts_per_page()
+        if per_page:
+            last_page = max(1, -(-len(self.api.posts()) // per_page))
+            probes = [last_page + 1] + ([last_page] if last_page > 1 else [])
+
+            def exists(page):
+                try:
+                    resp = self.session.head(f'{self.wp_url}/page/{page}/', timeout=15,
+                                             allow_redirects=False)
+                    return resp.status_code == 200
+                except Exception:
+                    return None
+
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(probes)) as executor:
+                found = dict(zip(probes, executor.map(exists, probes)))
+            if found[last_page + 1] is False and found.get(last_page, True):
+                pagination_urls = [f'/page/{page}/' for page in range(2, last_page + 1)]
+                if pagination_urls:
+                    print(f"   📄 Homepage pages: /page/2/ … /page/{last_page}/ "
+                          f"({len(self.api.posts())} posts, {per_page} per page)")
+                return pagination_urls
+            print("   ⚠️  Homepage page count didn't match the post count — probing pages")
+
+        pagination_urls = []
         pagination_page = 2
         while True:
             pagination_url = f'/page/{pagination_page}/'
@@ -217,115 +226,191 @@ class WordPressStaticGenerator:
             try:
                 resp = self.session.head(check_url, timeout=15, allow_redirects=False)
                 if resp.status_code == 200:
-                    urls.add(pagination_url)
+                    pagination_urls.append(pagination_url)
                     print(f"   📄 Homepage page: {pagination_url}")
                     pagination_page += 1
                 else:
                     break
             except Exception:
                 break
-        if pagination_page > 2:
-            print(f"   ✅ Found {pagination_page - 2} homepage pagination pages")
+        return pagination_urls
+
+    def _post_graph_nodes(self):
+        """{post url: facts its listings render} for the dependency graph."""
+        archives = {}
+        for term in self.api.categories() + self.api.tags():
+            if term.get('link'):
+                archives[term['id']] = url_key(term['link'].replace(self.wp_url, ''))
+        # Category and tag ids share one WordPress term table, so one map is safe
+        nodes = {}
+        for post in self.api.posts():
+            if not post.get('link'):
+                continue
+            terms = (post.get('categories') or []) + (post.get('tags') or [])
+            nodes[url_key(post['link'].replace(self.wp_url, ''))] = {
+                'date': post.get('date_gmt'),
+                'title': (post.get('title') or {}).get('rendered', ''),
+                'featured_media': post.get('featured_media', 0),
+                'archives': sorted({archives[t] for t in terms if t in archives}),
+            }
+        return nodes
 
-        print(f"\n✅ Total URLs to process: {len(urls)}")
-        return sorted(list(urls))
+    def _related_graph(self):
+        """{post url: [related post urls]} from this build's related index."""
+        return {
+            url: [url_key(p['link'].replace(self.wp_url, '')) for p in posts]
+            for url, posts in self.related_index.related.items()
+        }
+
+    def record_dependency_graph(self):
+        """Store which pages link to which posts, for the next incremental build."""
+        links_by_page = {}
+        for url, record in self.manifest.records().items():
+            links_by_page[url] = sorted({url_key(urlparse(link).path)
+                                         for link in record.get('post_links', [])})
+        self.incremental_builder.record_dependencies(
+            self._post_graph_nodes(), links_by_page, self._related_graph()
+        )
+        stats = self.incremental_builder.get_stats()
+        print(f"🔗 Recorded dependency graph: {stats['graph_posts']} posts, "
+              f"{stats['graph_edges']} page links")
     
     def get_all_media_assets(self):
         """Get all media assets from WordPress Media API"""
         print("🖼️  Discovering media assets from WordPress Media API...")
         media_assets = set()
         
-        page = 1
-        while True:
-            media_response = self.session.get(
-                f'{self.wp_url}/wp-json/wp/v2/media',
-                params={'per_page': 100, 'page': page}
-            )
-            if media_response.status_code != 200:
-                break
-                
-            try:
-                media_items = media_response.json()
-            except (json.JSONDecodeError, ValueError):
-                break
-            if not media_items:
-                break
-                
-            for media_item in media_items:
-                # Get the main media URL
-                if 'source_url' in media_item:
-                    media_assets.add(media_item['source_url'])
-                
-                # Get different size variants if available
-                if 'media_details' in media_item and 'sizes' in media_item['media_details']:
-                    sizes = media_item['media_details']['sizes']
-                    for size_name, size_data in sizes.items():
-                        if 'source_url' in size_data:
-                            media_assets.add(size_data['source_url'])
-                
-                print(f"   🖼️  Media: {media_item.get('title', {}).get('rendered', 'Untitled')}")
+        media_items, _ = fetch_all(self.session, self.wp_url, 'media', 'media_sizes')
+        for media_item in media_items:
+            # Get the main media URL
+            if 'source_url' in media_item:
+                media_assets.add(media_item['source_url'])
+            
+            # Get different size variants if available
+            sizes = (media_item.get('media_details') or {}).get('sizes') or {}
+            for size_name, size_data in sizes.items():
+                if 'source_url' in size_data:
+                    media_assets.add(size_data['source_url'])
             
-            page += 1
+            print(f"   🖼️  Media: {media_item.get('title', {}).get('rendered', 'Untitled')}")
         
         # Add media assets to downloaded_assets set
         self.downloaded_assets.update(media_assets)
         print(f"✅ Found {len(media_assets)} media assets")
         return media_assets
     
-    def download_and_process_url(self, url_path):
-        """Download a single URL and process it for static hosting"""
-        if url_path in self.processed_urls:
-            return f"⏭️  {url_path} (already processed)"
-            
+    def _output_path_for_url(self, url_path):
+        """Map a site-relative URL path to the file it is written to."""
+        if url_path == '' or url_path == '/':
+            return self.output_dir / 'index.html'
+        elif url_path.endswith('/'):
+            return self.output_dir / url_path.strip('/') / 'index.html'
+        else:
+            # Handle clean URLs
+            return self.output_dir / url_path.lstrip('/') / 'index.html'
+
+    def _store_fetched_page(self, url_path, content_type, text, content, last_modified=''):
+        """Process a successfully fetched URL and write it to the output dir.
+
+        Shared by the threaded fetch loop (download_and_process_url) and the
+        async crawl engine, so both produce identical output and cache entries.
+        """
+        if 'text/html' in content_type.lower():
+            processed_content = self.process_html(text, url_path)
+            return self._write_processed_page(url_path, processed_content, last_modified)
+
+        # Binary content (images, etc.)
+        file_path = self._output_path_for_url(url_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_bytes(content)
+        self.processed_urls.add(url_path)
+        return f"✅ {url_path}"
+
+    def _write_processed_page(self, url_path, processed_content, last_modified=''):
+        """Write already-processed HTML for url_path and record it in the cache."""
+        file_path = self._output_path_for_url(url_path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        file_path.write_text(processed_content, encoding='utf-8')
+
+        # Record content hash so the incremental cache reflects what
+        # was actually generated.  Use Last-Modified from the server
+        # as the modified_date; fall back to an empty string so the
+        # hash alone still guards against content changes.
+        if self.incremental_builder:
+            content_hash = self.incremental_builder._hash_content(processed_content)
+            self.incremental_builder.mark_processed(url_path, content_hash, last_modified)
+
+        self.processed_urls.add(url_path)
+        return f"✅ {url_path}"
+
+    def _page_request_headers(self, full_url):
+        """Conditional headers for a page whose previous response is stored."""
+        if self.validators is None:
+            return {}
+        return self.validators.conditional_headers(full_url, need_body=True)
+
+    def _fetched_page(self, full_url, status_code, headers, text, content):
+        """Page dict for a 200 (recording its validators) or a 304 (the
+        stored response), else None.
+
+        Shared by the requests and async crawl paths.
+        """
+        if status_code == 304 and self.validators is not None:
+            self.validators.not_modified(full_url)
+            return self.validators.stored_page(full_url)
+        if status_code != 200:
+            return None
+        content_type = headers.get('content-type', '')
+        if self.validators is not None and 'text/html' in content_type.lower():
+            self.validators.record(full_url, headers, content_hash(content).hexdigest(),
+                                   len(content), body=content)
+        return {
+            'content_type': content_type,
+            'text': text,
+            'content': content,
+            'last_modified': headers.get('Last-Modified', ''),
+        }
+
+    def _fetch_page(self, url_path):
+        """Fetch url_path from WordPress without processing it.
+
+        Returns a dict with content_type/text/content/last_modified on a 200
+        or a 304 (the stored copy of the previous response), or a status
+        string (same format as download_and_process_url) otherwise.
+        """
         full_url = f'{self.wp_url}{url_path}'
-        
+
         try:
-            response = self.session.get(full_url, timeout=30)
-            
-            if response.status_code == 200:
-                # Determine output file path
-                if url_path == '' or url_path == '/':
-                    file_path = self.output_dir / 'index.html'
-                elif url_path.endswith('/'):
-                    file_path = self.output_dir / url_path.strip('/') / 'index.html'
-                else:
-                    # Handle clean URLs
-                    file_path = self.output_dir / url_path.lstrip('/') / 'index.html'
-                
-                # Create directories
-                file_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                # Process content based on type
-                content_type = response.headers.get('content-type', '').lower()
-                
-                if 'text/html' in content_type:
-                    processed_content = self.process_html(response.text, url_path)
-                    file_path.write_text(processed_content, encoding='utf-8')
-
-                    # Record content hash so the incremental cache reflects what
-                    # was actually generated.  Use Last-Modified from the server
-                    # as the modified_date; fall back to an empty string so the
-                    # hash alone still guards against content changes.
-                    if self.incremental_builder:
-                        content_hash = self.incremental_builder._hash_content(processed_content)
-                        modified_date = response.headers.get('Last-Modified', '')
-                        self.incremental_builder.mark_processed(url_path, content_hash, modified_date)
-                else:
-                    # Binary content (images, etc.)
-                    file_path.write_bytes(response.content)
+            response = self.session.get(full_url, timeout=30,
+                                        headers=self._page_request_headers(full_url))
 
-                self.processed_urls.add(url_path)
-                return f"✅ {url_path}"
-                
+            if response.status_code in (200, 304):
+                page = self._fetched_page(full_url, response.status_code, response.headers,
+                                          response.text, response.content)
+                return page or f"❌ {url_path} (304 without a stored copy)"
             elif response.status_code == 404:
                 return f"⚠️  {url_path} (404 - skipped)"
             else:
                 return f"❌ {url_path} ({response.status_code})"
-                
+
         except requests.exceptions.Timeout:
             return f"⏱️  {url_path} (timeout)"
         except Exception as e:
             return f"❌ {url_path} (Error: {str(e)[:50]})"
+
+    def download_and_process_url(self, url_path):
+        """Download a single URL and process it for static hosting"""
+        if url_path in self.processed_urls:
+            return f"⏭️  {url_path} (already processed)"
+
+        page = self._fetch_page(url_path)
+        if isinstance(page, str):
+            return page
+
+        try:
+            return self._store_fetched_page(url_path, **page)
+        except Exception as e:
+            return f"❌ {url_path} (Error: {str(e)[:50]})"
     
     def process_html(self, html_content, current_url):
         """Process HTML content for static site compatibility"""
@@ -421,7 +506,16 @@ class WordPressStaticGenerator:
         self.add_site_schema(soup)
 
         # Convert to string
-        return str(soup)
+        html = str(soup)
+
+        # Record page metadata for the post-processing consumers while the
+        # tree is still parsed (this strips soup, so it runs last)
+        try:
+            self.manifest.update(capture_page_record(soup, current_url, self.target_domain))
+        except Exception as e:
+            print(f"   ⚠️  Could not record page metadata for {current_url}: {e}")
+
+        return html
     
     def replace_urls_in_soup(self, soup):
         """Replace WordPress URLs with target domain URLs"""
@@ -2492,36 +2586,23 @@ document.addEventListener('DOMContentLoaded', function() {
 
     def _stat_posts_count(self):
         try:
-            r = self.session.get(
-                f'{self.wp_url}/wp-json/wp/v2/posts',
-                params={'per_page': 1, 'status': 'publish', '_fields': 'id'},
-                timeout=15,
-            )
-            if r.status_code == 200:
-                return r.headers.get('X-WP-Total') or '—'
+            posts = self.api.posts()
+            if posts:
+                return str(len(posts))
         except Exception as e:
             print(f"   ⚠️  posts.count: {e}")
         return '—'
 
     def _stat_last_post_age(self):
         try:
-            r = self.session.get(
-                f'{self.wp_url}/wp-json/wp/v2/posts',
-                params={
-                    'per_page': 1, 'orderby': 'date', 'order': 'desc',
-                    'status': 'publish', '_fields': 'date_gmt',
-                },
-                timeout=15,
-            )
-            if r.status_code == 200:
-                data = r.json()
-                if data and data[0].get('date_gmt'):
-                    from datetime import datetime, timezone
-                    d = datetime.fromisoformat(data[0]['date_gmt'])
-                    if d.tzinfo is None:
-                        d = d.replace(tzinfo=timezone.utc)
-                    days = max(0, (datetime.now(timezone.utc) - d).days)
-                    return 'today' if days == 0 else f'{days}d ago'
+            data = self.api.posts()  # newest first
+            if data and data[0].get('date_gmt'):
+                from datetime import datetime, timezone
+                d = datetime.fromisoformat(data[0]['date_gmt'])
+                if d.tzinfo is None:
+                    d = d.replace(tzinfo=timezone.utc)
+                days = max(0, (datetime.now(timezone.utc) - d).days)
+                return 'today' if days == 0 else f'{days}d ago'
         except Exception as e:
             print(f"   ⚠️  last_post: {e}")
         return '—'
@@ -2529,19 +2610,15 @@ document.addEventListener('DOMContentLoaded', function() {
     def _stat_taxonomy_total(self, taxonomy):
         """Count of categories/tags with at least one post."""
         try:
-            r = self.session.get(
-                f'{self.wp_url}/wp-json/wp/v2/{taxonomy}',
-                params={'per_page': 1, 'hide_empty': 'true'},
-                timeout=15,
-            )
-            if r.status_code == 200:
-                return r.headers.get('X-WP-Total') or '—'
+            terms = self.api.categories() if taxonomy == 'categories' else self.api.tags()
+            if terms:
+                return str(sum(1 for t in terms if t.get('count', 0) > 0))
         except Exception as e:
             print(f"   ⚠️  {taxonomy}: {e}")
         return '—'
 
     def _stat_words_total(self):
-        """Sum of words across all published posts (paginated).
+        """Sum of words across all published posts.
 
         Cached to .image_optimization_cache/words_total.json for 24 h so we
         don't refetch hundreds of post bodies on every build.
@@ -2557,33 +2634,15 @@ document.addEventListener('DOMContentLoaded', function() {
             pass  # fall through to live compute
 
         try:
+            # Same bodies the related-posts index loads, so usually no requests
+            bodies = self.api.post_bodies()
+            if not bodies:
+                return '—'
             total = 0
-            page = 1
-            while True:
-                r = self.session.get(
-                    f'{self.wp_url}/wp-json/wp/v2/posts',
-                    params={
-                        'per_page': 100, 'page': page, 'status': 'publish',
-                        '_fields': 'content',
-                    },
-                    timeout=60,
-                )
-                if r.status_code != 200:
-                    if r.status_code == 400:
-                        break  # past last page
-                    print(f"   ⚠️  words.total: page {page} → {r.status_code}")
-                    return '—'
-                data = r.json()
-                if not data:
-                    break
-                for post in data:
-                    html = (post.get('content') or {}).get('rendered', '')
-                    if html:
-                        text = BeautifulSoup(html, 'html.parser').get_text(separator=' ')
-                        total += len(text.split())
-                if len(data) < 100:
-                    break
-                page += 1
+            for html in bodies.values():
+                if html:
+                    text = BeautifulSoup(html, 'html.parser').get_text(separator=' ')
+                    total += len(text.split())
 
             formatted = self._format_word_count(total)
             try:
@@ -2648,32 +2707,13 @@ document.addEventListener('DOMContentLoaded', function() {
         like `vmware-cloud-on-aws` whose real archive lives at
         `/category/vmware/vmware-cloud-on-aws/`, not `/category/vmware-cloud-on-aws/`.
 
-        Pulls live from the WP REST API, sorts by count desc, caches on the
+        Reads the per-build API cache, sorts by count desc, caches on the
         instance. Returns [] on failure so callers can fall back.
         """
         if hasattr(self, '_cached_top_cats'):
             return self._cached_top_cats[:limit]
         try:
-            cats = []
-            page = 1
-            while True:
-                r = self.session.get(
-                    f'{self.wp_url}/wp-json/wp/v2/categories',
-                    params={
-                        'per_page': 100, 'page': page, 'hide_empty': 'true',
-                        '_fields': 'name,slug,count,link',
-                    },
-                    timeout=15,
-                )
-                if r.status_code != 200:
-                    break
-                data = r.json()
-                if not data:
-                    break
-                cats.extend(data)
-                if len(data) < 100:
-                    break
-                page += 1
+            cats = [c for c in self.api.categories() if int(c.get('count') or 0) > 0]
             cats.sort(key=lambda c: -int(c.get('count') or 0))
             result = []
             for c in cats:
@@ -3170,15 +3210,25 @@ document.addEventListener('DOMContentLoaded', function() {
 
                 output_path = self.output_dir / relative_path
 
-                # Skip if already downloaded
+                # Revalidate files we already have; without a validator
+                # store, or without validators to send for a file fetched
+                # in full recently, keep them as they are
+                headers = {}
                 if output_path.exists():
-                    return f"⏭️  {relative_path} (exists)"
+                    if self.validators is None:
+                        return f"⏭️  {relative_path} (exists)"
+                    headers = self.validators.conditional_headers(asset_url)
+                    if not headers and self.validators.known(asset_url):
+                        return f"⏭️  {relative_path} (exists)"
                 
                 # Create directory
                 output_path.parent.mkdir(parents=True, exist_ok=True)
                 
                 # Download with proper headers
-                response = self.session.get(asset_url, timeout=30, stream=True)
+                response = self.session.get(asset_url, timeout=30, stream=True, headers=headers)
+                if response.status_code == 304 and headers:
+                    self.validators.not_modified(asset_url)
+                    return f"⏭️  {relative_path} (not modified)"
                 if response.status_code == 200:
                     # Validate content type matches expected file type
                     content_type = response.headers.get('content-type', '').lower()
@@ -3233,12 +3283,20 @@ document.addEventListener('DOMContentLoaded', function() {
                         css_content = re.sub(font_url_pattern, replace_font_url, css_content)
                         
                         output_path.write_text(css_content, encoding='utf-8')
+                        digest = content_hash(response.content)
+                        size = len(response.content)
                     else:
                         # Write in chunks for large files
+                        digest = content_hash()
+                        size = 0
                         with open(output_path, 'wb') as f:
                             for chunk in response.iter_content(chunk_size=8192):
                                 if chunk:
                                     f.write(chunk)
+                                    digest.update(chunk)
+                                    size += len(chunk)
+                    if self.validators is not None:
+                        self.validators.record(asset_url, response.headers, digest.hexdigest(), size)
                     
                     # Get file size for reporting
                     file_size = output_path.stat().st_size
@@ -3264,6 +3322,9 @@ document.addEventListener('DOMContentLoaded', function() {
         
         print(f"   ✅ Downloaded: {len(success_results)}")
         print(f"   ⏭️  Skipped: {len(skipped_results)}")
+        not_modified = sum(1 for r in skipped_results if r.endswith('(not modified)'))
+        if not_modified:
+            print(f"   🔁 Not modified (304): {not_modified}")
         print(f"   ❌ Failed: {len(error_results)}")
         
         # Show some example results
@@ -3452,6 +3513,23 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 print(f"   🍞 Added breadcrumb navigation: {' > '.join([item['name'] for item in breadcrumb_items])}")
     
+    def build_related_posts_index(self):
+        """Precompute related posts for every published post (see related_posts.py)"""
+        print("🔗 Building related posts index...")
+        start = time.time()
+        try:
+            self.related_index = RelatedPostsIndex.build(
+                self.api.posts(),
+                self.api.post_bodies(),
+                lambda html: self._extract_article_text(
+                    BeautifulSoup(f'<article>{html}</article>', 'html.parser')
+                ),
+                self.wp_url,
+            )
+            print(f"   ✅ Indexed {len(self.related_index.related)} posts in {time.time() - start:.1f}s")
+        except Exception as e:
+            print(f"   ⚠️  Related posts index failed, using category fallback: {e}")
+
     def add_related_posts(self, soup, current_url):
         """Add related posts section based on categories and tags"""
         
@@ -3493,35 +3571,17 @@ document.addEventListener('DOMContentLoaded', function() {
             print(f"   ℹ️  No categories or tags found for related posts")
             return
         
-        # Query WordPress API for related posts
+        # Look up precomputed related posts; fall back to the newest posts
+        # in the first category if this post isn't in the index
         try:
-            related_posts = []
+            related_posts = self.related_index.get(current_url)
             
-            # First try to get posts from the same categories
-            if categories:
-                # Get category ID from the first category
-                cat_response = self.session.get(
-                    f'{self.wp_url}/wp-json/wp/v2/categories',
-                    params={'slug': categories[0]}
-                )
-                if cat_response.status_code == 200:
-                    try:
-                        cat_data = cat_response.json()
-                    except (json.JSONDecodeError, ValueError):
-                        cat_data = []
-                    if isinstance(cat_data, list) and cat_data:
-                        category_id = cat_data[0]['id']
-                        
-                        # Get posts from this category
-                        posts_response = self.session.get(
-                            f'{self.wp_url}/wp-json/wp/v2/posts',
-                            params={'categories': category_id, 'per_page': 4, '_fields': 'id,title,link,featured_media'}
-                        )
-                        if posts_response.status_code == 200:
-                            try:
-                                related_posts = posts_response.json()
-                            except (json.JSONDecodeError, ValueError):
-                                related_posts = []
+            if not related_posts and categories:
+                # Resolve the first category and take its newest posts,
+                # both from the per-build API cache
+                category = self.api.category_by_slug(categories[0])
+                if category:
+                    related_posts = self.api.posts_in_category(category['id'], limit=4)
             
             # Filter out current post
             current_post_url = f"{self.wp_url}{current_url}"
@@ -3680,6 +3740,10 @@ document.addEventListener('DOMContentLoaded', function() {
             "/wp-includes/*",
             "  Cache-Control: public, max-age=31536000, immutable",
             "",
+            "# JPEG XL variants (--jxl) - not in every MIME table, and nosniff is set",
+            "/*.jxl",
+            "  Content-Type: image/jxl",
+            "",
             "# Search index - moderate caching",
             "/search-index*.json",
             "  Cache-Control: public, max-age=3600",
@@ -3764,75 +3828,25 @@ document.addEventListener('DOMContentLoaded', function() {
         robots_file.write_text('\n'.join(robots_content))
         print("   ✅ Created robots.txt")
     
-    def _extract_page_images(self, html_file):
-        """Return a list of image dicts for the image sitemap.
-
-        Each dict has:
-          - loc:     absolute URL of the image (required by Google)
-          - title:   image title attribute or filename stem (optional)
-          - caption: alt text (optional but recommended)
-
-        Only images served from the same domain are included; external CDN
-        images (e.g. third-party embeds) are skipped.  AVIF/WebP <source>
-        elements inside <picture> are ignored — only the <img> src (the
-        canonical fallback) is used to avoid duplicate entries.
-        """
-        try:
-            from bs4 import BeautifulSoup
-            with open(html_file, 'r', errors='ignore') as f:
-                soup = BeautifulSoup(f.read(), 'html.parser')
-
-            # Only look at images inside the main article/post body
-            content = soup.find('article') or soup.find('main') or soup.find('body')
-            if not content:
-                return []
+    def _page_record(self, html_file):
+        """Manifest record for an output HTML file.
 
-            images = []
-            seen_locs = set()
-
-            for img in content.find_all('img'):
-                src = img.get('src', '').strip()
-                if not src:
-                    continue
-
-                # Convert to absolute URL
-                if src.startswith('/'):
-                    abs_src = f'{self.target_domain}{src}'
-                elif src.startswith('http'):
-                    # Skip external images
-                    if self.target_domain not in src:
-                        continue
-                    abs_src = src
-                else:
-                    continue  # relative path without leading slash — skip
-
-                # Skip duplicates (e.g. responsive srcset variations already seen)
-                loc_key = abs_src.split('?')[0]
-                if loc_key in seen_locs:
-                    continue
-                seen_locs.add(loc_key)
-
-                alt   = img.get('alt', '').strip()
-                title = img.get('title', '').strip()
-
-                # Derive a title from alt text, explicit title, or filename
-                if not title and alt:
-                    title = alt
-                if not title:
-                    from pathlib import Path as _Path
-                    title = _Path(src).stem.replace('-', ' ').replace('_', ' ').title()
-
-                images.append({
-                    'loc':     abs_src,
-                    'title':   title[:200],          # Google recommends ≤200 chars
-                    'caption': alt[:200] if alt else '',
-                })
-
-            return images
-
-        except Exception as e:
-            print(f"   ⚠️  Image extraction failed for {html_file.name}: {e}")
-            return []
+        Pages rendered by process_html already have one; anything else
+        (seeded from an older build, written outside process_html) is parsed
+        once here and the record is shared by every later consumer.
+        """
+        url_path = url_for_file(self.output_dir, html_file)
+        record = self.manifest.get(url_path)
+        if record is None:
+            try:
+                with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
+                    soup = BeautifulSoup(f.read(), 'html.parser')
+                record = capture_page_record(soup, url_path, self.target_domain)
+                self.manifest.update(record)
+            except Exception as e:
+                print(f"   ⚠️  Could not read {html_file}: {e}")
+                return None
+        return record
 
     def create_sitemap(self):
         """Generate an XML sitemap with image extensions (Google Image Sitemap)."""
@@ -3849,28 +3863,24 @@ document.addEventListener('DOMContentLoaded', function() {
             else:
                 url_path = f'/{relative_path.with_suffix("")}/'
 
-            # Extract modification date from HTML
-            lastmod_date = self._extract_modified_date(html_file)
+            record = self._page_record(html_file)
 
             urls_for_sitemap.append({
                 'url':      f'{self.target_domain}{url_path}',
-                'lastmod':  lastmod_date,
+                'lastmod':  self._sitemap_lastmod(record, html_file),
                 'priority': self._get_sitemap_priority(url_path),
                 'html_file': html_file,   # kept for image extraction below
+                'record':   record,
+                # Only index.html pages can be noindex-excluded (other .html
+                # files, e.g. 404.html, are always kept)
+                'noindex':  bool(record and relative_path.name == 'index.html' and record['noindex']),
             })
 
         # Exclude noindex pages from sitemap (category/tag archives are
         # marked noindex,follow — including them in the sitemap sends a
         # mixed signal to search engines and wastes crawl budget)
         before_count = len(urls_for_sitemap)
-        urls_for_sitemap = [
-            item for item in urls_for_sitemap
-            if not self._is_noindex_page(
-                self.output_dir / item['url'].replace(self.target_domain, '').strip('/') / 'index.html'
-                if item['url'] != f'{self.target_domain}/'
-                else self.output_dir / 'index.html'
-            )
-        ]
+        urls_for_sitemap = [item for item in urls_for_sitemap if not item['noindex']]
         excluded = before_count - len(urls_for_sitemap)
         if excluded:
             print(f"   🚫 Excluded {excluded} noindex pages from sitemap")
@@ -3882,13 +3892,11 @@ document.addEventListener('DOMContentLoaded', function() {
         archive_fixes = 0
         for item in urls_for_sitemap:
             url_path = item['url'].replace(self.target_domain, '')
-            if '/category/' in url_path or '/tag/' in url_path:
-                html_file = self.output_dir / url_path.strip('/') / 'index.html'
-                if html_file.exists():
-                    most_recent = self._get_archive_latest_post_date(html_file, post_dates)
-                    if most_recent:
-                        item['lastmod'] = most_recent
-                        archive_fixes += 1
+            if ('/category/' in url_path or '/tag/' in url_path) and item['record']:
+                most_recent = self._get_archive_latest_post_date(item['record'], post_dates)
+                if most_recent:
+                    item['lastmod'] = most_recent
+                    archive_fixes += 1
         if archive_fixes:
             print(f"   📅 Fixed lastmod dates for {archive_fixes} archive pages")
 
@@ -3926,8 +3934,8 @@ document.addEventListener('DOMContentLoaded', function() {
                     url_path.startswith(f'/{y}/') for y in range(2010, 2035)
                 ) or url_path in ('/', '/about-me/', '/lab/', '/homelab-software/')
 
-                if is_content_page and item.get('html_file'):
-                    images = self._extract_page_images(item['html_file'])
+                if is_content_page and item.get('record'):
+                    images = item['record']['images']
                     for img in images[:20]:   # Google recommends ≤1000 per URL; 20 is generous
                         sitemap_content.append('    <image:image>')
                         sitemap_content.append(f'      <image:loc>{_xml_escape(img["loc"])}</image:loc>')
@@ -3946,81 +3954,48 @@ document.addEventListener('DOMContentLoaded', function() {
         sitemap_file.write_text('\n'.join(sitemap_content))
         print(f"✅ Created sitemap.xml with {len(seen_urls)} URLs and {total_images} image entries")
 
-    def _extract_modified_date(self, html_file):
-        """Extract modification date from HTML file's Schema.org JSON-LD"""
+    def _sitemap_lastmod(self, record, html_file):
+        """Sitemap lastmod: JSON-LD dateModified from the page record, else file mtime"""
         try:
-            with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
-                html_content = f.read()
-
-            soup = BeautifulSoup(html_content, 'html.parser')
-
-            # Look for Schema.org JSON-LD script
-            json_ld_scripts = soup.find_all('script', type='application/ld+json')
-
-            for script in json_ld_scripts:
-                try:
-                    data = json.loads(script.string)
-
-                    # Handle both single objects and @graph arrays
-                    items = data.get('@graph', [data]) if isinstance(data, dict) else [data]
+            if record and record.get('lastmod'):
+                # Parse and format date (handle ISO8601 format)
+                parsed_date = datetime.fromisoformat(record['lastmod'].replace('Z', '+00:00'))
+                return parsed_date.strftime('%Y-%m-%d')
+        except (ValueError, AttributeError):
+            pass
 
-                    for item in items:
-                        if isinstance(item, dict):
-                            # Look for dateModified in Article, BlogPosting, or WebPage
-                            if item.get('@type') in ['Article', 'BlogPosting', 'WebPage']:
-                                date_modified = item.get('dateModified')
-                                if date_modified:
-                                    # Parse and format date (handle ISO8601 format)
-                                    parsed_date = datetime.fromisoformat(date_modified.replace('Z', '+00:00'))
-                                    return parsed_date.strftime('%Y-%m-%d')
-                except (json.JSONDecodeError, ValueError, AttributeError):
-                    continue
-
-            # Fallback: try to get file modification time
+        try:
+            # Fallback: file modification time
             file_mtime = html_file.stat().st_mtime
             return datetime.fromtimestamp(file_mtime).strftime('%Y-%m-%d')
-
-        except Exception as e:
+        except Exception:
             # Ultimate fallback: use current date
             return datetime.now().strftime('%Y-%m-%d')
 
-    def _get_archive_latest_post_date(self, html_file, post_dates):
+    def _get_archive_latest_post_date(self, record, post_dates):
         """Get the most recent post date from an archive (category/tag) page.
 
-        Parses the archive HTML for internal links to blog posts,
-        looks up their dates from the already-collected sitemap data,
-        and returns the most recent one.
+        Uses the post links recorded for the archive page, looks up their
+        dates from the already-collected sitemap data, and returns the most
+        recent one.
         """
-        try:
-            with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
-                html_content = f.read()
+        latest_date = None
 
-            soup = BeautifulSoup(html_content, 'html.parser')
-
-            # Find all internal links that look like blog post URLs (year/month/slug pattern)
-            post_link_pattern = re.compile(r'^(?:https?://[^/]+)?/\d{4}/\d{2}/[^/]+/?$')
-            latest_date = None
-
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                if post_link_pattern.match(href):
-                    # Normalise to full URL for lookup
-                    if href.startswith('/'):
-                        full_url = f"{self.target_domain}{href}"
-                    else:
-                        full_url = href
-                    # Ensure trailing slash for consistent lookup
-                    if not full_url.endswith('/'):
-                        full_url += '/'
-
-                    date = post_dates.get(full_url)
-                    if date and (latest_date is None or date > latest_date):
-                        latest_date = date
+        for href in record.get('post_links', []):
+            # Normalise to full URL for lookup
+            if href.startswith('/'):
+                full_url = f"{self.target_domain}{href}"
+            else:
+                full_url = href
+            # Ensure trailing slash for consistent lookup
+            if not full_url.endswith('/'):
+                full_url += '/'
 
-            return latest_date
+            date = post_dates.get(full_url)
+            if date and (latest_date is None or date > latest_date):
+                latest_date = date
 
-        except Exception:
-            return None
+        return latest_date
 
     def _get_sitemap_priority(self, url_path):
         """Determine <priority> for a sitemap entry based on URL pattern and post age.
@@ -4050,18 +4025,6 @@ document.addEventListener('DOMContentLoaded', function() {
 
         return None
 
-    def _is_noindex_page(self, html_file):
-        """Check if a page has a noindex robots meta tag."""
-        try:
-            if not html_file.exists():
-                return False
-            with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
-                # Only read the first 4KB — robots meta is always in <head>
-                head_content = f.read(4096)
-            return 'noindex' in head_content.lower() and 'name="robots"' in head_content.lower()
-        except Exception:
-            return False
-
     def generate_rss_feed(self):
         """Generate RSS feed from posts"""
         print("📡 Generating RSS feed...")
@@ -4077,49 +4040,30 @@ document.addEventListener('DOMContentLoaded', function() {
                         index_file = post_dir / 'index.html'
                         if index_file.exists():
                             try:
-                                with open(index_file, 'r', encoding='utf-8', errors='ignore') as f:
-                                    html_content = f.read()
-                                
-                                soup = BeautifulSoup(html_content, 'html.parser')
+                                record = self._page_record(index_file)
+                                if not record:
+                                    continue
                                 
-                                # Extract title
-                                title_tag = soup.find('h1', class_=re.compile(r'entry-title', re.I))
-                                if not title_tag:
-                                    title_tag = soup.find('title')
-                                title = title_tag.get_text().strip() if title_tag else 'Untitled'
+                                # Title: post H1 if present, else <title>
+                                title = record['heading'] or record['title'] or 'Untitled'
                                 title = re.sub(r'\s*[-–|]\s*jameskilby.*$', '', title, flags=re.IGNORECASE)
                                 
-                                # Extract description
-                                meta_desc = soup.find('meta', attrs={'name': 'description'})
-                                description = meta_desc.get('content', '').strip() if meta_desc else ''
-                                
-                                if not description:
-                                    # Try to get excerpt from content
-                                    content_div = soup.find('div', class_=re.compile(r'entry-content|entry-summary', re.I))
-                                    if content_div:
-                                        for script in content_div(["script", "style"]):
-                                            script.decompose()
-                                        text = content_div.get_text()
-                                        words = text.split()[:50]
-                                        description = ' '.join(words) + ('...' if len(words) >= 50 else '')
+                                # Description, falling back to a content excerpt
+                                description = record['description'] or record['feed_excerpt']
                                 
-                                # Extract date
-                                date_elem = soup.find('time', class_=re.compile(r'published', re.I))
+                                # Publication date
                                 pub_date = ''
-                                if date_elem:
-                                    datetime_str = date_elem.get('datetime', '')
-                                    if datetime_str:
-                                        try:
-                                            from email.utils import format_datetime
-                                            from datetime import datetime as dt
-                                            dt_obj = dt.fromisoformat(datetime_str.replace('Z', '+00:00'))
-                                            pub_date = format_datetime(dt_obj)
-                                        except (ValueError, AttributeError, TypeError):
-                                            pub_date = datetime_str
+                                datetime_str = record['published']
+                                if datetime_str:
+                                    try:
+                                        from email.utils import format_datetime
+                                        from datetime import datetime as dt
+                                        dt_obj = dt.fromisoformat(datetime_str.replace('Z', '+00:00'))
+                                        pub_date = format_datetime(dt_obj)
+                                    except (ValueError, AttributeError, TypeError):
+                                        pub_date = datetime_str
                                 
-                                # Extract author
-                                author_elem = soup.find('a', class_=re.compile(r'author|fn', re.I))
-                                author = author_elem.get_text().strip() if author_elem else 'James Kilby'
+                                author = record['feed_author'] or 'James Kilby'
                                 
                                 # Construct URL
                                 relative_path = post_dir.relative_to(self.output_dir)
@@ -4300,9 +4244,11 @@ document.addEventListener('DOMContentLoaded', function() {
     
     def generate_search_index(self):
         """Generate search index for client-side search functionality"""
+        from search_index import SearchIndexBuilder
         print("🔍 Generating search index...")
         
         search_index = []
+        inverted_index = SearchIndexBuilder()
         
         # Process all HTML files
         for html_file in self.output_dir.rglob('*.html'):
@@ -4318,87 +4264,34 @@ document.addEventListener('DOMContentLoaded', function() {
                 else:
                     url_path = f'/{relative_path}'
                 
-                # Read and parse HTML
-                with open(html_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    html_content = f.read()
-                
-                soup = BeautifulSoup(html_content, 'html.parser')
+                record = self._page_record(html_file)
+                if not record:
+                    continue
                 
                 # Skip redirects and error pages
-                if soup.find('meta', attrs={'http-equiv': 'refresh'}):
+                if record['refresh']:
                     continue
                 
-                # Extract metadata
-                title_tag = soup.find('title')
-                title = title_tag.get_text().strip() if title_tag else "Untitled"
-                
-                # Clean up title (remove site name)
-                title = re.sub(r'\s*[-–|]\s*jameskilby.*$', '', title, flags=re.IGNORECASE)
+                # Title (site name already removed)
+                title = record['title'] or "Untitled"
                 
                 # Skip if no meaningful title
                 if not title or title.lower() in ['untitled', 'page not found', '404']:
                     continue
                 
-                # Meta description
-                meta_desc = soup.find('meta', attrs={'name': 'description'})
-                description = meta_desc.get('content', '').strip() if meta_desc else ''
+                # Meta description, or an excerpt from the content
+                description = record['description'] or record['excerpt']
                 
-                # Extract excerpt from content if no description
-                if not description:
-                    content_areas = soup.find_all(['div'], class_=re.compile(r'(content|entry|post|article)', re.I))
-                    if content_areas:
-                        # Remove script and style elements
-                        for script in content_areas[0](["script", "style", "nav", "footer"]):
-                            script.decompose()
-                        
-                        content_text = content_areas[0].get_text()
-                        # Clean up whitespace
-                        lines = (line.strip() for line in content_text.splitlines())
-                        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                        content_text = ' '.join(chunk for chunk in chunks if chunk)
-                        
-                        # Take first 150 words as excerpt
-                        words = content_text.split()
-                        description = ' '.join(words[:150]) + ('...' if len(words) > 150 else '')
-                
-                # Extract full content for searching (limit to 1000 chars)
-                # Remove script and style elements
-                content_soup = BeautifulSoup(html_content, 'html.parser')
-                for script in content_soup(["script", "style", "nav", "footer"]):
-                    script.decompose()
-                
-                full_content = content_soup.get_text()
-                # Clean up whitespace
-                lines = (line.strip() for line in full_content.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                full_content = ' '.join(chunk for chunk in chunks if chunk)
+                # Full visible text for searching
+                full_content = record['text']
                 
                 # Skip if content is too short (likely navigation pages)
                 if len(full_content.split()) < 50:
                     continue
                 
-                # Extract categories and tags
-                categories = []
-                tags = []
-                
-                # Look for category and tag links
-                cat_links = soup.find_all('a', href=re.compile(r'/category/'))
-                for link in cat_links:
-                    cat_text = link.get_text().strip()
-                    if cat_text and cat_text not in categories:
-                        categories.append(cat_text)
-                
-                tag_links = soup.find_all('a', href=re.compile(r'/tag/'))
-                for link in tag_links:
-                    tag_text = link.get_text().strip()
-                    if tag_text and tag_text not in tags:
-                        tags.append(tag_text)
-                
-                # Extract date
-                date = ""
-                date_elem = soup.find('time', class_=re.compile(r'(entry-date|published)', re.I))
-                if date_elem:
-                    date = date_elem.get('datetime', '') or date_elem.get_text().strip()
+                categories = record['categories']
+                tags = record['tags']
+                date = record['date']
                 
                 # Create search entry
                 entry = {
@@ -4412,6 +4305,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 }
                 
                 search_index.append(entry)
+                inverted_index.add(entry, full_content)
                 
             except Exception as e:
                 print(f"❌ Error indexing {html_file}: {str(e)}")
@@ -4432,9 +4326,56 @@ document.addEventListener('DOMContentLoaded', function() {
             print(f"✅ Generated search index with {len(search_index)} entries")
             print(f"   📄 Full: search-index.json ({search_index_file.stat().st_size / 1024:.1f}KB)")
             print(f"   📄 Min: search-index.min.json ({search_index_min_file.stat().st_size / 1024:.1f}KB)")
+
+            # Sharded inverted index for the edge search API
+            meta = inverted_index.write(self.output_dir / 'search')
+            print(f"   📄 Inverted: search/ ({meta['token_count']} tokens in "
+                  f"{len(meta['shards'])} shards, build {meta['build']})")
         else:
             print("⚠️  No content found for search index")
     
+    def crawl_urls(self, urls):
+        """Fetch and process every URL, returning one status string per URL.
+
+        Pages are parsed on a process pool (page_pipeline) unless
+        parse_workers is 1. Fetching uses the async crawl engine when
+        --async-crawl was requested and httpx is installed; otherwise
+        3 requests threads.
+        """
+        from config import Config
+        from page_pipeline import PagePipeline
+
+        crawler = None
+        if self.async_crawl:
+            import async_crawler
+            if async_crawler.is_available():
+                crawler = async_crawler
+            else:
+                print("   ⚠️  --async-crawl requested but httpx is not installed — "
+                      "falling back to threaded crawl")
+
+        def async_crawl(store=None):
+            return crawler.AsyncCrawler(
+                self,
+                max_connections=Config.ASYNC_CRAWL_MAX_CONNECTIONS,
+                initial_concurrency=Config.ASYNC_CRAWL_INITIAL_CONCURRENCY,
+                max_per_host=Config.ASYNC_CRAWL_MAX_PER_HOST,
+                timeout=DEFAULT_HTTP_TIMEOUT,
+                store=store,
+            ).crawl(urls)
+
+        if self.parse_workers != 1:
+            with PagePipeline(self, fetch_workers=Config.MAX_WORKERS,
+                              parse_workers=self.parse_workers) as pipeline:
+                if crawler:
+                    return async_crawl(store=pipeline.process)
+                return pipeline.run(urls)
+
+        if crawler:
+            return async_crawl()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
+            return list(executor.map(self.download_and_process_url, urls))
+
     def generate_static_site(self):
         """Main generation process"""
         print(f"🚀 WordPress to Static Site Generator")
@@ -4458,7 +4399,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         # For incremental builds, don't clean output directory
         # For full builds, clean it
-        if self.incremental_builder and self.incremental_builder.cache.get('last_build_time'):
+        if self.incremental_builder and self.incremental_builder.last_build_time:
             print("♻️  Incremental build - preserving existing output...")
             if not self.output_dir.exists():
                 self.output_dir.mkdir(parents=True)
@@ -4469,6 +4410,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 shutil.rmtree(self.output_dir)
             self.output_dir.mkdir(parents=True)
         
+        # Load categories, tags and post summaries once for the whole build
+        self.api.prefetch()
+        self.build_related_posts_index()
+
         # Get all URLs from WordPress
         urls = self.get_all_content_urls()
         
@@ -4478,8 +4423,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         # Download and process all content
         print(f"\\n⬇️  Processing {len(urls)} URLs...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            results = list(executor.map(self.download_and_process_url, urls))
+        results = self.crawl_urls(urls)
         
         # Print results summary
         success_count = len([r for r in results if r.startswith('✅')])
@@ -4507,6 +4451,8 @@ document.addEventListener('DOMContentLoaded', function() {
         self.create_sitemap()
         self.generate_rss_feed()
         self.generate_search_index()
+        manifest_count = self.manifest.save()
+        print(f"✅ Saved page records to build state ({manifest_count} pages)")
         self.copy_search_script()
         self.copy_static_root_files()
         self.inject_search_script()
@@ -4539,8 +4485,21 @@ document.addEventListener('DOMContentLoaded', function() {
         
         # Finalize incremental build cache
         if self.incremental_builder:
-            is_full_build = not self.incremental_builder.cache.get('last_build_time')
-            self.incremental_builder.finalize_build(is_full_build=is_full_build)
+            # A failed page didn't render what the graph would claim it
+            # shows, so keep the old graph and diff against it again next time
+            if error_count == 0:
+                self.record_dependency_graph()
+            else:
+                print("⚠️  Keeping the previous dependency graph (some pages failed)")
+            if self.validators is not None:
+                saved_count = self.validators.save()
+                stats = self.validators.stats
+                print(f"🔁 Conditional requests: {stats['not_modified']} not modified "
+                      f"({stats['bytes_saved'] / 1024 / 1024:.1f} MB not re-downloaded), "
+                      f"{stats['fetched']} fetched; validators for {saved_count} URLs")
+            is_full_build = not self.incremental_builder.last_build_time
+            self.incremental_builder.finalize_build(is_full_build=is_full_build,
+                                                    complete=error_count == 0)
             
             # Show cache statistics
             stats = self.incremental_builder.get_stats()
@@ -4554,18 +4513,25 @@ document.addEventListener('DOMContentLoaded', function() {
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python wp_to_static_generator.py <output_directory> [--deploy] [--no-incremental]")
+        print("Usage: python wp_to_static_generator.py <output_directory> [--deploy] [--no-incremental] [--async-crawl] [--parse-workers N]")
         print("Example: python wp_to_static_generator.py ./static-site-output")
         print("Options:")
         print("  --no-incremental    Force full build (ignore cache)")
+        print("  --async-crawl       Fetch pages with the asyncio/httpx crawl engine")
+        print("  --parse-workers N   HTML parse processes (default: one per core, 1 = in-process)")
         sys.exit(1)
     
     output_dir = sys.argv[1]
     deploy_flag = '--deploy' in sys.argv
     use_incremental = '--no-incremental' not in sys.argv
+    async_crawl = '--async-crawl' in sys.argv
     
     # Import configuration
     from config import Config
+
+    parse_workers = Config.PARSE_WORKERS or None
+    if '--parse-workers' in sys.argv:
+        parse_workers = int(sys.argv[sys.argv.index('--parse-workers') + 1])
     
     # Get authentication token from environment
     AUTH_TOKEN = os.getenv('WP_AUTH_TOKEN')
@@ -4581,7 +4547,9 @@ def main():
         auth_token=AUTH_TOKEN,
         output_dir=output_dir,
         target_domain=Config.TARGET_DOMAIN,
-        use_incremental=use_incremental
+        use_incremental=use_incremental,
+        async_crawl=async_crawl,
+        parse_workers=parse_workers
     )
     
     # Generate static site
@@ -25,13 +25,13 @@ python3 scripts/manage_build_cache.py stats
 echo ""
 
 # Step 2: Check if cache file exists
-if [ -f ".build-cache.json" ]; then
-    echo "✅ Cache file exists (.build-cache.json)"
-    CACHE_SIZE=$(du -h .build-cache.json | cut -f1)
+LAST_BUILD=$(python3 scripts/manage_build_cache.py meta last_build_time 2>/dev/null)
+if [ -n "$LAST_BUILD" ]; then
+    echo "✅ Build state exists (.build-state.db)"
+    CACHE_SIZE=$(du -h .build-state.db | cut -f1)
     echo "   Size: $CACHE_SIZE"
     
     # Show when last build was
-    LAST_BUILD=$(python3 -c "import json; data=json.load(open('.build-cache.json')); print(data.get('last_build_time', 'Never'))")
     echo "   Last build: $LAST_BUILD"
     echo ""
     
@@ -67,7 +67,7 @@ if [ -f ".build-cache.json" ]; then
     fi
     
 else
-    echo "ℹ️  No cache file found (.build-cache.json)"
+    echo "ℹ️  No previous build recorded (.build-state.db)"
     echo "   Next build will be FULL BUILD (create cache)"
     echo ""
     
@@ -87,7 +87,7 @@ else
         echo "Step 3: Verifying cache was created..."
         echo "----------------------------------------"
         
-        if [ -f ".build-cache.json" ]; then
+        if [ -n "$(python3 scripts/manage_build_cache.py meta last_build_time)" ]; then
             echo "✅ Cache created successfully!"
             python3 scripts/manage_build_cache.py stats
             echo ""
@@ -5,8 +5,23 @@
  * - Serves compressed search index from edge
  * - Provides search API endpoint
  * - Much faster than downloading full search-index.json
+ *
+ * Queries use the sharded inverted index built by scripts/search_index.py:
+ *   search:meta                     { build, prefix_len, shards }
+ *   search:<build>:shard:<prefix>   { token: [[docId, score], ...] }
+ *   search:<build>:doc:<id>         { title, url, description, ... }
+ * so a query reads one shard per term plus the docs it returns — cost is
+ * O(matching postings), not O(corpus). Falls back to a linear scan of the
+ * legacy "current" index if search:meta hasn't been uploaded yet.
  */
 
+// Mirrors TOKEN_RE in scripts/search_index.py
+const TOKEN_RE = /[a-z0-9]{2,}/g;
+
+function tokenize(text) {
+  return text.toLowerCase().match(TOKEN_RE) || [];
+}
+
 export default {
   async fetch(request, env, ctx) {
     const url = new URL(request.url);
@@ -92,10 +107,12 @@ export default {
     }
     
     try {
-      // Get search index from KV
-      const indexStr = await env.SEARCH_INDEX.get('current');
+      const meta = await env.SEARCH_INDEX.get('search:meta', { type: 'json', cacheTtl: 60 });
+      const sortedResults = meta
+        ? await this.searchInverted(env, meta, query, limit)
+        : await this.searchLinear(env, query, limit);
       
-      if (!indexStr) {
+      if (sortedResults === null) {
         return new Response(JSON.stringify({ error: 'Search index not available' }), {
           status: 503,
           headers: {
@@ -105,41 +122,6 @@ export default {
         });
       }
       
-      const index = JSON.parse(indexStr);
-      
-      // Simple search implementation
-      // For better results, consider using Fuse.js or similar at the edge
-      const searchQuery = query.toLowerCase().trim();
-      const results = [];
-      
-      for (const item of index) {
-        const titleMatch = item.title?.toLowerCase().includes(searchQuery);
-        const contentMatch = item.content?.toLowerCase().includes(searchQuery);
-        const descriptionMatch = item.description?.toLowerCase().includes(searchQuery);
-        
-        if (titleMatch || contentMatch || descriptionMatch) {
-          // Calculate simple relevance score
-          let score = 0;
-          if (titleMatch) score += 10;
-          if (descriptionMatch) score += 5;
-          if (contentMatch) score += 1;
-          
-          results.push({
-            ...item,
-            score
-          });
-        }
-        
-        // Stop after finding enough results
-        if (results.length >= limit * 3) break;
-      }
-      
-      // Sort by score and limit results
-      const sortedResults = results
-        .sort((a, b) => b.score - a.score)
-        .slice(0, limit)
-        .map(({ score, ...item }) => item); // Remove score from output
-      
       return new Response(JSON.stringify({
         query: query,
         results: sortedResults,
@@ -163,5 +145,107 @@ export default {
         }
       });
     }
+  },
+  
+  /**
+   * Inverted-index search: AND across query terms, the last term matched as
+   * a prefix (type-ahead) unless the query ends with a space.
+   */
+  async searchInverted(env, meta, query, limit) {
+    const prefixLen = meta.prefix_len;
+    const shardNames = new Set(meta.shards);
+    const tokens = tokenize(query);
+    if (tokens.length === 0) return [];
+    const prefixLast = !/\s$/.test(query);
+    
+    const shardCache = new Map();
+    const loadShard = (prefix) => {
+      if (!shardCache.has(prefix)) {
+        shardCache.set(prefix, shardNames.has(prefix)
+          ? env.SEARCH_INDEX.get(`search:${meta.build}:shard:${prefix}`, { type: 'json', cacheTtl: 300 })
+          : Promise.resolve(null));
+      }
+      return shardCache.get(prefix);
+    };
+    
+    // Postings for each term, fetched in parallel
+    const termPostings = await Promise.all(tokens.map(async (token, i) => {
+      const shard = await loadShard(token.slice(0, prefixLen));
+      if (!shard) return [];
+      if (!(prefixLast && i === tokens.length - 1)) return shard[token] || [];
+      // Prefix term: best score per doc across every token it starts
+      const best = new Map();
+      for (const [candidate, postings] of Object.entries(shard)) {
+        if (!candidate.startsWith(token)) continue;
+        for (const [docId, score] of postings) {
+          if (score > (best.get(docId) || 0)) best.set(docId, score);
+        }
+      }
+      return [...best.entries()];
+    }));
+    
+    // Intersect, starting from the rarest term
+    termPostings.sort((a, b) => a.length - b.length);
+    let scores = new Map(termPostings[0]);
+    for (const postings of termPostings.slice(1)) {
+      const next = new Map();
+      for (const [docId, score] of postings) {
+        if (scores.has(docId)) next.set(docId, scores.get(docId) + score);
+      }
+      scores = next;
+      if (scores.size === 0) break;
+    }
+    
+    const top = [...scores.entries()]
+      .sort((a, b) => b[1] - a[1] || a[0] - b[0])
+      .slice(0, limit);
+    const docs = await Promise.all(top.map(([docId]) =>
+      env.SEARCH_INDEX.get(`search:${meta.build}:doc:${docId}`, { type: 'json', cacheTtl: 300 })
+    ));
+    return docs.filter(Boolean);
+  },
+  
+  /**
+   * Legacy search over the flat "current" index (linear scan). Returns null
+   * if no index has been uploaded.
+   */
+  async searchLinear(env, query, limit) {
+    // Get search index from KV
+    const indexStr = await env.SEARCH_INDEX.get('current');
+    if (!indexStr) return null;
+    
+    const index = JSON.parse(indexStr);
+    
+    // Simple search implementation
+    const searchQuery = query.toLowerCase().trim();
+    const results = [];
+    
+    for (const item of index) {
+      const titleMatch = item.title?.toLowerCase().includes(searchQuery);
+      const contentMatch = item.content?.toLowerCase().includes(searchQuery);
+      const descriptionMatch = item.description?.toLowerCase().includes(searchQuery);
+      
+      if (titleMatch || contentMatch || descriptionMatch) {
+        // Calculate simple relevance score
+        let score = 0;
+        if (titleMatch) score += 10;
+        if (descriptionMatch) score += 5;
+        if (contentMatch) score += 1;
+        
+        results.push({
+          ...item,
+          score
+        });
+      }
+      
+      // Stop after finding enough results
+      if (results.length >= limit * 3) break;
+    }
+    
+    // Sort by score and limit results
+    return results
+      .sort((a, b) => b.score - a.score)
+      .slice(0, limit)
+      .map(({ score, ...item }) => item); // Remove score from output
   }
 };